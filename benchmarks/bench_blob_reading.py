@@ -0,0 +1,58 @@
+"""
+Time to read worksheet blobs from a git repository.
+
+Compares reading each blob through GitPython data_stream, as done
+before, against sf_git.git_utils.BlobReader batches.
+
+Usage, from the repository root:
+    PYTHONPATH=. python benchmarks/bench_blob_reading.py --worksheets 10000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from git.objects.blob import Blob
+
+from bench_cache_loading import build_repo
+from sf_git.git_utils import BlobReader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--worksheets", type=int, default=10000)
+    parser.add_argument("--folders", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo = build_repo(
+            Path(tmp_dir).resolve(), args.worksheets, args.folders
+        )
+        blobs = [
+            b for b in repo.head.commit.tree.traverse() if isinstance(b, Blob)
+        ]
+        print(f"repository: {len(blobs)} blobs")
+
+        reader = BlobReader(repo)
+        candidates = {
+            "data_stream per blob": lambda: [
+                b.data_stream.read() for b in blobs
+            ],
+            "BlobReader.read_many": lambda: [
+                content
+                for _, content in reader.read_many([b.hexsha for b in blobs])
+            ],
+        }
+        for name, read in candidates.items():
+            start = time.perf_counter()
+            contents = read()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<22} {len(contents)} blobs in {elapsed:.3f}s")
+
+        reader.close()
+        repo.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Time to load worksheets from a git tracked cache.
+
+Creates a temporary repository with worksheets spread across folders,
+commits it, then times sf_git.cache.load_worksheets_from_cache.
+First run reads git objects, later ones the parsed tree store.
+
+Usage, from the repository root:
+    PYTHONPATH=. python benchmarks/bench_cache_loading.py --worksheets 10000
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from pathlib import Path
+
+import git
+
+import sf_git.config as config
+from sf_git.cache import load_worksheets_from_cache, save_worksheets_to_cache
+from sf_git.models import Worksheet
+
+
+def build_repo(root: Path, n_worksheets: int, n_folders: int) -> git.Repo:
+    config.GLOBAL_CONFIG.worksheets_path = root / "worksheets"
+    config.GLOBAL_CONFIG.cache_dir = root / "cache"
+    with contextlib.redirect_stdout(io.StringIO()):
+        save_worksheets_to_cache(
+            Worksheet(
+                _id=f"ws{i:06d}",
+                # same names in every folder
+                name=f"worksheet {i // n_folders}",
+                folder_id=f"folder{i % n_folders}",
+                folder_name=f"folder {i % n_folders}",
+                content_type="sql",
+                content=f"select {i};\n",
+            )
+            for i in range(n_worksheets)
+        )
+
+    repo = git.Repo.init(root)
+    repo.git.add("--all")
+    author = git.Actor("Benchmark", "benchmark@example.com")
+    repo.index.commit("worksheets", author=author, committer=author)
+    repo.git.gc("--quiet")
+    return repo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--worksheets", type=int, default=10000)
+    parser.add_argument("--folders", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir).resolve()
+        start = time.perf_counter()
+        repo = build_repo(root, args.worksheets, args.folders)
+        print(
+            f"repository: {args.worksheets} worksheets in {args.folders}"
+            f" folders, built in {time.perf_counter() - start:.1f}s"
+        )
+
+        for run in range(args.runs):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                worksheets = load_worksheets_from_cache(repo)
+            elapsed = time.perf_counter() - start
+            print(f"run {run}: {len(worksheets)} loaded in {elapsed:.3f}s")
+        repo.close()
+
+
+if __name__ == "__main__":
+    main()
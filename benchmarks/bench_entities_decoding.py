@@ -0,0 +1,92 @@
+"""
+Peak memory of entities list decoding.
+
+Compares decoding the response text with json.loads, as done before,
+against sf_git.worksheets_utils.decode_entities_response.
+
+Usage, from the repository root:
+    PYTHONPATH=. python benchmarks/bench_entities_decoding.py --drafts 5
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from sf_git.worksheets_utils import decode_entities_response
+
+DATA_SAMPLE = (
+    "select ss_item_sk, sum(ss_sales_price) from store_sales"
+    " group by ss_item_sk;\n"
+)
+
+
+def build_payload(n_worksheets: int, n_drafts: int, size_kb: int) -> bytes:
+    query = DATA_SAMPLE * (size_kb * 1024 // len(DATA_SAMPLE))
+    entities = []
+    queries = {}
+    for i in range(n_worksheets):
+        ws_id = f"ws{i:06d}"
+        entities.append(
+            {
+                "entityId": ws_id,
+                "entityType": "query",
+                "info": {
+                    "name": f"worksheet {i}",
+                    "folderId": None,
+                    "folderName": "",
+                    "queryLanguage": "sql",
+                },
+            }
+        )
+        queries[ws_id] = {
+            "drafts": {
+                str(1700000000000 + d): {"query": f"-- draft {d}\n{query}"}
+                for d in range(n_drafts)
+            }
+        }
+    return json.dumps(
+        {"entities": entities, "models": {"queries": queries}}
+    ).encode("utf-8")
+
+
+def measure(decode, payload: bytes):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    decoded = decode(payload)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del decoded
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--worksheets", type=int, default=40)
+    parser.add_argument("--drafts", type=int, default=5)
+    parser.add_argument("--size-kb", type=int, default=250)
+    args = parser.parse_args()
+
+    payload = build_payload(args.worksheets, args.drafts, args.size_kb)
+    print(
+        f"payload: {len(payload) / 2**20:.1f} MiB, "
+        f"{args.worksheets} worksheets x {args.drafts} drafts"
+    )
+
+    candidates = {
+        "json.loads(text)": lambda p: json.loads(p.decode("utf-8")),
+        "decode_entities_response": decode_entities_response,
+    }
+    for name, decode in candidates.items():
+        elapsed, peak = measure(decode, payload)
+        print(
+            f"{name:<26} peak {peak / 2**20:8.1f} MiB"
+            f"  ({peak / len(payload):.2f}x payload)  {elapsed:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
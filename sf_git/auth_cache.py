@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import requests
+
+import sf_git.config as config
+from sf_git.models import AuthenticationContext
+
+# not serializable or rebuilt on load
+_NOT_SAVED_FIELDS = ("client", "cookies")
+
+
+def _cache_file(kind: str, *keys: str) -> Path:
+    """Cache file path, named after a hash of its keys."""
+
+    key_hash = hashlib.sha256("|".join(keys).encode("utf-8")).hexdigest()
+    return config.GLOBAL_CONFIG.cache_dir / kind / f"{key_hash}.json"
+
+
+def _write_private(path: Path, content: Any):
+    """
+    Atomically write content as json to a file
+    only readable by the current user.
+    """
+
+    os.makedirs(path.parent, mode=0o700, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(content, f)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _read_fresh(path: Path, ttl: int) -> Optional[dict]:
+    """Read a cache file, None if missing, corrupt or older than ttl."""
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            content = json.load(f)
+        saved_at = float(content["saved_at"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if time.time() - saved_at > ttl:
+        path.unlink(missing_ok=True)
+        return None
+    return content
+
+
+def save_session(
+    account_name: str, login_name: str, auth_context: AuthenticationContext
+):
+    """
+    Save an authenticated session to the local session cache.
+
+    :param account_name: account the session was opened on
+    :param login_name: user the session was opened for
+    :param auth_context: authentication result to save
+    """
+
+    session = {
+        f.name: getattr(auth_context, f.name)
+        for f in fields(AuthenticationContext)
+        if f.name not in _NOT_SAVED_FIELDS
+    }
+    session["cookies"] = [
+        {
+            "name": cookie.name,
+            "value": cookie.value,
+            "domain": cookie.domain,
+            "path": cookie.path,
+            "secure": cookie.secure,
+            "expires": cookie.expires,
+        }
+        for cookie in auth_context.cookies or []
+    ]
+
+    _write_private(
+        _cache_file("sessions", account_name, login_name),
+        {"saved_at": time.time(), "session": session},
+    )
+
+
+def load_session(
+    account_name: str, login_name: str
+) -> Optional[AuthenticationContext]:
+    """
+    Load a cached session, if saved less than session_ttl seconds ago.
+
+    :param account_name: account the session was opened on
+    :param login_name: user the session was opened for
+
+    :returns: AuthenticationContext or None
+    """
+
+    content = _read_fresh(
+        _cache_file("sessions", account_name, login_name),
+        config.GLOBAL_CONFIG.session_ttl,
+    )
+    if content is None:
+        return None
+
+    session = dict(content["session"])
+    cookies = requests.cookies.RequestsCookieJar()
+    for cookie in session.pop("cookies"):
+        cookies.set_cookie(requests.cookies.create_cookie(**cookie))
+
+    saved_fields = {f.name for f in fields(AuthenticationContext)}
+    auth_context = AuthenticationContext(
+        **{k: v for k, v in session.items() if k in saved_fields}
+    )
+    auth_context.cookies = cookies
+    return auth_context
+
+
+def delete_session(account_name: str, login_name: str):
+    """Remove a cached session, e.g. once rejected by Snowsight."""
+
+    _cache_file("sessions", account_name, login_name).unlink(missing_ok=True)
+
+
+def save_endpoint(account_name: str, app_endpoint: Dict[str, Any]):
+    """
+    Save an account app endpoint resolution to the local cache.
+
+    :param account_name: account the endpoint was resolved for
+    :param app_endpoint: resolution with appServerUrl, url, region, account
+    """
+
+    _write_private(
+        _cache_file("endpoints", account_name),
+        {"saved_at": time.time(), "endpoint": app_endpoint},
+    )
+
+
+def load_endpoint(account_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Load an account app endpoint, if resolved less than
+    endpoint_ttl seconds ago.
+
+    :param account_name: account the endpoint was resolved for
+
+    :returns: endpoint resolution or None
+    """
+
+    content = _read_fresh(
+        _cache_file("endpoints", account_name),
+        config.GLOBAL_CONFIG.endpoint_ttl,
+    )
+    if content is None:
+        return None
+    return content["endpoint"]
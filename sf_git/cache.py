@@ -1,112 +1,318 @@
+import hashlib
 import json
 import os
+import posixpath
 import re
+import tempfile
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Dict, Iterable, List, Optional, Union
 import git
+from git.objects.blob import Blob
 
 import sf_git.config as config
-from sf_git.models import Worksheet, WorksheetError
-from sf_git.git_utils import get_tracked_files, get_blobs_content
+from sf_git.models import SnowflakeGitError, Worksheet, WorksheetError
+from sf_git.git_utils import (
+    commit_files,
+    get_blob_reader,
+    get_blobs_content,
+    get_tracked_blobs,
+    get_tracked_tree,
+)
 
+# parsed worksheets store, without contents,
+# cleaned up beyond that many trees
+MAX_CACHED_TREES = 64
 
-def save_worksheets_to_cache(worksheets: List[Worksheet]):
+
+def content_digest(content: bytes) -> str:
+    """Git blob SHA-1 of content, as computed by git hash-object."""
+
+    header = f"blob {len(content)}\0".encode("utf-8")
+    return hashlib.sha1(header + content).hexdigest()
+
+
+def worksheet_digest(ws: Worksheet) -> str:
+    """Git blob SHA-1 of a worksheet content file, as saved to cache."""
+
+    return content_digest(next(iter(worksheet_to_files(ws).values())))
+
+
+def worksheet_to_files(ws: Worksheet) -> Dict[str, bytes]:
+    """
+    Files representing a worksheet in cache, as they are written on disk.
+
+    :param ws: worksheet to represent
+
+    :returns: content file first then metadata file,
+        as posix paths relative to worksheets path
+    """
+
+    ws_name = re.sub(r"[ :/]", "_", ws.name)
+    extension = "py" if ws.content_type == "python" else "sql"
+    if ws.folder_name:
+        folder_name = re.sub(r"[ :/]", "_", ws.folder_name)
+        file_name = f"{folder_name}/{ws_name}.{extension}"
+        worksheet_metadata_file_name = (
+            f"{folder_name}/.{ws_name}_metadata.json"
+        )
+    else:
+        file_name = f"{ws_name}.{extension}"
+        worksheet_metadata_file_name = f".{ws_name}_metadata.json"
+
+    ws_metadata = {
+        "name": ws.name,
+        "_id": ws._id,
+        "folder_name": ws.folder_name,
+        "folder_id": ws.folder_id,
+        "content_type": ws.content_type,
+    }
+
+    # same newlines as a file written in text mode,
+    # content loaded from cache is already as on disk
+    content = ws.content
+    if isinstance(content, str):
+        content = content.replace("\n", os.linesep).encode("utf-8")
+    return {
+        file_name: content,
+        worksheet_metadata_file_name: json.dumps(ws_metadata).encode("utf-8"),
+    }
+
+
+def _write_if_changed(path: Path, content: bytes) -> str:
+    """
+    Write content to path unless it already holds the same content.
+
+    :returns: created, written or unchanged
+    """
+
+    try:
+        if path.stat().st_size == len(content):
+            with open(path, "rb") as f:
+                if f.read() == content:
+                    return "unchanged"
+        status = "written"
+    except FileNotFoundError:
+        os.makedirs(path.parent, exist_ok=True)
+        status = "created"
+
+    with open(path, "wb") as f:
+        f.write(content)
+    return status
+
+
+def save_worksheets_to_cache(
+    worksheets: Iterable[Worksheet],
+) -> Dict[str, int]:
     """
     Save worksheets to cache. Git is not involved here.
 
     For each worksheet, two files are created/overriden:
         - .<ws_name>_metadata.json (worksheet info)
         - <ws_name>.sql or <ws_name>.py (worksheet content)
+    Files already holding the same content are left untouched,
+    so that their modification time does not change.
 
-    :param worksheets: list of worksheets to save
+    :param worksheets: worksheets to save, consumed one by one
+
+    :returns: number of worksheets created, written and unchanged
     """
 
     print(f"[Worksheets] Saving to {config.GLOBAL_CONFIG.worksheets_path}")
     if not os.path.exists(config.GLOBAL_CONFIG.worksheets_path):
         os.makedirs(config.GLOBAL_CONFIG.worksheets_path, exist_ok=True)
 
+    result = {"created": 0, "written": 0, "unchanged": 0}
     for ws in worksheets:
-        ws_name = re.sub(r"[ :/]", "_", ws.name)
-        extension = "py" if ws.content_type == "python" else "sql"
-        if ws.folder_name:
-            folder_name = re.sub(r"[ :/]", "_", ws.folder_name)
-            file_name = f"{folder_name}/{ws_name}.{extension}"
-            worksheet_metadata_file_name = (
-                f"{folder_name}/.{ws_name}_metadata.json"
+        statuses = [
+            _write_if_changed(
+                config.GLOBAL_CONFIG.worksheets_path / file_name, content
             )
-
-            # create folder if not exists
-            if not os.path.exists(
-                config.GLOBAL_CONFIG.worksheets_path / folder_name
-            ):
-                os.mkdir(config.GLOBAL_CONFIG.worksheets_path / folder_name)
+            for file_name, content in worksheet_to_files(ws).items()
+        ]
+        # a worksheet is new when its content file is
+        if statuses[0] == "created":
+            result["created"] += 1
+        elif all(status == "unchanged" for status in statuses):
+            result["unchanged"] += 1
         else:
-            file_name = f"{ws_name}.{extension}"
-            worksheet_metadata_file_name = f".{ws_name}_metadata.json"
-
-        with open(config.GLOBAL_CONFIG.worksheets_path / file_name, "w", encoding="utf-8") as f:
-            f.write(ws.content)
-        ws_metadata = {
-            "name": ws.name,
-            "_id": ws._id,
-            "folder_name": ws.folder_name,
-            "folder_id": ws.folder_id,
-            "content_type": ws.content_type,
-        }
-        with open(
-            config.GLOBAL_CONFIG.worksheets_path
-            / worksheet_metadata_file_name,
-            "w",
-            encoding="utf-8",
-        ) as f:
-            f.write(json.dumps(ws_metadata))
-    print("[Worksheets] Saved")
+            result["written"] += 1
 
+    print(
+        f"[Worksheets] Saved ({result['created']} created, "
+        f"{result['written']} written, {result['unchanged']} unchanged)"
+    )
+    return result
 
-def load_worksheets_from_cache(
+
+def commit_worksheets(
     repo: git.Repo,
+    worksheets: Iterable[Worksheet],
+    message: str,
     branch_name: Optional[str] = None,
-    only_folder: Optional[Union[str, Path]] = None,
-) -> List[Worksheet]:
+) -> Optional[git.Commit]:
     """
-    Load worksheets from cache.
+    Commit worksheets files straight into the git object database,
+    as save_worksheets_to_cache would have written them, without
+    touching the working tree. Works with bare repositories.
 
-    :param repo: Git repository as it only considers tracked files
-    :param branch_name: name of git branch to get files from
-    :param only_folder: to get only worksheets in that folder
+    :param repo: git repository to commit to
+    :param worksheets: worksheets to commit
+    :param message: commit message
+    :param branch_name: branch to commit to, default is the current one
 
-    :return: list of tracked worksheet objects
+    :returns: new commit, None if worksheets were already committed
     """
 
-    print(f"[Worksheets] Loading from {config.GLOBAL_CONFIG.worksheets_path}")
-    if not os.path.exists(config.GLOBAL_CONFIG.worksheets_path):
-        raise WorksheetError(
-            "Could not retrieve worksheets from cache. "
-            f"The folder {config.GLOBAL_CONFIG.worksheets_path} does not exist"
-        )
+    try:
+        worksheets_dir = config.GLOBAL_CONFIG.worksheets_path.relative_to(
+            config.GLOBAL_CONFIG.repo_path
+        ).as_posix()
+    except ValueError as exc:
+        raise SnowflakeGitError(
+            f"Worksheets path {config.GLOBAL_CONFIG.worksheets_path}"
+            f" is not in Repository {config.GLOBAL_CONFIG.repo_path}"
+        ) from exc
+    prefix = "" if worksheets_dir == "." else f"{worksheets_dir}/"
 
-    tracked_files = [
-        f
-        for f in get_tracked_files(
-            repo, config.GLOBAL_CONFIG.worksheets_path, branch_name
-        )
-    ]
+    files = {}
+    for ws in worksheets:
+        for file_name, content in worksheet_to_files(ws).items():
+            files[f"{prefix}{file_name}"] = content
+
+    return commit_files(repo, files, message, branch_name=branch_name)
 
-    # filter on worksheet files
-    ws_metadata_files = [
-        f for f in tracked_files if f.name.endswith("_metadata.json")
+
+def _worksheet_files_candidates(path: str) -> List[str]:
+    """
+    Possible paths of the files of the worksheet owning a file,
+    metadata first.
+    """
+
+    folder, file_name = posixpath.split(path)
+    if file_name.startswith(".") and file_name.endswith("_metadata.json"):
+        stem = file_name[1:-len("_metadata.json")]
+    else:
+        stem = posixpath.splitext(file_name)[0]
+    return [
+        posixpath.join(folder, f".{stem}_metadata.json"),
+        posixpath.join(folder, f"{stem}.sql"),
+        posixpath.join(folder, f"{stem}.py"),
     ]
+
+
+def _parsed_tree_file(tree_sha: str) -> Path:
+    """Path of parsed worksheets of a git tree in the local store."""
+
+    return config.GLOBAL_CONFIG.cache_dir / "worksheets" / f"{tree_sha}.json"
+
+
+def _load_parsed_tree(
+    repo: git.Repo, tree_sha: str
+) -> Optional[List[Worksheet]]:
+    """
+    Parsed worksheets of a git tree, None if not in the local store.
+    Their contents are read back from git by blob sha.
+    A loaded tree is marked as recently used.
+    """
+
+    path = _parsed_tree_file(tree_sha)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)["worksheets"]
+        worksheets = [
+            Worksheet(
+                entry["_id"],
+                entry["name"],
+                entry["folder_id"],
+                entry["folder_name"],
+                content_type=entry["content_type"],
+            )
+            for entry in entries
+        ]
+        contents = get_blob_reader(repo).read_many(
+            [entry["content_sha"] for entry in entries]
+        )
+    except (OSError, ValueError, KeyError, TypeError, SnowflakeGitError):
+        return None
+    for ws, (_, content) in zip(worksheets, contents):
+        ws.content = content
+
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return worksheets
+
+
+def _save_parsed_tree(tree_sha: str, worksheets: List[Worksheet]):
+    """
+    Atomically save parsed worksheets of a git tree to the local store,
+    removing least recently used trees beyond MAX_CACHED_TREES.
+    Only metadata and content blob shas are saved, not contents.
+    """
+
+    path = _parsed_tree_file(tree_sha)
+    entries = []
+    for ws in worksheets:
+        entry = ws.to_dict()
+        # contents are blob bytes, their digest is the blob sha
+        entry["content_sha"] = content_digest(entry.pop("content"))
+        entries.append(entry)
+
+    os.makedirs(path.parent, mode=0o700, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"worksheets": entries}, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    # other processes may prune the store at the same time
+    saved_trees = []
+    for saved_tree in path.parent.glob("*.json"):
+        try:
+            saved_trees.append((saved_tree.stat().st_mtime_ns, saved_tree))
+        except OSError:
+            continue
+    saved_trees.sort()
+    for _, saved_tree in saved_trees[:-MAX_CACHED_TREES]:
+        try:
+            saved_tree.unlink()
+        except OSError:
+            continue
+
+
+def _parse_worksheets(tracked_files: Iterable) -> List[Worksheet]:
+    """
+    Map tracked worksheet files to worksheet objects,
+    reading all their contents at once.
+
+    :param tracked_files: blobs and trees of worksheets files
+
+    :returns: worksheets, none if a content file is missing
+    """
+
+    # index tracked files by (folder, filename), in a single pass
+    blobs_by_path = {}
+    ws_metadata_files = []
+    for f in tracked_files:
+        if not isinstance(f, Blob):
+            continue
+        blobs_by_path[(posixpath.dirname(f.path), f.name)] = f
+        if f.name.endswith("_metadata.json"):
+            ws_metadata_files.append(f)
     if len(ws_metadata_files) == 0:
         return []
 
     # map to worksheet objects
     worksheets = []
-    metadata_contents = get_blobs_content(ws_metadata_files)
+    content_blobs = []
+    metadata_contents = get_blobs_content(ws_metadata_files, by_path=True)
 
-    for wsf in metadata_contents.values():
+    for wsf_path, wsf in metadata_contents.items():
         ws_metadata = json.loads(wsf)
-        if only_folder and ws_metadata["folder_name"] != only_folder:
-            continue
         current_ws = Worksheet(
             ws_metadata["_id"],
             ws_metadata["name"],
@@ -119,20 +325,90 @@ def load_worksheets_from_cache(
             r"[ :/]", "_", f"{ws_metadata['name']}.{extension}"
         )
 
-        try:
-            content_blob = next(
-                f for f in tracked_files if f.name == content_filename
-            )
-        except StopIteration:
-            tracked_files = [f.name for f in tracked_files]
+        # content is next to its metadata
+        content_blob = blobs_by_path.get(
+            (posixpath.dirname(wsf_path), content_filename)
+        )
+        if content_blob is None:
             print(
-                f"{content_filename} not found in {tracked_files}"
+                f"{content_filename} not found in "
+                f"{posixpath.dirname(wsf_path) or '.'}"
             )
             return []
 
-        ws_content_as_dict = get_blobs_content([content_blob])
-        ws_content = list(ws_content_as_dict.values())[0]
-        current_ws.content = ws_content
         worksheets.append(current_ws)
+        content_blobs.append(content_blob)
+
+    contents = get_blobs_content(content_blobs, by_path=True)
+    for current_ws, content_blob in zip(worksheets, content_blobs):
+        current_ws.content = contents[content_blob.path]
+
+    return worksheets
+
+
+def load_worksheets_from_cache(
+    repo: git.Repo,
+    branch_name: Optional[str] = None,
+    only_folder: Optional[Union[str, Path]] = None,
+    only_paths: Optional[Iterable[str]] = None,
+) -> List[Worksheet]:
+    """
+    Load worksheets from cache.
+    Worksheets parsed from a git tree are kept in a local store keyed by
+    its sha, so that loading the same tree again only reads their
+    contents from git.
+
+    :param repo: Git repository as it only considers tracked files
+    :param branch_name: revision to get files from e.g. branch, tag
+        or commit sha, default is the checked out one
+    :param only_folder: to get only worksheets in that folder,
+        only its subtree is read
+    :param only_paths: to get only worksheets with a content or metadata
+        file at these paths, relative to worksheets path. Only their
+        files are read
+
+    :return: list of tracked worksheet objects
+    """
+
+    print(f"[Worksheets] Loading from {config.GLOBAL_CONFIG.worksheets_path}")
+    if not os.path.exists(config.GLOBAL_CONFIG.worksheets_path):
+        raise WorksheetError(
+            "Could not retrieve worksheets from cache. "
+            f"The folder {config.GLOBAL_CONFIG.worksheets_path} does not exist"
+        )
+    if only_folder:
+        only_folder = str(only_folder)
+
+    # only read worksheets files when restricted to paths
+    if only_paths is not None:
+        worksheets = _parse_worksheets(
+            get_tracked_blobs(
+                repo,
+                config.GLOBAL_CONFIG.worksheets_path,
+                dict.fromkeys(
+                    sibling
+                    for path in only_paths
+                    for sibling in _worksheet_files_candidates(path)
+                ),
+                branch_name,
+            )
+        )
+    else:
+        # only read the folder subtree when restricted to a folder
+        folder = config.GLOBAL_CONFIG.worksheets_path
+        if only_folder:
+            folder = folder / re.sub(r"[ :/]", "_", only_folder)
+        tree = get_tracked_tree(
+            repo, folder, branch_name, missing_ok=bool(only_folder)
+        )
+        if tree is None:
+            return []
+
+        worksheets = _load_parsed_tree(repo, tree.hexsha)
+        if worksheets is None:
+            worksheets = _parse_worksheets(tree.traverse())
+            _save_parsed_tree(tree.hexsha, worksheets)
 
+    if only_folder:
+        worksheets = [ws for ws in worksheets if ws.folder_name == only_folder]
     return worksheets
@@ -1,7 +1,19 @@
+import functools
+
 import click
 
-import sf_git.config as config
-import sf_git.commands
+import sf_git
+
+# commands import what they need when they run,
+# keep heavy modules (git, requests...) out of this module imports
+
+
+def _progress_logger(output_format: str):
+    """Progress messages go to stderr when stdout is for worksheets only."""
+
+    if output_format == "table":
+        return click.echo
+    return functools.partial(click.echo, err=True)
 
 
 @click.group()
@@ -38,7 +50,12 @@ def init(path: str, mkdir: bool):
     Initialize a git repository and set it as the sfgit versioning repository.
     """
 
-    sf_git.commands.init_repo_procedure(path=path, mkdir=mkdir)
+    import sf_git.config as config
+    import sf_git.config_commands
+
+    sf_git.config_commands.init_repo_procedure(
+        path=path, mkdir=mkdir, profile=config.active_profile()
+    )
 
 
 @click.command("config")
@@ -99,16 +116,22 @@ def config_repo(
     Git_repo configuration is mandatory.
     """
 
+    import sf_git.config as config
+    import sf_git.config_commands
+
     if get:
-        sf_git.commands.get_config_repo_procedure(get, click.echo)
+        sf_git.config_commands.get_config_repo_procedure(
+            get, click.echo, profile=config.active_profile()
+        )
     else:
-        sf_git.commands.set_config_repo_procedure(
+        sf_git.config_commands.set_config_repo_procedure(
             git_repo=git_repo,
             save_dir=save_dir,
             account=account,
             username=username,
             password=password,
             logger=click.echo,
+            profile=config.active_profile(),
         )
 
 
@@ -142,6 +165,34 @@ def config_repo(
     type=str,
     help="Only fetch worksheets with given folder name",
 )
+@click.option(
+    "--session-cache/--no-session-cache",
+    help="(Flag) Whether to reuse and save the cached Snowsight session.",
+    default=True,
+    show_default=True,
+)
+@click.option(
+    "--commit-direct",
+    is_flag=True,
+    help="(Flag) Commit worksheets straight into git,"
+    " without writing them to the worksheets directory.",
+)
+@click.option(
+    "--branch",
+    "-b",
+    type=str,
+    help="Branch to commit to with --commit-direct, not the checked out one."
+    " Optional for bare repositories, default is current.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["table", "json", "ids"]),
+    help="Format worksheets are printed in. With json or ids,"
+    " only worksheets are printed to stdout.",
+    default="table",
+    show_default=True,
+)
 def fetch_worksheets(
     username: str,
     account_id: str,
@@ -149,11 +200,18 @@ def fetch_worksheets(
     password: str,
     store: bool,
     only_folder: str,
+    session_cache: bool,
+    commit_direct: bool,
+    branch: str,
+    output_format: str,
 ):
     """
     Fetch worksheets from user Snowsight account and store them in cache.
     """
 
+    import sf_git.commands
+    import sf_git.config as config
+
     username = username or config.GLOBAL_CONFIG.sf_login_name
     account_id = account_id or config.GLOBAL_CONFIG.sf_account_id
     password = password or config.GLOBAL_CONFIG.sf_pwd
@@ -165,7 +223,12 @@ def fetch_worksheets(
         password=password,
         store=store,
         only_folder=only_folder,
-        logger=click.echo,
+        use_session_cache=session_cache,
+        commit_direct=commit_direct,
+        branch=branch,
+        output_format=output_format,
+        output=click.echo,
+        logger=_progress_logger(output_format),
     )
 
 
@@ -185,6 +248,8 @@ def commit(
     Commit Snowsight worksheets to Git repository.
     """
 
+    import sf_git.commands
+
     sf_git.commands.commit_procedure(
         branch=branch, message=message, logger=click.echo
     )
@@ -211,7 +276,8 @@ def commit(
     "--branch",
     "-b",
     type=str,
-    help="Branch to commit to. Default is current.",
+    help="Branch, tag or commit to push worksheets from."
+    " Default is current.",
 )
 @click.option(
     "--only-folder",
@@ -219,6 +285,52 @@ def commit(
     type=str,
     help="Only push worksheets with given folder name",
 )
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    help="Maximum number of concurrent calls to Snowsight.",
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "--session-cache/--no-session-cache",
+    help="(Flag) Whether to reuse and save the cached Snowsight session.",
+    default=True,
+    show_default=True,
+)
+@click.option(
+    "--since",
+    type=str,
+    help="Only push worksheets changed since this revision.",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="(Flag) Only push worksheets changed since the last push.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["table", "json", "ids"]),
+    help="Format worksheets are printed in. With json or ids,"
+    " only worksheets are printed to stdout.",
+    default="table",
+    show_default=True,
+)
+@click.option(
+    "--plan",
+    "plan_path",
+    type=str,
+    help="Save to this file the operations a push would perform, computed"
+    " offline against Snowsight state of the last fetch. Nothing is pushed.",
+)
+@click.option(
+    "--apply-plan",
+    "apply_plan_path",
+    type=str,
+    help="Push worksheets as planned in this file by --plan.",
+)
 def push_worksheets(
     username: str,
     account_id: str,
@@ -226,6 +338,13 @@ def push_worksheets(
     password: str,
     branch: str,
     only_folder: str,
+    jobs: int,
+    session_cache: bool,
+    since: str,
+    incremental: bool,
+    output_format: str,
+    plan_path: str,
+    apply_plan_path: str,
 ):
     """
     Upload locally stored worksheets to Snowsight user workspace.
@@ -233,10 +352,57 @@ def push_worksheets(
     More flexibility to come.
     """
 
+    import sf_git.commands
+    import sf_git.config as config
+
     username = username or config.GLOBAL_CONFIG.sf_login_name
     account_id = account_id or config.GLOBAL_CONFIG.sf_account_id
     password = password or config.GLOBAL_CONFIG.sf_pwd
 
+    if plan_path and apply_plan_path:
+        raise click.UsageError("--plan and --apply-plan are exclusive")
+    if plan_path or apply_plan_path:
+        # options a plan does not use, or has already recorded
+        plan_option = "--plan" if plan_path else "--apply-plan"
+        unused_options = {
+            "--since": since,
+            "--incremental": incremental,
+            "--format": output_format != "table",
+        }
+        if apply_plan_path:
+            unused_options.update({
+                "--branch": branch,
+                "--only-folder": only_folder,
+                "--jobs": jobs != 1,
+            })
+        for option, given in unused_options.items():
+            if given:
+                raise click.UsageError(
+                    f"{option} cannot be used with {plan_option}"
+                )
+    if plan_path:
+        sf_git.commands.plan_push_procedure(
+            username=username,
+            account_id=account_id,
+            plan_path=plan_path,
+            branch=branch,
+            only_folder=only_folder,
+            jobs=jobs,
+            logger=click.echo,
+        )
+        return
+    if apply_plan_path:
+        sf_git.commands.apply_push_plan_procedure(
+            username=username,
+            account_id=account_id,
+            plan_path=apply_plan_path,
+            auth_mode=auth_mode,
+            password=password,
+            use_session_cache=session_cache,
+            logger=click.echo,
+        )
+        return
+
     sf_git.commands.push_worksheets_procedure(
         username=username,
         account_id=account_id,
@@ -244,6 +410,80 @@ def push_worksheets(
         password=password,
         branch=branch,
         only_folder=only_folder,
+        jobs=jobs,
+        use_session_cache=session_cache,
+        since=since,
+        incremental=incremental,
+        output_format=output_format,
+        output=click.echo,
+        logger=_progress_logger(output_format),
+    )
+
+
+@click.command("sync")
+@click.option("--username", "-u", type=str, help="Snowflake user")
+@click.option(
+    "--account-id",
+    "-a",
+    type=str,
+    help="Snowflake Account Id",
+)
+@click.option(
+    "--auth-mode",
+    "-am",
+    type=str,
+    help="Authentication Mode. Currently supports PWD (Default) and SSO.",
+    default="PWD",
+    show_default=True,
+)
+@click.option("--password", "-p", type=str, help="Snowflake password")
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    help="Maximum number of concurrent calls to Snowsight.",
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "--message", "-m", type=str, help="Message of Snowsight changes commit"
+)
+@click.option(
+    "--session-cache/--no-session-cache",
+    help="(Flag) Whether to reuse and save the cached Snowsight session.",
+    default=True,
+    show_default=True,
+)
+def sync(
+    username: str,
+    account_id: str,
+    auth_mode: str,
+    password: str,
+    jobs: int,
+    message: str,
+    session_cache: bool,
+):
+    """
+    Synchronize committed worksheets and Snowsight in both ways.
+    Worksheets only changed in Snowsight since last sync are committed,
+    those only changed locally are pushed, conflicts are reported.
+    """
+
+    import sf_git.commands
+    import sf_git.config as config
+
+    username = username or config.GLOBAL_CONFIG.sf_login_name
+    account_id = account_id or config.GLOBAL_CONFIG.sf_account_id
+    password = password or config.GLOBAL_CONFIG.sf_pwd
+
+    sf_git.commands.sync_procedure(
+        username=username,
+        account_id=account_id,
+        auth_mode=auth_mode,
+        password=password,
+        jobs=jobs,
+        message=message,
+        use_session_cache=session_cache,
         logger=click.echo,
     )
 
@@ -254,14 +494,107 @@ def diff():
     Displays unstaged changes on worksheets
     """
 
+    import sf_git.commands
+
     sf_git.commands.diff_procedure(logger=click.echo)
 
 
+@click.command("status")
+@click.option("--username", "-u", type=str, help="Snowflake user")
+@click.option(
+    "--account-id",
+    "-a",
+    type=str,
+    help="Snowflake Account Id",
+)
+@click.option(
+    "--auth-mode",
+    "-am",
+    type=str,
+    help="Authentication Mode. Currently supports PWD (Default) and SSO.",
+    default="PWD",
+    show_default=True,
+)
+@click.option("--password", "-p", type=str, help="Snowflake password")
+@click.option(
+    "--branch",
+    "-b",
+    type=str,
+    help="Branch to compare to Snowsight. Default is current.",
+)
+@click.option(
+    "--refresh-remote",
+    is_flag=True,
+    help="(Flag) Fetch Snowsight state before comparing to it.",
+)
+@click.option(
+    "--session-cache/--no-session-cache",
+    help="(Flag) Whether to reuse and save the cached Snowsight session.",
+    default=True,
+    show_default=True,
+)
+def status(
+    username: str,
+    account_id: str,
+    auth_mode: str,
+    password: str,
+    branch: str,
+    refresh_remote: bool,
+    session_cache: bool,
+):
+    """
+    Displays worksheets status. First column is the working tree change
+    (A added, M modified, D deleted), second one the difference between
+    branch and last known Snowsight state (M modified, L only committed,
+    S only in Snowsight).
+    """
+
+    import sf_git.commands
+    import sf_git.config as config
+
+    username = username or config.GLOBAL_CONFIG.sf_login_name
+    account_id = account_id or config.GLOBAL_CONFIG.sf_account_id
+    password = password or config.GLOBAL_CONFIG.sf_pwd
+
+    sf_git.commands.status_procedure(
+        username=username,
+        account_id=account_id,
+        auth_mode=auth_mode,
+        password=password,
+        branch=branch,
+        refresh_remote=refresh_remote,
+        use_session_cache=session_cache,
+        logger=click.echo,
+    )
+
+
 @click.group()
 @click.version_option(sf_git.__version__)
+@click.option(
+    "--profile",
+    type=str,
+    help="Configuration profile (account, user, repository...) to use,"
+    " created with sfgit --profile <name> config."
+    " Default is $SF_GIT_PROFILE if set.",
+)
 @click.pass_context
-def cli(ctx):
-    pass
+def cli(ctx, profile: str):
+    if profile:
+        import sf_git.config as config
+        from sf_git.models import ConfigError
+
+        try:
+            config.select_profile(profile)
+        except ConfigError as exc:
+            raise click.BadParameter(exc.message, param_hint="--profile")
+        # init and config create profiles, others use existing ones
+        creates_profile = ctx.invoked_subcommand in ("init", "config")
+        if not creates_profile and profile not in config.list_profiles():
+            raise click.BadParameter(
+                f"Unknown profile {profile}, configured ones are"
+                f" {', '.join(config.list_profiles()) or 'none'}",
+                param_hint="--profile",
+            )
 
 
 cli.add_command(init)
@@ -270,6 +603,8 @@ cli.add_command(fetch_worksheets)
 cli.add_command(commit)
 cli.add_command(push_worksheets)
 cli.add_command(diff)
+cli.add_command(status)
+cli.add_command(sync)
 
 if __name__ == "__main__":
     cli()
@@ -1,177 +1,120 @@
+import json
 import os
-import platform
-from typing import Callable, List
-from pathlib import Path, WindowsPath
+import posixpath
+from typing import Callable, Iterator, List, Optional
+from pathlib import Path
 import git
-import dotenv
 
 from click import UsageError
 
 import sf_git.config as config
-from sf_git.cache import load_worksheets_from_cache
+from sf_git.auth_cache import delete_session, load_session, save_session
+from sf_git.cache import (
+    commit_worksheets,
+    load_worksheets_from_cache,
+    save_worksheets_to_cache,
+    worksheet_to_files,
+)
+from sf_git.config_commands import (  # noqa: F401 (moved, kept importable)
+    get_config_repo_procedure,
+    init_repo_procedure,
+    set_config_repo_procedure,
+)
 from sf_git.snowsight_auth import authenticate_to_snowsight
-from sf_git.models import AuthenticationMode, SnowflakeGitError, Worksheet
+from sf_git.remote_state import (
+    classify_sync,
+    load_pushed_commit,
+    load_remote_folders,
+    load_remote_state,
+    plan_push,
+    record_pushed_commit,
+    record_remote_state,
+    record_states,
+    worksheet_state,
+    worksheets_status,
+)
+from sf_git.models import (
+    AuthenticationContext,
+    AuthenticationMode,
+    EntityIndex,
+    SnowflakeGitError,
+    Worksheet,
+)
+from sf_git.worksheets_utils import get_entity_index as sf_get_index
 from sf_git.worksheets_utils import get_worksheets as sf_get_worksheets
+from sf_git.worksheets_utils import iter_worksheets as sf_iter_worksheets
 from sf_git.worksheets_utils import (
+    is_session_valid,
     print_worksheets,
     upload_to_snowsight,
+    worksheet_summary,
+)
+from sf_git.git_utils import (
+    get_changed_files,
+    get_changed_paths,
+    is_checked_out,
+    iter_diff,
+    resolve_commit,
 )
-from sf_git.git_utils import diff
-from sf_git import DOTENV_PATH
-
-
-def init_repo_procedure(path: str, mkdir: bool = False) -> str:
-    """
-    Initialize a git repository.
-
-    :param path: absolute or relative path to git repository root
-    :param mkdir: create the repository if it doesn't exist
-
-    :return: new value of versioning repo in sf_git config
-    """
-    p_constructor = WindowsPath if platform.system() == "Windows" else Path
-    abs_path = p_constructor(path).absolute()
-    if not os.path.exists(abs_path) and not mkdir:
-        raise UsageError(
-            f"[Init] {abs_path} does not exist."
-            "\nPlease provide a path towards an existing directory"
-            " or add the --mkdir option to create it."
-        )
-
-    # create repository
-    git.Repo.init(path, mkdir=mkdir)
-
-    # set as sf_git versioning repository
-    dotenv.set_key(
-        DOTENV_PATH,
-        key_to_set="SNOWFLAKE_VERSIONING_REPO",
-        value_to_set=str(abs_path),
-    )
-
-    return dotenv.get_key(DOTENV_PATH, "SNOWFLAKE_VERSIONING_REPO")
-
-
-def get_config_repo_procedure(key: str, logger: Callable = print) -> str:
-    """
-    Get sf_git config value.
-
-    :param key: key to retrieve value for
-    :param logger: logging function e.g. print
-
-    :returns: sf_git config value
-    """
-
-    dotenv_config = dotenv.dotenv_values(DOTENV_PATH)
-    if key not in dotenv_config.keys():
-        raise UsageError(
-            f"[Config] {key} does not exist.\n"
-            "Config values to be retrieved are "
-            f"{list(dotenv_config.keys())}"
-        )
-
-    logger(dotenv_config[key])
 
-    return dotenv_config[key]
+DEFAULT_COMMIT_MESSAGE = "[UPDATE] Snowflake worksheets"
+SYNC_COMMIT_MESSAGE = "[SYNC] Snowflake worksheets"
 
 
-def set_config_repo_procedure(
-    git_repo: str = None,
-    save_dir: str = None,
-    account: str = None,
-    username: str = None,
+def _authenticate(
+    username: str,
+    account_id: str,
+    auth_mode: str = None,
     password: str = None,
+    use_session_cache: bool = True,
     logger: Callable = print,
-) -> dict:
+) -> AuthenticationContext:
     """
-    Set sf_git config values.
+    Authenticate to Snowsight, reusing the cached session
+    while Snowsight accepts it. The cached session is only dropped
+    when Snowsight rejects it, network errors are raised.
 
-    :param git_repo: if provided, set the git repository path
-    :param save_dir: if provided, set the worksheet directory path
-    :param account: if provided, set the account id
-    :param username: if provided, set the user login name
-    :param password: if provided, set the user password
+    :param username: username to authenticate
+    :param account_id: account id to authenticate
+    :param auth_mode: authentication mode, supported are PWD (default) and SSO
+    :param password: password to authenticate (not required for SSO)
+    :param use_session_cache: (flag) reuse and save cached sessions
     :param logger: logging function e.g. print
 
-    :returns: dict with newly set keys and their values
-    """
+    :returns: authentication context
+    """  # noqa: E501
 
-    updates = {}
+    if not auth_mode or auth_mode == "PWD":
+        auth_mode = AuthenticationMode.PWD
+    elif auth_mode == "SSO":
+        auth_mode = AuthenticationMode.SSO
+        password = None
+    else:
+        raise UsageError(f"{auth_mode} is not supported.")
 
-    # check repositories
-    if git_repo:
-        repo_path = Path(git_repo).absolute()
-        if not os.path.exists(repo_path):
-            raise UsageError(
-                f"[Config] {git_repo} does not exist."
-                "Please provide path towards an existing git repository"
-                " or create a new one with sfgit init."
-            )
+    if use_session_cache:
+        auth_context = load_session(account_id, username)
+        if auth_context is not None:
+            if is_session_valid(auth_context):
+                logger(" ## Reusing cached Snowsight session ##")
+                return auth_context
+            delete_session(account_id, username)
 
-    if save_dir:
-        save_dir = Path(save_dir).absolute()
-        # get git_repo
-        repo_path = (
-            Path(git_repo).absolute()
-            if git_repo
-            else config.GLOBAL_CONFIG.repo_path
-        )
-        if repo_path not in save_dir.parents and repo_path != save_dir:
+    if auth_mode == AuthenticationMode.PWD:
+        if not password:
             raise UsageError(
-                "[Config] "
-                f"{save_dir} is not a subdirectory of {repo_path}.\n"
-                "Please provide a saving directory within the git repository."
+                "No password provided for PWD authentication mode."
+                "Please provide one."
             )
+        logger(f" ## Password authentication with username={username} ##")
 
-    if git_repo:
-        dotenv.set_key(
-            DOTENV_PATH,
-            key_to_set="SNOWFLAKE_VERSIONING_REPO",
-            value_to_set=str(git_repo),
-        )
-        logger(f"Set SNOWFLAKE_VERSIONING_REPO to {str(git_repo)}")
-        updates["SNOWFLAKE_VERSIONING_REPO"] = dotenv.get_key(
-            DOTENV_PATH, "SNOWFLAKE_VERSIONING_REPO"
-        )
-
-    if save_dir:
-        dotenv.set_key(
-            DOTENV_PATH,
-            key_to_set="WORKSHEETS_PATH",
-            value_to_set=str(save_dir),
-        )
-        logger(f"Set WORKSHEETS_PATH to {str(save_dir)}")
-        updates["WORKSHEETS_PATH"] = dotenv.get_key(
-            DOTENV_PATH, "WORKSHEETS_PATH"
-        )
-
-    if account:
-        dotenv.set_key(
-            DOTENV_PATH,
-            key_to_set="SF_ACCOUNT_ID",
-            value_to_set=account,
-        )
-        logger(f"Set SF_ACCOUNT_ID to {account}")
-        updates["SF_ACCOUNT_ID"] = dotenv.get_key(DOTENV_PATH, "SF_ACCOUNT_ID")
-
-    if username:
-        dotenv.set_key(
-            DOTENV_PATH,
-            key_to_set="SF_LOGIN_NAME",
-            value_to_set=username,
-        )
-        logger(f"Set SF_LOGIN_NAME to {username}")
-        updates["SF_LOGIN_NAME"] = dotenv.get_key(DOTENV_PATH, "SF_LOGIN_NAME")
-
-    if password:
-        dotenv.set_key(
-            DOTENV_PATH,
-            key_to_set="SF_PWD",
-            value_to_set=password,
-        )
-        logger("Set SF_PWD to provided password.")
-        updates["SF_PWD"] = "*" * len(password)
+    auth_context = authenticate_to_snowsight(
+        account_id, username, password, auth_mode=auth_mode
+    )
+    if use_session_cache:
+        save_session(account_id, username, auth_context)
 
-    return updates
+    return auth_context
 
 
 def fetch_worksheets_procedure(
@@ -181,6 +124,11 @@ def fetch_worksheets_procedure(
     password: str = None,
     only_folder: str = None,
     store: bool = True,
+    use_session_cache: bool = True,
+    commit_direct: bool = False,
+    branch: str = None,
+    output_format: str = "table",
+    output: Optional[Callable] = None,
     logger: Callable = print,
 ) -> List[Worksheet]:
     """
@@ -192,37 +140,48 @@ def fetch_worksheets_procedure(
     :param password: password to authenticate (not required for SSO)
     :param only_folder: name of folder if only fetch a specific folder from Snowsight
     :param store: (flag) save worksheets locally in configured worksheet directory
+    :param use_session_cache: (flag) reuse and save cached Snowsight sessions
+    :param commit_direct: (flag) commit worksheets straight into git instead of saving them
+    :param branch: branch to commit to with commit_direct, not the checked out one (optional if bare)
+    :param output_format: format worksheets are printed in, table (default), json or ids
+    :param output: function worksheets are printed with, defaults to logger
     :param logger: logging function e.g. print
 
-    :returns: list of fetched worksheets
+    :returns: list of fetched worksheets, with only a preview of their content
     """  # noqa: E501
 
-    # Get auth parameters
-    logger(" ## Authenticating to Snowsight ##")
+    if branch and not commit_direct:
+        raise UsageError(
+            "[Fetch] --branch can only be used with --commit-direct"
+        )
 
-    if auth_mode:
-        if auth_mode == "SSO":
-            auth_mode = AuthenticationMode.SSO
-            password = None
-        elif auth_mode == "PWD":
-            auth_mode = AuthenticationMode.PWD
-            if not password:
-                raise UsageError(
-                    "No password provided for PWD authentication mode."
-                    "Please provide one."
-                )
-        else:
-            raise UsageError(f"{auth_mode} is not supported.")
-    else:  # default
-        auth_mode = AuthenticationMode.PWD
-        if not password:
+    try:
+        repo = git.Repo(config.GLOBAL_CONFIG.repo_path)
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError) as exc:
+        if commit_direct:
+            raise SnowflakeGitError(
+                "Could not find Git Repository here : "
+                f"{config.GLOBAL_CONFIG.repo_path}"
+            ) from exc
+        repo = None
+    if commit_direct:
+        # the checked out branch would move away from index and working tree
+        if not repo.bare and (branch is None or is_checked_out(repo, branch)):
             raise UsageError(
-                "No password provided for PWD authentication mode."
-                "Please provide one."
+                "[Fetch] --commit-direct needs a --branch other than the"
+                " checked out one, unless the repository is bare"
             )
-    logger(f" ## Password authentication with username={username} ##")
-    auth_context = authenticate_to_snowsight(
-        account_id, username, password, auth_mode=auth_mode
+        store = False
+
+    # Get auth parameters
+    logger(" ## Authenticating to Snowsight ##")
+    auth_context = _authenticate(
+        username,
+        account_id,
+        auth_mode=auth_mode,
+        password=password,
+        use_session_cache=use_session_cache,
+        logger=logger,
     )
 
     if auth_context.snowsight_token != "":
@@ -232,29 +191,70 @@ def fetch_worksheets_procedure(
         exit(1)
 
     logger(" ## Getting worksheets ##")
-    worksheets = sf_get_worksheets(
-        auth_context, store_to_cache=store, only_folder=only_folder
-    )
+    index = EntityIndex()
+    remote_state = {}
+    worksheets = []
+
+    def fetched() -> Iterator[Worksheet]:
+        # worksheets are handled as pages arrive, only summaries are kept
+        for ws in sf_iter_worksheets(
+            auth_context, only_folder=only_folder or None, index=index
+        ):
+            remote_state[ws._id] = worksheet_state(ws)
+            worksheets.append(worksheet_summary(ws))
+            yield ws
+
+    if commit_direct:
+        new_commit = commit_worksheets(
+            repo, fetched(), DEFAULT_COMMIT_MESSAGE, branch_name=branch
+        )
+    elif store:
+        save_worksheets_to_cache(fetched())
+    else:
+        for _ in fetched():
+            pass
 
     logger("## Got worksheets ##")
-    print_worksheets(worksheets, logger=logger)
+    print_worksheets(
+        worksheets, logger=output or logger, output_format=output_format
+    )
+
+    # Record Snowsight state, to compare with it offline
+    if repo is not None:
+        record_states(
+            repo,
+            account_id,
+            username,
+            remote_state,
+            folders=[folder.name for folder in index.folders],
+            only_folder=only_folder or None,
+        )
+
+    if commit_direct:
+        if new_commit is None:
+            logger("## Worksheets already committed ##")
+        else:
+            logger(f"## Committed worksheets as {new_commit.hexsha} ##")
 
     if store and worksheets:
-        worksheet_path = dotenv.get_key(DOTENV_PATH, "WORKSHEETS_PATH")
+        worksheet_path = config.GLOBAL_CONFIG.worksheets_path
         logger(f"## Worksheets saved to {worksheet_path} ##")
 
     return worksheets
 
 
-def commit_procedure(branch: str, message: str, logger: Callable) -> str:
+def commit_procedure(branch: str, message: str, logger: Callable) -> dict:
     """
-    Commits all worksheets in worksheet directory
+    Commits worksheets changed in worksheet directory.
+    Only added, modified and deleted worksheet files are staged,
+    no commit is created if none changed.
 
     :param branch: name of branch to commit to, defaults to active one
     :param message: commit message
     :param logger: logging function e.g. print
 
-    :returns: commit sha
+    :returns: commit sha (None if nothing to commit) and changed files,
+        relative to worksheet directory
     """
     # Get git repo
     try:
@@ -278,20 +278,47 @@ def commit_procedure(branch: str, message: str, logger: Callable) -> str:
     else:
         branch = repo.active_branch
 
-    # Add worksheets to staged files
-    repo.index.add(config.GLOBAL_CONFIG.worksheets_path)
+    # Stage changed worksheets only
+    changes = get_changed_files(repo, config.GLOBAL_CONFIG.worksheets_path)
+    to_add = changes["added"] + changes["modified"]
+    if to_add:
+        repo.index.add(to_add)
+    if changes["deleted"]:
+        # deletions may already be staged
+        repo.index.remove(changes["deleted"], ignore_unmatch=True)
+
+    worksheets_dir = config.GLOBAL_CONFIG.worksheets_path.relative_to(
+        repo.working_tree_dir
+    )
+    summary = {
+        change_type: [
+            Path(path).relative_to(worksheets_dir).as_posix()
+            for path in paths
+        ]
+        for change_type, paths in changes.items()
+    }
+    summary["commit"] = None
+
+    if not any(changes.values()):
+        logger(f"## No worksheet changes to commit on branch {branch.name}")
+        return summary
 
     # Commit
     if message:
         commit_message = message
     else:
-        commit_message = "[UPDATE] Snowflake worksheets"
+        commit_message = DEFAULT_COMMIT_MESSAGE
 
     c = repo.index.commit(message=commit_message)
+    summary["commit"] = c.hexsha
 
-    logger(f"## Committed worksheets to branch {branch.name}")
+    logger(
+        f"## Committed worksheets to branch {branch.name}"
+        f" ({len(summary['added'])} added, {len(summary['modified'])}"
+        f" modified, {len(summary['deleted'])} deleted files)"
+    )
 
-    return c.hexsha
+    return summary
 
 
 def push_worksheets_procedure(
@@ -301,10 +328,18 @@ def push_worksheets_procedure(
     password: str = None,
     branch: str = None,
     only_folder: str = None,
+    jobs: int = 1,
+    use_session_cache: bool = True,
+    since: str = None,
+    incremental: bool = False,
+    output_format: str = "table",
+    output: Optional[Callable] = None,
     logger: Callable = print,
 ) -> dict:
     """
     Push committed worksheet to Snowsight.
+    After a push without errors, the pushed commit is recorded
+    so that the next incremental push only uploads what changed since.
 
     :param username: username to authenticate
     :param account_id: account id to authenticate
@@ -312,41 +347,84 @@ def push_worksheets_procedure(
     :param password: password to authenticate (not required for SSO)
     :param only_folder: name of folder if only push a specific folder to Snowsight
     :param branch: branch to get worksheets from
+    :param jobs: maximum number of concurrent calls to Snowsight
+    :param use_session_cache: (flag) reuse and save cached Snowsight sessions
+    :param since: only push worksheets changed since this revision
+    :param incremental: (flag) only push worksheets changed since last recorded push
+    :param output_format: format worksheets are printed in, table (default), json or ids
+    :param output: function worksheets are printed with, defaults to logger
     :param logger: logging function e.g. print
 
     :returns: upload report with success and errors per worksheet
     """  # noqa: E501
 
-    # Get auth parameters
-    logger(" ## Authenticating to Snowsight ##")
     if not username:
         raise SnowflakeGitError("No username to authenticate with.")
     if not account_id:
         raise SnowflakeGitError("No account to authenticate with.")
+    if since and incremental:
+        raise UsageError("[Push] --since and --incremental are exclusive")
 
-    if auth_mode:
-        if auth_mode == "SSO":
-            auth_mode = AuthenticationMode.SSO
-            password = None
-        elif auth_mode == "PWD":
-            auth_mode = AuthenticationMode.PWD
-            if not password:
-                raise UsageError(
-                    "No password provided for PWD authentication mode."
-                    "Please provide one."
-                )
+    # Get file content from git utils
+    try:
+        repo = git.Repo(config.GLOBAL_CONFIG.repo_path)
+    except git.InvalidGitRepositoryError as exc:
+        raise SnowflakeGitError(
+            "Could not find Git Repository here : "
+            f"{config.GLOBAL_CONFIG.repo_path}"
+        ) from exc
+
+    if incremental:
+        last_pushed = load_pushed_commit(repo, account_id, username)
+        if last_pushed is None:
+            logger("## No push recorded, pushing all worksheets ##")
         else:
-            raise UsageError(f"{auth_mode} is not supported.")
-    else:  # default
-        auth_mode = AuthenticationMode.PWD
-        if not password:
-            raise UsageError(
-                "No password provided for PWD authentication mode."
-                "Please provide one."
+            since = last_pushed.hexsha
+
+    logger(f" ## Getting worksheets from cache for user {username} ##")
+    if since:
+        worksheets_path = config.GLOBAL_CONFIG.worksheets_path
+        worksheets_dir = worksheets_path.relative_to(
+            repo.working_tree_dir
+        ).as_posix()
+        changed_paths = [
+            posixpath.relpath(path, worksheets_dir)
+            for path in get_changed_paths(
+                repo, worksheets_path, since, branch_name=branch
             )
+        ]
+        logger(f"## {len(changed_paths)} files changed since {since} ##")
+        worksheets = load_worksheets_from_cache(
+            repo=repo,
+            branch_name=branch,
+            only_folder=only_folder,
+            only_paths=changed_paths,
+        )
+    else:
+        worksheets = load_worksheets_from_cache(
+            repo=repo,
+            branch_name=branch,
+            only_folder=only_folder,
+        )
 
-    auth_context = authenticate_to_snowsight(
-        account_id, username, password, auth_mode=auth_mode
+    logger("## Got worksheets ##")
+    print_worksheets(
+        worksheets, logger=output or logger, output_format=output_format
+    )
+
+    if since and not worksheets:
+        logger("## Nothing to push ##")
+        return {"completed": [], "errors": []}
+
+    # Get auth parameters
+    logger(" ## Authenticating to Snowsight ##")
+    auth_context = _authenticate(
+        username,
+        account_id,
+        auth_mode=auth_mode,
+        password=password,
+        use_session_cache=use_session_cache,
+        logger=logger,
     )
 
     if auth_context.snowsight_token != "":
@@ -355,7 +433,81 @@ def push_worksheets_procedure(
         logger(" ## Authentication failed ##")
         exit(1)
 
-    # Get file content from git utils
+    logger("## Uploading to SnowSight ##")
+    upload_report = upload_to_snowsight(auth_context, worksheets, jobs=jobs)
+    worksheet_errors = upload_report["errors"]
+    logger("## Uploaded to SnowSight ##")
+
+    entries = upload_report["completed"] + worksheet_errors
+    retries = sum(entry.get("retries", 0) for entry in entries)
+    if retries:
+        retry_wait = sum(entry.get("retry_wait", 0) for entry in entries)
+        logger(f"{retries} retries, {retry_wait:.1f}s spent waiting")
+
+    if worksheet_errors:
+        logger("Errors happened for the following worksheets :")
+        for err in worksheet_errors:
+            logger(
+                f"Name : {err['name']} "
+                f"| Error type : {err['error'].snowsight_error}"
+            )
+    elif not only_folder and repo.head.is_valid():
+        # next incremental push starts from here
+        record_pushed_commit(
+            repo, account_id, username, repo.commit(branch or "HEAD")
+        )
+
+    return upload_report
+
+
+def _log_plan(plan: dict, logger: Callable):
+    for folder_name in plan["folders_to_create"]:
+        logger(f"create folder    {folder_name}")
+    for operation in ("create", "update"):
+        for entry in plan[operation]:
+            logger(f"{operation} worksheet {entry['path']}")
+    logger(
+        f"## {len(plan['folders_to_create'])} folders to create,"
+        f" {len(plan['create'])} worksheets to create,"
+        f" {len(plan['update'])} to update,"
+        f" {len(plan['unchanged'])} unchanged ##"
+    )
+    logger(
+        f"## {plan['requests']} Snowsight requests, about"
+        f" {plan['estimated_seconds']}s with {plan['jobs']} jobs ##"
+    )
+
+
+def plan_push_procedure(
+    username: str,
+    account_id: str,
+    plan_path: str,
+    branch: str = None,
+    only_folder: str = None,
+    jobs: int = 1,
+    logger: Callable = print,
+) -> dict:
+    """
+    Plan a push of committed worksheets, without calling Snowsight.
+    Operations are computed against the Snowsight state recorded by the
+    last fetch, then saved to be applied with apply_push_plan_procedure.
+
+    :param username: Snowflake user whose Snowsight state to plan against
+    :param account_id: Snowflake account whose Snowsight state to plan against
+    :param plan_path: file to save the plan to
+    :param branch: revision to push worksheets from, defaults to current one
+    :param only_folder: name of folder if only push a specific folder to Snowsight
+    :param jobs: maximum number of concurrent calls to Snowsight
+    :param logger: logging function e.g. print
+
+    :returns: push plan, see remote_state.plan_push
+    """  # noqa: E501
+
+    if not username:
+        raise UsageError("[Push] No username to plan a push for.")
+    if not account_id:
+        raise UsageError("[Push] No account to plan a push for.")
+
     try:
         repo = git.Repo(config.GLOBAL_CONFIG.repo_path)
     except git.InvalidGitRepositoryError as exc:
@@ -364,39 +516,444 @@ def push_worksheets_procedure(
             f"{config.GLOBAL_CONFIG.repo_path}"
         ) from exc
 
-    logger(f" ## Getting worksheets from cache for user {username} ##")
+    remote_state = load_remote_state(repo, account_id, username)
+    if remote_state is None:
+        raise UsageError(
+            "[Push] Snowsight state unknown, plan a push after a fetch"
+            " or sfgit status --refresh-remote"
+        )
+
+    commit = resolve_commit(repo, branch)
     worksheets = load_worksheets_from_cache(
-        repo=repo,
-        branch_name=branch,
-        only_folder=only_folder,
+        repo=repo, branch_name=commit.hexsha, only_folder=only_folder
     )
+    plan = {
+        "account": account_id,
+        "user": username,
+        "commit": commit.hexsha,
+        "only_folder": only_folder or None,
+        **plan_push(
+            worksheets,
+            remote_state,
+            jobs=jobs,
+            remote_folders=load_remote_folders(repo, account_id, username),
+        ),
+    }
+
+    with open(plan_path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=1)
+
+    _log_plan(plan, logger)
+    logger(f"## Plan saved to {plan_path} ##")
+    return plan
+
+
+def apply_push_plan_procedure(
+    username: str,
+    account_id: str,
+    plan_path: str,
+    auth_mode: str = None,
+    password: str = None,
+    use_session_cache: bool = True,
+    logger: Callable = print,
+) -> dict:
+    """
+    Push worksheets as planned by plan_push_procedure: only worksheets
+    planned to be created or updated are uploaded, from the planned
+    commit. Nothing is uploaded if any of them changed in Snowsight
+    since the plan was made.
+
+    :param username: username to authenticate, must be the planned one
+    :param account_id: account id to authenticate, must be the planned one
+    :param plan_path: file the plan was saved to
+    :param auth_mode: authentication mode, supported are PWD (default) and SSO
+    :param password: password to authenticate (not required for SSO)
+    :param use_session_cache: (flag) reuse and save cached Snowsight sessions
+    :param logger: logging function e.g. print
 
-    logger("## Got worksheets ##")
-    print_worksheets(worksheets, logger=logger)
+    :returns: upload report with success and errors per worksheet
+    """  # noqa: E501
 
-    logger("## Uploading to SnowSight ##")
-    upload_report = upload_to_snowsight(auth_context, worksheets)
-    worksheet_errors = upload_report["errors"]
-    logger("## Uploaded to SnowSight ##")
+    with open(plan_path, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    if (plan["account"], plan["user"]) != (account_id, username):
+        raise UsageError(
+            f"[Push] Plan is for {plan['user']} on {plan['account']},"
+            f" not {username} on {account_id}"
+        )
 
-    if worksheet_errors:
+    try:
+        repo = git.Repo(config.GLOBAL_CONFIG.repo_path)
+    except git.InvalidGitRepositoryError as exc:
+        raise SnowflakeGitError(
+            "Could not find Git Repository here : "
+            f"{config.GLOBAL_CONFIG.repo_path}"
+        ) from exc
+
+    _log_plan(plan, logger)
+    planned = [entry["path"] for entry in plan["create"] + plan["update"]]
+    upload_report = {"completed": [], "errors": []}
+    if planned:
+        worksheets = load_worksheets_from_cache(
+            repo=repo, branch_name=plan["commit"], only_paths=planned
+        )
+        loaded = {worksheet_state(ws)["path"]: ws for ws in worksheets}
+        for path in planned:
+            if path not in loaded:
+                raise SnowflakeGitError(
+                    f"Planned worksheet {path} not found"
+                    f" in commit {plan['commit']}"
+                )
+        worksheets = [loaded[path] for path in planned]
+
+        auth_context = _authenticate(
+            username,
+            account_id,
+            auth_mode=auth_mode,
+            password=password,
+            use_session_cache=use_session_cache,
+            logger=logger,
+        )
+
+        # uploads reuse this listing, matching worksheets by name
+        live = sf_get_index(auth_context, refresh=True).worksheets_by_name
+        drifted = [
+            entry["path"]
+            for entry in plan["create"] + plan["update"]
+            if entry.get("remote_digest")
+            != (live[entry["name"]].digest if entry["name"] in live else None)
+        ]
+        if drifted:
+            raise UsageError(
+                "[Push] Worksheets changed in Snowsight since the plan"
+                f" was made, plan the push again: {', '.join(drifted)}"
+            )
+
+        upload_report = upload_to_snowsight(
+            auth_context, worksheets, jobs=plan["jobs"]
+        )
+
+    if upload_report["errors"]:
         logger("Errors happened for the following worksheets :")
-        for err in worksheet_errors:
+        for err in upload_report["errors"]:
             logger(
                 f"Name : {err['name']} "
                 f"| Error type : {err['error'].snowsight_error}"
             )
+    elif not plan["only_folder"]:
+        # next incremental push starts from here
+        record_pushed_commit(
+            repo, account_id, username, repo.commit(plan["commit"])
+        )
 
     return upload_report
 
 
-def diff_procedure(logger: Callable = print) -> str:
+STATUS_CODES = {
+    "added": "A",
+    "modified": "M",
+    "deleted": "D",
+    "local_only": "L",
+    "remote_only": "S",
+    None: " ",
+}
+
+
+def status_procedure(
+    username: str,
+    account_id: str,
+    auth_mode: str = None,
+    password: str = None,
+    branch: str = None,
+    refresh_remote: bool = False,
+    use_session_cache: bool = True,
+    logger: Callable = print,
+) -> List[dict]:
+    """
+    Displays worksheets status: working tree changes and differences
+    between committed worksheets and last known Snowsight state.
+
+    :param username: Snowflake user whose Snowsight state to compare to
+    :param account_id: Snowflake account whose Snowsight state to compare to
+    :param auth_mode: authentication mode, supported are PWD (default) and SSO
+    :param password: password to authenticate (not required for SSO)
+    :param branch: branch to compare to Snowsight, defaults to current one
+    :param refresh_remote: (flag) fetch Snowsight state before comparing
+    :param use_session_cache: (flag) reuse and save cached Snowsight sessions
+    :param logger: logging function e.g. print
+
+    :returns: per changed worksheet, path, local and remote change
+    """  # noqa: E501
+
+    try:
+        repo = git.Repo(config.GLOBAL_CONFIG.repo_path)
+    except git.InvalidGitRepositoryError as exc:
+        raise SnowflakeGitError(
+            "Could not find Git Repository here : "
+            f"{config.GLOBAL_CONFIG.repo_path}"
+        ) from exc
+
+    if refresh_remote:
+        auth_context = _authenticate(
+            username,
+            account_id,
+            auth_mode=auth_mode,
+            password=password,
+            use_session_cache=use_session_cache,
+            logger=logger,
+        )
+        record_remote_state(
+            repo,
+            account_id,
+            username,
+            sf_iter_worksheets(auth_context),
+        )
+
+    remote_state = load_remote_state(repo, account_id, username)
+    if remote_state is None:
+        logger(
+            "## Snowsight state unknown, compare to it"
+            " after a fetch or with --refresh-remote ##"
+        )
+
+    status = worksheets_status(repo, remote_state, branch_name=branch)
+    for ws_status in status:
+        logger(
+            f"{STATUS_CODES[ws_status['local']]}"
+            f"{STATUS_CODES[ws_status['remote']]} {ws_status['path']}"
+        )
+    if not status:
+        logger("## Worksheets up to date ##")
+
+    return status
+
+
+def sync_procedure(
+    username: str,
+    account_id: str,
+    auth_mode: str = None,
+    password: str = None,
+    jobs: int = 1,
+    message: str = None,
+    use_session_cache: bool = True,
+    logger: Callable = print,
+) -> dict:
+    """
+    Synchronize committed worksheets and Snowsight ones, in both ways.
+    Each worksheet is compared to its state when last synced: those only
+    changed in Snowsight are committed, those only changed locally are
+    pushed by id, those changed on both sides are reported as conflicts
+    and left untouched. Deletions, local renames and moves are reported,
+    not applied. Worksheets created locally are committed again with
+    their Snowsight id once pushed.
+
+    :param username: username to authenticate
+    :param account_id: account id to authenticate
+    :param auth_mode: authentication mode, supported are PWD (default) and SSO
+    :param password: password to authenticate (not required for SSO)
+    :param jobs: maximum number of concurrent calls to Snowsight
+    :param message: message of the commit of Snowsight changes
+    :param use_session_cache: (flag) reuse and save cached Snowsight sessions
+    :param logger: logging function e.g. print
+
+    :returns: worksheets paths per action (in_sync, pull, push, conflict,
+        deleted_locally, deleted_remotely, unsupported), commit of Snowsight
+        changes (None if none) and upload errors
+    """  # noqa: E501
+
+    try:
+        repo = git.Repo(config.GLOBAL_CONFIG.repo_path)
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError) as exc:
+        raise SnowflakeGitError(
+            "Could not find Git Repository here : "
+            f"{config.GLOBAL_CONFIG.repo_path}"
+        ) from exc
+    if repo.bare:
+        raise UsageError("[Sync] A repository with a working tree is needed")
+
+    # Snowsight changes are committed, do not mix them with local ones
+    worksheets_path = config.GLOBAL_CONFIG.worksheets_path
+    if any(get_changed_files(repo, worksheets_path).values()):
+        raise UsageError(
+            "[Sync] Worksheets have uncommitted changes."
+            " Please commit them first, e.g. with sfgit commit."
+        )
+
+    auth_context = _authenticate(
+        username,
+        account_id,
+        auth_mode=auth_mode,
+        password=password,
+        use_session_cache=use_session_cache,
+        logger=logger,
+    )
+
+    logger(" ## Getting worksheets ##")
+    remote_worksheets = {
+        ws._id: ws
+        for ws in sf_get_worksheets(
+            auth_context, store_to_cache=False, only_folder=None
+        )
+    }
+    local_worksheets = {}
+    if repo.head.is_valid():
+        local_worksheets = {
+            ws._id: ws
+            for ws in load_worksheets_from_cache(
+                repo=repo, branch_name=None, only_folder=None
+            )
+        }
+
+    # last synced state, or last fetched one before any sync
+    base = load_remote_state(repo, account_id, username, "synced")
+    if base is None:
+        base = load_remote_state(repo, account_id, username) or {}
+    local = {
+        ws_id: worksheet_state(ws) for ws_id, ws in local_worksheets.items()
+    }
+    remote = {
+        ws_id: worksheet_state(ws) for ws_id, ws in remote_worksheets.items()
+    }
+    actions = classify_sync(base, local, remote)
+
+    summary = {
+        action: [
+            (remote.get(ws_id) or local.get(ws_id))["path"]
+            for ws_id, ws_action in actions.items()
+            if ws_action == action
+        ]
+        for action in (
+            "in_sync",
+            "pull",
+            "push",
+            "conflict",
+            "deleted_locally",
+            "deleted_remotely",
+            "unsupported",
+        )
+    }
+    summary["commit"] = None
+    summary["errors"] = []
+
+    # local changes, pushed by worksheet id
+    to_push = [ws_id for ws_id, a in actions.items() if a == "push"]
+    pushed = {}
+    if to_push:
+        upload_report = upload_to_snowsight(
+            auth_context,
+            [local_worksheets[ws_id] for ws_id in to_push],
+            jobs=jobs,
+            by_id=True,
+        )
+        summary["errors"] = upload_report["errors"]
+        pushed = {
+            entry["_id"]: entry for entry in upload_report["completed"]
+        }
+    # worksheets created in Snowsight, committed again with their new id
+    created = {}
+    for ws_id, entry in pushed.items():
+        if entry["snowsight_id"] != ws_id:
+            ws = local_worksheets[ws_id]
+            created[ws_id] = Worksheet(
+                entry["snowsight_id"],
+                ws.name,
+                entry["folder_id"],
+                ws.folder_name,
+                ws.content,
+                ws.content_type,
+            )
+
+    # Snowsight changes, written then committed at once
+    to_pull = [ws_id for ws_id, a in actions.items() if a == "pull"]
+    for ws_id in to_pull:
+        # renamed or moved worksheets leave their previous files
+        if ws_id in local and local[ws_id]["path"] != remote[ws_id]["path"]:
+            for file_name in worksheet_to_files(local_worksheets[ws_id]):
+                (worksheets_path / file_name).unlink(missing_ok=True)
+    if to_pull or created:
+        save_worksheets_to_cache(
+            [remote_worksheets[ws_id] for ws_id in to_pull]
+            + list(created.values())
+        )
+        summary["commit"] = commit_procedure(
+            branch=None,
+            message=message or SYNC_COMMIT_MESSAGE,
+            logger=logger,
+        )["commit"]
+
+    # record what both sides agree on, previous base for the others
+    synced = {
+        ws_id: ws_state
+        for ws_id, ws_state in base.items()
+        if actions.get(ws_id) not in ("in_sync", "pull")
+        and ws_id not in pushed
+    }
+    synced.update(
+        {
+            ws_id: remote[ws_id]
+            for ws_id, action in actions.items()
+            if action in ("in_sync", "pull")
+        }
+    )
+    pushed_worksheets = [
+        created.get(ws_id, local_worksheets[ws_id]) for ws_id in pushed
+    ]
+    synced.update({ws._id: worksheet_state(ws) for ws in pushed_worksheets})
+    record_states(repo, account_id, username, synced, "synced")
+    record_remote_state(
+        repo,
+        account_id,
+        username,
+        [
+            *(
+                ws
+                for ws_id, ws in remote_worksheets.items()
+                if ws_id not in pushed
+            ),
+            *pushed_worksheets,
+        ],
+        folders=[f.name for f in sf_get_index(auth_context).folders],
+    )
+    if (
+        not summary["errors"]
+        and not summary["conflict"]
+        and not summary["unsupported"]
+        and repo.head.is_valid()
+    ):
+        # next incremental push starts from here
+        record_pushed_commit(repo, account_id, username, repo.head.commit)
+
+    for action, label in (
+        ("pull", "committed from Snowsight"),
+        ("push", "pushed to Snowsight"),
+        ("in_sync", "already in sync"),
+    ):
+        logger(f"## {len(summary[action])} worksheets {label} ##")
+    for action, label in (
+        ("conflict", "CONFLICT"),
+        ("deleted_locally", "DELETED LOCALLY"),
+        ("deleted_remotely", "DELETED IN SNOWSIGHT"),
+        ("unsupported", "RENAMED OR MOVED LOCALLY, NOT PUSHED"),
+    ):
+        for path in summary[action]:
+            logger(f"{label} {path}")
+    for err in summary["errors"]:
+        logger(
+            f"Name : {err['name']} "
+            f"| Error type : {err['error'].snowsight_error}"
+        )
+
+    return summary
+
+
+def diff_procedure(logger: Callable = print) -> int:
     """
     Displays unstaged changes on worksheets for configured repository and worksheets path.
+    Lines are logged as soon as git outputs them.
 
     :param logger: logging function e.g. print
 
-    :returns: diff output as a string
+    :returns: number of diff lines displayed
     """  # noqa: E501
 
     # Get configuration
@@ -415,9 +972,11 @@ def diff_procedure(logger: Callable = print) -> str:
             "Please set it or create it (manually or with sfgit fetch"
         )
 
-    diff_output = diff(
+    n_lines = 0
+    for line in iter_diff(
         repo, subdirectory=worksheets_path, file_extensions=["py", "sql"]
-    )
-    logger(diff_output)
+    ):
+        logger(line)
+        n_lines += 1
 
-    return diff_output
+    return n_lines
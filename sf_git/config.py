@@ -1,8 +1,31 @@
 import os
+import re
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path, PosixPath, WindowsPath
 import platform
 from dataclasses import dataclass
-from typing import Union
+from typing import Dict, List, Optional, Union
+
+from dotenv import dotenv_values
+
+from sf_git import DOTENV_PATH
+from sf_git.models import ConfigError
+
+# keys of sf_git config file, also read from environment
+CONFIG_KEYS = (
+    "SNOWFLAKE_VERSIONING_REPO",
+    "WORKSHEETS_PATH",
+    "SF_ACCOUNT_ID",
+    "SF_LOGIN_NAME",
+    "SF_PWD",
+    "SF_ORGANIZATION_ID",
+    "SF_GIT_CACHE_DIR",
+    "SF_GIT_SESSION_TTL",
+    "SF_GIT_ENDPOINT_TTL",
+)
+PROFILE_ENV_VAR = "SF_GIT_PROFILE"
+DEFAULT_WORKSHEETS_PATH = "/tmp/snowflake_worksheets"
 
 
 @dataclass
@@ -15,24 +38,267 @@ class Config:
     sf_account_id: str = None
     sf_login_name: str = None
     sf_pwd: str = None
+    sf_organization_id: str = None
+    cache_dir: Union[PosixPath, WindowsPath] = None
+    session_ttl: int = 3600
+    endpoint_ttl: int = 7 * 24 * 3600
+    profile: Optional[str] = None
 
     def __post_init__(self):
+        if self.cache_dir is None:
+            self.cache_dir = Path.home() / ".sf_git"
+        self.cache_dir = Path(self.cache_dir)
+
         # make paths windows if necessary
         if platform.system() == "Windows":
             if self.repo_path:
                 self.repo_path = WindowsPath(self.repo_path)
             if self.worksheets_path:
                 self.worksheets_path = WindowsPath(self.worksheets_path)
+            self.cache_dir = WindowsPath(self.cache_dir)
         self.repo_path = self.repo_path.absolute()
         self.worksheets_path = self.worksheets_path.absolute()
+        self.cache_dir = self.cache_dir.absolute()
 
 
-GLOBAL_CONFIG = Config(
-    repo_path=Path(os.environ["SNOWFLAKE_VERSIONING_REPO"]).absolute(),
-    worksheets_path=Path(
-        os.environ.get("WORKSHEETS_PATH") or "/tmp/snowflake_worksheets"
-    ).absolute(),
-    sf_account_id=os.environ.get("SF_ACCOUNT_ID"),
-    sf_login_name=os.environ.get("SF_LOGIN_NAME"),
-    sf_pwd=os.environ.get("SF_PWD"),
-)
+# config file values per path, and configs per profile, read once
+_FILE_VALUES: Dict[Path, Dict[str, str]] = {}
+_CONFIGS: Dict[Optional[str], Config] = {}
+_active_profile: Optional[str] = os.environ.get(PROFILE_ENV_VAR) or None
+
+
+def _check_profile_name(profile: str):
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", profile):
+        raise ConfigError(
+            f"Invalid profile name {profile}, only letters, digits,"
+            " - and _ are allowed"
+        )
+
+
+def profile_key(key: str, profile: Optional[str] = None) -> str:
+    """Key of a config value in config file, prefixed by its profile."""
+
+    return key if profile is None else f"{profile}.{key}"
+
+
+def read_config_file(
+    path: Path = DOTENV_PATH, refresh: bool = False
+) -> Dict[str, str]:
+    """
+    Values of a config file, read once then cached.
+
+    :param path: config file, sf_git one by default
+    :param refresh: read the file again
+
+    :returns: {key: value}, empty if there is no config file
+    """
+
+    if refresh or path not in _FILE_VALUES:
+        values = dotenv_values(path) if path.is_file() else {}
+        _FILE_VALUES[path] = {
+            key: value for key, value in values.items() if value is not None
+        }
+    return _FILE_VALUES[path]
+
+
+def list_profiles(path: Path = DOTENV_PATH) -> List[str]:
+    """Names of profiles defined in a config file."""
+
+    return sorted(
+        {key.split(".", 1)[0] for key in read_config_file(path) if "." in key}
+    )
+
+
+def config_values(
+    profile: Optional[str] = None, path: Path = DOTENV_PATH
+) -> Dict[str, str]:
+    """
+    Config values of a profile: config file values, overridden by
+    environment ones, overridden by the profile ones.
+
+    :param profile: profile name, None for config file values only
+    :param path: config file, sf_git one by default
+
+    :returns: {key: value} for known keys having a value
+    """
+
+    file_values = read_config_file(path)
+    values = {
+        key: file_values[key] for key in CONFIG_KEYS if key in file_values
+    }
+    values.update(
+        {key: os.environ[key] for key in CONFIG_KEYS if os.environ.get(key)}
+    )
+    if profile is not None:
+        _check_profile_name(profile)
+        if profile not in list_profiles(path):
+            raise ConfigError(
+                f"Unknown profile {profile}, configured ones are"
+                f" {', '.join(list_profiles(path)) or 'none'}"
+            )
+        values.update(
+            {
+                key: file_values[profile_key(key, profile)]
+                for key in CONFIG_KEYS
+                if profile_key(key, profile) in file_values
+            }
+        )
+    return values
+
+
+def load_config(profile: Optional[str] = None) -> Config:
+    """
+    Configuration of a profile, built once then cached.
+
+    :param profile: profile name, None for default configuration
+
+    :returns: configuration
+    """
+
+    if profile not in _CONFIGS:
+        values = config_values(profile)
+        if not values.get("SNOWFLAKE_VERSIONING_REPO"):
+            raise ConfigError(
+                "No versioning repository configured"
+                + (f" for profile {profile}" if profile else "")
+                + ", set one with sfgit init or sfgit config --git-repo"
+            )
+        _CONFIGS[profile] = Config(
+            repo_path=Path(values["SNOWFLAKE_VERSIONING_REPO"]).absolute(),
+            worksheets_path=Path(
+                values.get("WORKSHEETS_PATH") or DEFAULT_WORKSHEETS_PATH
+            ).absolute(),
+            sf_account_id=values.get("SF_ACCOUNT_ID"),
+            sf_login_name=values.get("SF_LOGIN_NAME"),
+            sf_pwd=values.get("SF_PWD"),
+            sf_organization_id=values.get("SF_ORGANIZATION_ID"),
+            cache_dir=values.get("SF_GIT_CACHE_DIR"),
+            session_ttl=int(values.get("SF_GIT_SESSION_TTL") or 3600),
+            endpoint_ttl=int(
+                values.get("SF_GIT_ENDPOINT_TTL") or 7 * 24 * 3600
+            ),
+            profile=profile,
+        )
+    return _CONFIGS[profile]
+
+
+def select_profile(profile: Optional[str]):
+    """
+    Select the profile GLOBAL_CONFIG is built from.
+
+    :param profile: profile name, None for default configuration
+    """
+
+    global _active_profile
+
+    if profile is not None:
+        _check_profile_name(profile)
+    _active_profile = profile
+
+
+def active_profile() -> Optional[str]:
+    """Name of the selected profile, None if default configuration."""
+
+    return _active_profile
+
+
+def _config_line(key: str, value: str) -> str:
+    """Config file line, quoted as python-dotenv does."""
+
+    escaped_value = value.replace("'", "\\'")
+    return f"{key}='{escaped_value}'"
+
+
+@contextmanager
+def _config_lock(path: Path):
+    """
+    Hold an exclusive lock on a config file, through a lock file next to
+    it, so that concurrent updates do not overwrite each other.
+    """
+
+    with open(path.with_name(f"{path.name}.lock"), "a+b") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def write_config(
+    updates: Dict[str, str],
+    profile: Optional[str] = None,
+    path: Path = DOTENV_PATH,
+) -> Dict[str, str]:
+    """
+    Set config values in a single atomic write of the config file,
+    read and written again under a lock shared with concurrent updates.
+    Other lines, comments included, are kept as is.
+
+    :param updates: {key: value} to set
+    :param profile: profile to set values for, None for default ones
+    :param path: config file, sf_git one by default
+
+    :returns: values set
+    """
+
+    if profile is not None:
+        _check_profile_name(profile)
+    to_write = {profile_key(key, profile): v for key, v in updates.items()}
+
+    with _config_lock(path):
+        lines = []
+        mode = 0o600
+        if path.is_file():
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            mode = path.stat().st_mode & 0o777
+
+        new_lines = []
+        written = set()
+        for line in lines:
+            match = re.match(r"\s*(?:export\s+)?([^=#\s]+)\s*=", line)
+            key = match.group(1) if match else None
+            if key not in to_write:
+                new_lines.append(line)
+            elif key not in written:
+                new_lines.append(_config_line(key, to_write[key]))
+                written.add(key)
+        new_lines.extend(
+            _config_line(key, value)
+            for key, value in to_write.items()
+            if key not in written
+        )
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("\n".join(new_lines) + "\n")
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        # under the lock, not to cache a file older than another update
+        read_config_file(path, refresh=True)
+        _CONFIGS.clear()
+    return updates
+
+
+def __getattr__(name: str):
+    # GLOBAL_CONFIG is built on first use, from the selected profile
+    if name == "GLOBAL_CONFIG":
+        return load_config(_active_profile)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,162 @@
+import os
+import platform
+from typing import Callable, Optional
+from pathlib import Path, WindowsPath
+
+from click import UsageError
+
+import sf_git.config as config
+from sf_git import DOTENV_PATH
+
+
+def init_repo_procedure(
+    path: str, mkdir: bool = False, profile: Optional[str] = None
+) -> str:
+    """
+    Initialize a git repository.
+
+    :param path: absolute or relative path to git repository root
+    :param mkdir: create the repository if it doesn't exist
+    :param profile: profile to set the repository of, default one if None
+
+    :return: new value of versioning repo in sf_git config
+    """
+    p_constructor = WindowsPath if platform.system() == "Windows" else Path
+    abs_path = p_constructor(path).absolute()
+    if not os.path.exists(abs_path) and not mkdir:
+        raise UsageError(
+            f"[Init] {abs_path} does not exist."
+            "\nPlease provide a path towards an existing directory"
+            " or add the --mkdir option to create it."
+        )
+
+    # create repository, git is only needed here
+    import git
+
+    git.Repo.init(path, mkdir=mkdir)
+
+    # set as sf_git versioning repository
+    config.write_config(
+        {"SNOWFLAKE_VERSIONING_REPO": str(abs_path)},
+        profile=profile,
+        path=DOTENV_PATH,
+    )
+
+    return str(abs_path)
+
+
+def get_config_repo_procedure(
+    key: str, logger: Callable = print, profile: Optional[str] = None
+) -> str:
+    """
+    Get sf_git config value.
+
+    :param key: key to retrieve value for
+    :param logger: logging function e.g. print
+    :param profile: profile to get value of, default values if None
+        or if the profile does not set this key
+
+    :returns: sf_git config value
+    """
+
+    file_values = config.read_config_file(DOTENV_PATH)
+    configured = {
+        file_key: value
+        for file_key, value in file_values.items()
+        if "." not in file_key
+    }
+    if profile is not None:
+        prefix = config.profile_key("", profile)
+        configured.update(
+            {
+                file_key[len(prefix):]: value
+                for file_key, value in file_values.items()
+                if file_key.startswith(prefix)
+            }
+        )
+
+    if key not in configured.keys():
+        raise UsageError(
+            f"[Config] {key} does not exist.\n"
+            "Config values to be retrieved are "
+            f"{list(configured.keys())}"
+        )
+
+    logger(configured[key])
+
+    return configured[key]
+
+
+def set_config_repo_procedure(
+    git_repo: str = None,
+    save_dir: str = None,
+    account: str = None,
+    username: str = None,
+    password: str = None,
+    logger: Callable = print,
+    profile: Optional[str] = None,
+) -> dict:
+    """
+    Set sf_git config values, in a single write of the config file.
+
+    :param git_repo: if provided, set the git repository path
+    :param save_dir: if provided, set the worksheet directory path
+    :param account: if provided, set the account id
+    :param username: if provided, set the user login name
+    :param password: if provided, set the user password
+    :param logger: logging function e.g. print
+    :param profile: profile to set values for, created if it does not
+        exist, default values if None
+
+    :returns: dict with newly set keys and their values
+    """
+
+    # check repositories
+    if git_repo:
+        repo_path = Path(git_repo).absolute()
+        if not os.path.exists(repo_path):
+            raise UsageError(
+                f"[Config] {git_repo} does not exist."
+                "Please provide path towards an existing git repository"
+                " or create a new one with sfgit init."
+            )
+
+    if save_dir:
+        save_dir = Path(save_dir).absolute()
+        # get git_repo
+        if git_repo:
+            repo_path = Path(git_repo).absolute()
+        elif profile == config.active_profile():
+            repo_path = config.GLOBAL_CONFIG.repo_path
+        else:
+            repo_path = config.load_config(profile).repo_path
+        if repo_path not in save_dir.parents and repo_path != save_dir:
+            raise UsageError(
+                "[Config] "
+                f"{save_dir} is not a subdirectory of {repo_path}.\n"
+                "Please provide a saving directory within the git repository."
+            )
+
+    updates = {}
+    if git_repo:
+        updates["SNOWFLAKE_VERSIONING_REPO"] = str(git_repo)
+    if save_dir:
+        updates["WORKSHEETS_PATH"] = str(save_dir)
+    if account:
+        updates["SF_ACCOUNT_ID"] = account
+    if username:
+        updates["SF_LOGIN_NAME"] = username
+    if password:
+        updates["SF_PWD"] = password
+    if not updates:
+        return {}
+
+    config.write_config(updates, profile=profile, path=DOTENV_PATH)
+    for key, value in updates.items():
+        if key == "SF_PWD":
+            logger("Set SF_PWD to provided password.")
+            updates[key] = "*" * len(password)
+        else:
+            logger(f"Set {config.profile_key(key, profile)} to {value}")
+
+    return updates
@@ -1,89 +1,581 @@
+import io
+import subprocess
+import threading
+import weakref
 from pathlib import Path
-from typing import List, Type, Union, Dict, Optional
-import re
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 import git
 from git.objects.blob import Blob
+from git.objects.fun import tree_to_stream
 from git.objects.tree import Tree
 from git.repo.base import Repo
+from gitdb import IStream
 
 from sf_git.models import SnowflakeGitError
 
+_BLOB_MODE = 0o100644
+_TREE_MODE = 0o040000
+
+
+def resolve_commit(repo: Repo, branch_name: Optional[str]) -> git.Commit:
+    """
+    Get the commit of a revision, the checked out one by default
+
+    :param repo: git repository
+    :param branch_name: revision e.g. branch, tag or commit sha,
+        HEAD if None
+
+    :returns: resolved commit
+    """
+
+    revision = branch_name if branch_name is not None else "HEAD"
+    try:
+        return repo.commit(revision)
+    except (git.BadName, ValueError) as exc:
+        raise SnowflakeGitError(
+            f"Unable to retrieve revision {revision}"
+            f" in Repository {repo.working_dir}."
+            "Please check that the branch, tag or commit is correct"
+        ) from exc
+
+
+def get_tracked_tree(
+    repo: Repo,
+    folder: Path,
+    branch_name: Optional[str] = None,
+    missing_ok: bool = False,
+) -> Optional[Tree]:
+    """
+    Get git tree of a folder inside a git repo, without reading its files
+
+    :param repo: git repository tracking files
+    :param folder: name of folder inside git repo
+    :param branch_name: revision to consider e.g. branch, tag or commit sha,
+        default is the checked out one
+    :param missing_ok: return None, instead of raising,
+        if folder is not tracked in revision
+
+    :returns: folder tree, None if folder is not in git
+    """
+
+    # check that folder is in git
+    repo_wd = Path(repo.working_dir)
+    if repo_wd not in folder.parents:
+        return None
+
+    # retrieve revision, checked out one by default
+    commit = resolve_commit(repo, branch_name)
+
+    # get to folder by folder names
+    try:
+        folder_tree = commit.tree / folder.relative_to(repo_wd).as_posix()
+    except KeyError:
+        folder_tree = None
+    if not isinstance(folder_tree, Tree):
+        if missing_ok:
+            return None
+        raise SnowflakeGitError(
+            f"Unable to retrieve folder {str(folder)}"
+            f" in Repository {repo.working_dir}"
+            f" and revision {branch_name or 'HEAD'}."
+            "Please check that the files you are looking for are committed"
+        )
+    return folder_tree
+
 
 def get_tracked_files(
-    repo: Repo, folder: Path, branch_name: Optional[str] = None
+    repo: Repo,
+    folder: Path,
+    branch_name: Optional[str] = None,
+    missing_ok: bool = False,
 ) -> List[Union[Type[Blob], Type[Tree]]]:
     """
     Get all git tracked files in a folder inside a git repo
 
     :param repo: git repository tracking files
     :param folder: name of folder inside git repo to only load from
-    :param branch_name: branch to consider, default is active branch
+    :param branch_name: revision to consider e.g. branch, tag or commit sha,
+        default is the checked out one
+    :param missing_ok: return no file, instead of raising,
+        if folder is not tracked in revision
 
     :returns: list of blobs (file) and tree (dir)
     """
 
-    # check that folder is in git
-    repo_wd = Path(repo.working_dir)
-    if repo_wd not in folder.parents:
+    folder_tree = get_tracked_tree(repo, folder, branch_name, missing_ok)
+    if folder_tree is None:
         return []
 
-    # retrieve branch, active one by default
-    if branch_name is not None:
-        available_branches = {b.name: b for b in repo.branches}
-        if branch_name not in available_branches.keys():
-            raise SnowflakeGitError(
-                f"Unable to retrieve branch {branch_name}"
-                f" in Repository {repo.working_dir}."
-                "Please check that the branch name is correct"
-            )
-        branch = available_branches[branch_name]
-    else:
-        branch = repo.active_branch
+    # get files
+    return list(folder_tree.traverse())
 
-    # get to folder by folder names
-    repo_objects = branch.commit.tree.traverse()
+
+def get_tracked_shas(
+    repo: Repo, folder: Path, branch_name: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    Get sha of all git tracked files in a folder, from a single
+    git ls-tree call, without building GitPython objects.
+
+    :param repo: git repository tracking files
+    :param folder: folder inside git repo to list files from
+    :param branch_name: revision to consider e.g. branch, tag or commit sha,
+        default is the checked out one
+
+    :returns: {posix path relative to the repository root: blob sha}
+    """
+
+    revision = branch_name if branch_name is not None else "HEAD"
+    folder_path = folder.relative_to(repo.working_tree_dir).as_posix()
     try:
-        folder_tree = next(
-            obj for obj in repo_objects if obj.abspath == str(folder)
+        listing = repo.git.ls_tree(
+            "-r", "-z", "--full-tree", revision, "--", folder_path
         )
-    except StopIteration as exc:
+    except git.GitCommandError as exc:
         raise SnowflakeGitError(
-            f"Unable to retrieve folder {str(folder)}"
-            f" in Repository {repo.working_dir} and branch {branch.name}."
-            "Please check that the files you are looking for are committed"
+            f"Unable to retrieve revision {revision}"
+            f" in Repository {repo.working_dir}."
+            "Please check that the branch, tag or commit is correct"
         ) from exc
 
-    # get files
-    tracked_files = folder_tree.traverse()
-    return tracked_files
+    shas = {}
+    for entry in listing.split("\0"):
+        if not entry:
+            continue
+        info, path = entry.split("\t", 1)
+        _, object_type, sha = info.split()
+        if object_type == "blob":
+            shas[path] = sha
+    return shas
+
+
+def get_changed_paths(
+    repo: Repo,
+    folder: Path,
+    since: str,
+    branch_name: Optional[str] = None,
+) -> List[str]:
+    """
+    Get files of a folder added or modified between two revisions,
+    from a tree to tree diff, without reading any content.
+
+    :param repo: git repository tracking files
+    :param folder: folder inside git repo to look into
+    :param since: revision to compare from e.g. last pushed commit
+    :param branch_name: revision to compare to, default is the checked out one
+
+    :returns: posix paths relative to the repository root
+    """
+
+    revision = branch_name if branch_name is not None else "HEAD"
+    folder_path = folder.relative_to(repo.working_tree_dir).as_posix()
+    try:
+        changed = repo.git.diff(
+            "--name-only",
+            "-z",
+            "--no-renames",
+            "--diff-filter=AM",
+            since,
+            revision,
+            "--",
+            folder_path,
+        )
+    except git.GitCommandError as exc:
+        raise SnowflakeGitError(
+            f"Unable to compare revisions {since} and {revision}"
+            f" in Repository {repo.working_dir}."
+            "Please check that the revisions are correct"
+        ) from exc
+
+    return [path for path in changed.split("\0") if path]
+
+
+def get_tracked_blobs(
+    repo: Repo,
+    folder: Path,
+    paths: Iterable[str],
+    branch_name: Optional[str] = None,
+) -> List[Blob]:
+    """
+    Get tracked blobs at given paths of a folder, looked up in the tree
+    one by one instead of traversing the whole folder.
+    Paths not tracked in revision are skipped.
 
+    :param repo: git repository tracking files
+    :param folder: folder inside git repo paths are relative to
+    :param paths: posix paths relative to folder
+    :param branch_name: revision to consider, default is the checked out one
+
+    :returns: list of blobs, in paths order
+    """
 
-def get_blobs_content(blobs: List[Blob]) -> Dict[str, bytes]:
+    commit = resolve_commit(repo, branch_name)
+    folder_path = folder.relative_to(repo.working_tree_dir).as_posix()
+    prefix = "" if folder_path == "." else f"{folder_path}/"
+    blobs = []
+    for path in paths:
+        try:
+            blob = commit.tree / f"{prefix}{path}"
+        except KeyError:
+            continue
+        if isinstance(blob, Blob):
+            blobs.append(blob)
+    return blobs
+
+
+class BlobReader:
+    """
+    Reads blob contents through one long-lived `git cat-file --batch`
+    process. Object names are all sent ahead, from a writer thread,
+    while contents are read back in the same order, so that reading
+    many blobs does not cost one round trip per blob.
+
+    The reader only keeps the git command of the repository, not the
+    repository itself, so that it can be closed once the repository
+    is garbage collected.
+    """
+
+    def __init__(self, repo: Repo):
+        self._git = repo.git
+        self._process = None
+        self._buffered = False
+        self._lock = threading.Lock()
+
+    def _start(self):
+        if self._process is None or self._process.poll() is not None:
+            # buffered output, flushed on demand, from git 2.36
+            self._buffered = self._git.version_info >= (2, 36)
+            args = (
+                ["--batch-command", "--buffer"]
+                if self._buffered
+                else ["--batch"]
+            )
+            self._process = self._git.cat_file(
+                *args, as_process=True, istream=subprocess.PIPE
+            )
+        return self._process
+
+    def read_many(self, hexshas: List[str]) -> List[Tuple[str, bytes]]:
+        """
+        Read contents of many objects, all of them while the reader
+        is locked.
+
+        :param hexshas: hexadecimal object names to read
+
+        :returns: list of (hexsha, content), in hexshas order
+        """
+
+        if not hexshas:
+            return []
+
+        with self._lock:
+            process = self._start()
+            if self._buffered:
+                requests = "".join(f"contents {sha}\n" for sha in hexshas)
+                requests += "flush\n"
+            else:
+                requests = "".join(f"{sha}\n" for sha in hexshas)
+            requests = requests.encode()
+
+            def send():
+                try:
+                    process.stdin.write(requests)
+                    process.stdin.flush()
+                except (BrokenPipeError, ValueError):
+                    # process died, reported when reading
+                    pass
+
+            writer = threading.Thread(target=send, daemon=True)
+            writer.start()
+            contents = []
+            try:
+                for hexsha in hexshas:
+                    contents.append(
+                        (hexsha, self._read_object(process, hexsha))
+                    )
+            finally:
+                if len(contents) < len(hexshas):
+                    # remaining output would be out of sync
+                    self.close(kill=True)
+                writer.join()
+            return contents
+
+    @staticmethod
+    def _read_object(process, hexsha: str) -> bytes:
+        header = process.stdout.readline().split()
+        if len(header) != 3:
+            raise SnowflakeGitError(
+                f"Unable to read object {hexsha}: "
+                f"{b' '.join(header).decode(errors='replace') or 'no output'}"
+            )
+        size = int(header[2])
+        content = process.stdout.read(size)
+        process.stdout.read(1)  # trailing newline
+        return content
+
+    def close(self, kill: bool = False):
+        """
+        Stop the cat-file process, it is started again on next read.
+
+        :param kill: do not wait for pending objects to be written
+        """
+
+        if self._process is not None:
+            if kill:
+                self._process.kill()
+            try:
+                self._process.stdin.close()
+                self._process.wait()
+            except (BrokenPipeError, git.exc.GitCommandError):
+                # killed or already dead
+                pass
+            self._process = None
+
+
+_BLOB_READERS: "weakref.WeakKeyDictionary[Repo, BlobReader]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_blob_reader(repo: Repo) -> BlobReader:
+    """
+    Get the blob reader of a repository, starting it on first use.
+
+    :param repo: git repository to read blobs from
+
+    :returns: BlobReader shared by all reads from repo
+    """
+
+    if repo not in _BLOB_READERS:
+        reader = BlobReader(repo)
+        # stop its process along with the repository, or at exit
+        weakref.finalize(repo, reader.close)
+        _BLOB_READERS[repo] = reader
+    return _BLOB_READERS[repo]
+
+
+def get_blobs_content(
+    blobs: List[Blob], by_path: bool = False
+) -> Dict[str, bytes]:
     """
     Get blob contents and return as {blob_name: content}.
     Allow to get file content from git trees easily.
+    All contents are read in a single batch.
+
+    :param blobs: blobs to read, trees are ignored
+    :param by_path: key contents by blob path in the repository,
+        to tell apart same-named files in different folders
     """
 
-    contents = {
-        b.name: b.data_stream.read() for b in blobs if isinstance(b, Blob)
+    blobs = [b for b in blobs if isinstance(b, Blob)]
+    if not blobs:
+        return {}
+
+    contents = get_blob_reader(blobs[0].repo).read_many(
+        [b.hexsha for b in blobs]
+    )
+    return {
+        b.path if by_path else b.name: content
+        for b, (_, content) in zip(blobs, contents)
     }
-    return contents
 
 
-def diff(
+def get_changed_files(repo: Repo, folder: Path) -> Dict[str, List[str]]:
+    """
+    Get files of a folder that differ from the last commit, staged or not.
+    Relies on git status, which only re-hashes files whose stat info
+    changed since they were last added to the index.
+
+    :param repo: git repository with a working tree
+    :param folder: folder inside the working tree to look into
+
+    :returns: {"added": [...], "modified": [...], "deleted": [...]},
+        posix paths relative to the repository root
+    """
+
+    changes = {"added": [], "modified": [], "deleted": []}
+    status = repo.git.status(
+        "--porcelain", "-z", "--untracked-files=all", "--", str(folder)
+    )
+    entries = iter(status.split("\0"))
+    for entry in entries:
+        if not entry:
+            continue
+        index_status, worktree_status, path = entry[0], entry[1], entry[3:]
+        if index_status in "RC":
+            # renamed or copied from next entry
+            origin = next(entries)
+            if index_status == "R":
+                changes["deleted"].append(origin)
+
+        if "D" in (index_status, worktree_status):
+            changes["deleted"].append(path)
+        elif index_status in "?ARC":
+            changes["added"].append(path)
+        else:
+            changes["modified"].append(path)
+    return changes
+
+
+def _store_object(repo: Repo, object_type: bytes, content: bytes) -> bytes:
+    """Write an object to the object database, returns its binary sha."""
+
+    istream = repo.odb.store(
+        IStream(object_type, len(content), io.BytesIO(content))
+    )
+    return istream.binsha
+
+
+def write_tree(
+    repo: Repo, base_tree: Optional[Tree], files: Dict[str, bytes]
+) -> bytes:
+    """
+    Write a tree made of base_tree entries overridden by files.
+
+    :param repo: git repository to write objects to
+    :param base_tree: tree to start from, None for an empty one
+    :param files: {posix path relative to the tree: content}
+
+    :returns: binary sha of the written tree
+    """
+
+    entries = {}
+    if base_tree is not None:
+        entries = {
+            obj.name: (obj.binsha, obj.mode, obj.name) for obj in base_tree
+        }
+
+    sub_files: Dict[str, Dict[str, bytes]] = {}
+    for path, content in files.items():
+        name, _, sub_path = path.partition("/")
+        if sub_path:
+            sub_files.setdefault(name, {})[sub_path] = content
+        else:
+            entries[name] = (
+                _store_object(repo, b"blob", content),
+                _BLOB_MODE,
+                name,
+            )
+
+    for name, files_in_sub_tree in sub_files.items():
+        sub_tree = None
+        if base_tree is not None and name in entries:
+            sub_tree = base_tree / name
+            if not isinstance(sub_tree, Tree):
+                sub_tree = None
+        entries[name] = (
+            write_tree(repo, sub_tree, files_in_sub_tree),
+            _TREE_MODE,
+            name,
+        )
+
+    # git sorts tree entries as if sub trees names ended with a slash
+    sorted_entries = sorted(
+        entries.values(),
+        key=lambda e: e[2].encode() + (b"/" if e[1] == _TREE_MODE else b""),
+    )
+    stream = io.BytesIO()
+    tree_to_stream(sorted_entries, stream.write)
+    return _store_object(repo, b"tree", stream.getvalue())
+
+
+def is_checked_out(repo: Repo, branch_name: str) -> bool:
+    """Whether a branch is checked out in the working tree of a repo."""
+
+    if repo.bare:
+        return False
+    try:
+        return repo.head.reference.name == branch_name
+    except TypeError:
+        # detached HEAD
+        return False
+
+
+def commit_files(
+    repo: Repo,
+    files: Dict[str, bytes],
+    message: str,
+    branch_name: Optional[str] = None,
+) -> Optional[git.Commit]:
+    """
+    Commit files straight into the object database and advance a branch,
+    without checkout nor working tree and index changes.
+    Works with bare repositories.
+
+    Files are added on top of the branch last commit tree, files of that
+    tree which are not given are kept.
+
+    :param repo: git repository to commit to
+    :param files: {posix path relative to the repository root: content}
+    :param message: commit message
+    :param branch_name: branch to commit to, created if it does not exist,
+        default is the one HEAD points to. The branch checked out in
+        a working tree is refused, its index and working tree would be
+        left at the previous commit.
+
+    :returns: new commit, None if files were already committed
+    """
+
+    if branch_name is None:
+        try:
+            branch_name = repo.head.reference.name
+        except TypeError as exc:
+            raise SnowflakeGitError(
+                f"HEAD is detached in Repository {repo.git_dir},"
+                " please provide a branch name"
+            ) from exc
+    if is_checked_out(repo, branch_name):
+        raise SnowflakeGitError(
+            f"Branch {branch_name} is checked out in Repository"
+            f" {repo.working_tree_dir}, please provide another branch"
+        )
+
+    branch = next((h for h in repo.heads if h.name == branch_name), None)
+    parent = branch.commit if branch is not None else None
+
+    tree_sha = write_tree(
+        repo, parent.tree if parent is not None else None, files
+    )
+    if parent is not None and parent.tree.binsha == tree_sha:
+        return None
+
+    new_commit = git.Commit.create_from_tree(
+        repo,
+        Tree(repo, tree_sha, path=""),
+        message,
+        parent_commits=[parent] if parent is not None else [],
+    )
+    if branch is None:
+        repo.create_head(branch_name, new_commit)
+    else:
+        branch.set_commit(new_commit)
+    return new_commit
+
+
+def iter_diff(
     repo: git.Repo,
     subdirectory: Union[str, Path] = None,
     file_extensions: Union[str, List[str]] = None,
-) -> str:
+) -> Iterator[str]:
     """
-    Get git diff output with subdirectory and file extension filters
+    Stream colored git diff output lines, with subdirectory and file
+    extension filters given to git as pathspecs.
 
     :param repo: git repository
     :param subdirectory: only on files within this subdirectory
     :param file_extensions: only match files with these extensions
 
-    :returns: str, git diff output
+    :returns: iterator of diff lines, without line endings
     """
     # Check input
     if subdirectory and isinstance(subdirectory, str):
@@ -91,37 +583,58 @@ def diff(
     if file_extensions and isinstance(file_extensions, str):
         file_extensions = [file_extensions]
 
-    # Get blobs
-    search_path = (
-        subdirectory
-        if subdirectory
-        else Path(repo.git.rev_parse("--show-toplevel"))
-    )
-    globs = []
+    # Build pathspecs, relative to repository root
+    search_path = ""
+    if subdirectory:
+        search_path = subdirectory.absolute().relative_to(
+            repo.working_tree_dir
+        ).as_posix()
+        search_path = "" if search_path == "." else f"{search_path}/"
     if not file_extensions:
-        globs.extend(search_path.glob("**/*"))
+        pathspecs = [f":(top){search_path}"]
     else:
-        for extension in file_extensions:
-            globs.extend(list(search_path.glob(f"**/*.{extension}")))
+        pathspecs = [
+            f":(top,glob){search_path}**/*.{extension}"
+            for extension in file_extensions
+        ]
 
-    # Get git diff output
-    if not globs:
-        return ""
+    # Stream git diff output
+    process = repo.git.diff(
+        "--color=never", "--", *pathspecs, as_process=True
+    )
+    try:
+        for raw_line in process.stdout:
+            line = raw_line.decode("utf-8", errors="replace").rstrip("\r\n")
 
-    diff_output = repo.git.diff(globs)
+            # Add coloring
+            if line.startswith("+"):
+                line = f"\033[32m{line}\033[0m"
+            elif line.startswith("-"):
+                line = f"\033[31m{line}\033[0m"
+            yield line
+        process.wait()
+    finally:
+        if process.proc.returncode is None:
+            # iteration stopped early, git would block on a full pipe
+            process.proc.kill()
+            process.proc.wait()
+        process.proc.stdout.close()
+        process.proc.stderr.close()
 
-    # Add coloring
-    diff_output = re.sub(
-        r"^(\++)(.*?)$",
-        "\033[32m\\1\\2\033[0m",
-        diff_output,
-        flags=re.MULTILINE,
-    )
-    diff_output = re.sub(
-        r"^(-+)(.*?)$",
-        "\033[31m\\1\\2\033[0m",
-        diff_output,
-        flags=re.MULTILINE,
-    )
 
-    return diff_output
+def diff(
+    repo: git.Repo,
+    subdirectory: Union[str, Path] = None,
+    file_extensions: Union[str, List[str]] = None,
+) -> str:
+    """
+    Get git diff output with subdirectory and file extension filters
+
+    :param repo: git repository
+    :param subdirectory: only on files within this subdirectory
+    :param file_extensions: only match files with these extensions
+
+    :returns: str, git diff output
+    """
+
+    return "\n".join(iter_diff(repo, subdirectory, file_extensions))
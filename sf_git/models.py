@@ -1,6 +1,6 @@
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Any
+from typing import Any, Dict, List, Optional
 
 
 class AuthenticationMode(Enum):
@@ -35,6 +35,7 @@ class AuthenticationContext:
     auth_redirect_uri: str = ""
     auth_session_token: str = ""
     app_server_url: str = ""
+    client: Any = field(default=None, repr=False, compare=False)
     client_id: str = ""
     cookies: Any = None
     csrf: str = ""
@@ -86,6 +87,7 @@ class Worksheet:
         folder_name: str,
         content: str = "To be filled",
         content_type: str = "sql",
+        modified: Optional[str] = None,
     ):
         self._id = _id
         self.name = name
@@ -93,6 +95,7 @@ class Worksheet:
         self.folder_name = folder_name
         self.content = content
         self.content_type = content_type
+        self.modified = modified  # last Snowsight update, if known
 
     def to_dict(self):
         return {
@@ -121,6 +124,90 @@ class Folder:
         }
 
 
+class EntityCatalog:
+    """
+    Snapshot of Snowsight worksheets and folders
+    built from a single entities list response.
+    """
+
+    def __init__(self, worksheets=None, folders=None):
+        self.worksheets_by_id: Dict[str, Worksheet] = {}
+        self.worksheets_by_name: Dict[str, Worksheet] = {}
+        self.folders_by_id: Dict[str, Folder] = {}
+        self.folders_by_name: Dict[str, Folder] = {}
+
+        for folder in folders or []:
+            self.add_folder(folder)
+        for worksheet in worksheets or []:
+            self.add_worksheet(worksheet)
+
+    @property
+    def worksheets(self) -> List[Worksheet]:
+        return list(self.worksheets_by_id.values())
+
+    @property
+    def folders(self) -> List[Folder]:
+        return list(self.folders_by_id.values())
+
+    def add_worksheet(self, worksheet: Worksheet):
+        self.worksheets_by_id[worksheet._id] = worksheet
+        self.worksheets_by_name[worksheet.name] = worksheet
+
+    def add_folder(self, folder: Folder):
+        self.folders_by_id[folder._id] = folder
+        self.folders_by_name[folder.name] = folder
+
+
+@dataclass
+class WorksheetEntry:
+    """Snowsight worksheet without its content, only its digest"""
+
+    _id: str
+    name: str
+    folder_id: Optional[str]
+    folder_name: Optional[str]
+    digest: Optional[str] = None
+
+
+class EntityIndex:
+    """
+    Index of Snowsight worksheets and folders by id and name.
+    Worksheets are indexed as WorksheetEntry, without their content,
+    so that indexing every entity keeps memory flat.
+    """
+
+    def __init__(self, worksheets=None, folders=None):
+        self.worksheets_by_id: Dict[str, WorksheetEntry] = {}
+        self.worksheets_by_name: Dict[str, WorksheetEntry] = {}
+        self.folders_by_id: Dict[str, Folder] = {}
+        self.folders_by_name: Dict[str, Folder] = {}
+
+        for folder in folders or []:
+            self.add_folder(folder)
+        for entry in worksheets or []:
+            self.add_worksheet(entry)
+
+    @property
+    def worksheets(self) -> List[WorksheetEntry]:
+        return list(self.worksheets_by_id.values())
+
+    @property
+    def folders(self) -> List[Folder]:
+        return list(self.folders_by_id.values())
+
+    def add_worksheet(self, entry: WorksheetEntry):
+        self.worksheets_by_id[entry._id] = entry
+        self.worksheets_by_name[entry.name] = entry
+
+    def add_folder(self, folder: Folder):
+        self.folders_by_id[folder._id] = folder
+        self.folders_by_name[folder.name] = folder
+
+    def update_digest(self, worksheet_id: str, digest: str):
+        if worksheet_id in self.worksheets_by_id:
+            self.worksheets_by_id[worksheet_id].digest = digest
+
+
 class SnowflakeGitError(Exception):
     """
     Custom Exception for sf_git specific raised exceptions
@@ -137,3 +224,12 @@ class SnowflakeGitError(Exception):
             return f"SnowflakeGitError: {self.message}."
 
         return "SnowflakeGitError: no more information provided"
+
+
+class ConfigError(SnowflakeGitError):
+    """
+    Missing or invalid sf_git configuration
+    """
+
+    def __str__(self):
+        return f"ConfigError: {self.message}."
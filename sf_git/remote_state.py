@@ -0,0 +1,494 @@
+import json
+import math
+import posixpath
+import re
+from typing import Dict, Iterable, List, Optional
+
+import git
+
+import sf_git.config as config
+from sf_git.cache import content_digest, worksheet_to_files
+from sf_git.git_utils import get_changed_files, get_tracked_shas, write_tree
+from sf_git.models import Worksheet
+from sf_git.worksheets_utils import DEFAULT_PAGE_SIZE
+
+REMOTE_REFS_PREFIX = "refs/snowsight"
+MANIFEST_FILE_NAME = "manifest.json"
+
+# rough cost of a Snowsight call, to estimate push durations
+ESTIMATED_REQUEST_SECONDS = 0.5
+
+
+def remote_ref_name(
+    account_name: str, login_name: str, kind: str = "fetched"
+) -> str:
+    """
+    Name of the ref recording Snowsight state of a user.
+
+    :param account_name: Snowflake account id
+    :param login_name: Snowflake user
+    :param kind: fetched (manifest of state read)
+        or pushed (last pushed commit)
+
+    :returns: refs/snowsight/<account>/<user>/<kind>
+    """
+
+    def component(value: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_-]+", "_", value)
+
+    return (
+        f"{REMOTE_REFS_PREFIX}/{component(account_name)}"
+        f"/{component(login_name)}/{kind}"
+    )
+
+
+def worksheet_state(ws: Worksheet) -> Dict[str, Optional[str]]:
+    """
+    Remote state of a worksheet, as recorded in manifests.
+    Its digest is the git blob sha of its cached content file.
+    """
+
+    (path, content), (_, metadata) = worksheet_to_files(ws).items()
+    return {
+        "name": ws.name,
+        "folder_id": ws.folder_id,
+        "folder_name": ws.folder_name,
+        "content_type": ws.content_type,
+        "modified": ws.modified,
+        "path": path,
+        "digest": content_digest(content),
+        "metadata_digest": content_digest(metadata),
+    }
+
+
+def load_remote_state(
+    repo: git.Repo, account_name: str, login_name: str, kind: str = "fetched"
+) -> Optional[Dict[str, Dict[str, Optional[str]]]]:
+    """
+    Load recorded Snowsight state, without calling Snowsight.
+
+    :param repo: git repository holding the remote state ref
+    :param account_name: Snowflake account id
+    :param login_name: Snowflake user
+    :param kind: kind of state, see remote_ref_name
+
+    :returns: {worksheet id: worksheet state}, None if never recorded
+    """
+
+    manifest = _load_manifest(repo, account_name, login_name, kind)
+    return manifest["worksheets"] if manifest is not None else None
+
+
+def load_remote_folders(
+    repo: git.Repo, account_name: str, login_name: str, kind: str = "fetched"
+) -> Optional[List[str]]:
+    """
+    Load recorded Snowsight folder names, empty folders included,
+    without calling Snowsight.
+
+    :param repo: git repository holding the remote state ref
+    :param account_name: Snowflake account id
+    :param login_name: Snowflake user
+    :param kind: kind of state, see remote_ref_name
+
+    :returns: folder names, None if never recorded
+    """
+
+    manifest = _load_manifest(repo, account_name, login_name, kind)
+    return manifest.get("folders") if manifest is not None else None
+
+
+def _load_manifest(
+    repo: git.Repo, account_name: str, login_name: str, kind: str
+) -> Optional[Dict]:
+    """Recorded manifest of a kind, None if never recorded."""
+
+    ref = git.Reference(repo, remote_ref_name(account_name, login_name, kind))
+    if not ref.is_valid():
+        return None
+    manifest = ref.commit.tree / MANIFEST_FILE_NAME
+    return json.loads(manifest.data_stream.read())
+
+
+def record_states(
+    repo: git.Repo,
+    account_name: str,
+    login_name: str,
+    state: Dict[str, Dict[str, Optional[str]]],
+    kind: str = "fetched",
+    folders: Optional[Iterable[str]] = None,
+    only_folder: Optional[str] = None,
+) -> Optional[git.Commit]:
+    """
+    Record worksheets states in a manifest committed under a dedicated
+    ref, on top of the previously recorded one. Working tree, index and
+    branches are left untouched.
+
+    :param repo: git repository to record state in
+    :param account_name: Snowflake account id
+    :param login_name: Snowflake user
+    :param state: {worksheet id: worksheet state}
+    :param kind: kind of state, see remote_ref_name
+    :param folders: names of all folders, empty ones included,
+        default is to keep previously recorded ones
+    :param only_folder: state is the one of this folder only,
+        state of other folders is kept from previous record
+
+    :returns: new state commit, None if state did not change
+    """
+
+    ref = git.Reference(repo, remote_ref_name(account_name, login_name, kind))
+    parent = ref.commit if ref.is_valid() else None
+
+    if only_folder is not None:
+        state = {
+            **{
+                ws_id: ws_state
+                for ws_id, ws_state in (
+                    load_remote_state(repo, account_name, login_name, kind)
+                    or {}
+                ).items()
+                if ws_state["folder_name"] != only_folder
+            },
+            **state,
+        }
+
+    content = {
+        "account": account_name,
+        "user": login_name,
+        "worksheets": state,
+    }
+    if folders is None:
+        folders = load_remote_folders(repo, account_name, login_name, kind)
+    if folders is not None:
+        content["folders"] = sorted(set(folders))
+    manifest = json.dumps(content, indent=1, sort_keys=True)
+    tree_sha = write_tree(
+        repo, None, {MANIFEST_FILE_NAME: manifest.encode("utf-8")}
+    )
+    if parent is not None and parent.tree.binsha == tree_sha:
+        return None
+
+    state_commit = git.Commit.create_from_tree(
+        repo,
+        git.Tree(repo, tree_sha, path=""),
+        f"[SNOWSIGHT] {kind} state of {login_name} on {account_name}",
+        parent_commits=[parent] if parent is not None else [],
+    )
+    git.Reference.create(repo, ref.path, state_commit, force=True)
+    return state_commit
+
+
+def record_remote_state(
+    repo: git.Repo,
+    account_name: str,
+    login_name: str,
+    worksheets: Iterable[Worksheet],
+    kind: str = "fetched",
+    only_folder: Optional[str] = None,
+    folders: Optional[Iterable[str]] = None,
+) -> Optional[git.Commit]:
+    """
+    Record Snowsight state of worksheets, see record_states.
+
+    :param repo: git repository to record state in
+    :param account_name: Snowflake account id
+    :param login_name: Snowflake user
+    :param worksheets: worksheets as they are in Snowsight
+    :param kind: kind of state, see remote_ref_name
+    :param only_folder: worksheets are those of this folder only,
+        state of other folders is kept from previous record
+    :param folders: names of all Snowsight folders, empty ones included,
+        default is to keep previously recorded ones
+
+    :returns: new state commit, None if state did not change
+    """
+
+    return record_states(
+        repo,
+        account_name,
+        login_name,
+        {ws._id: worksheet_state(ws) for ws in worksheets},
+        kind,
+        folders=folders,
+        only_folder=only_folder,
+    )
+
+
+def load_pushed_commit(
+    repo: git.Repo, account_name: str, login_name: str
+) -> Optional[git.Commit]:
+    """
+    Last commit pushed to Snowsight by a user, None if never pushed.
+
+    :param repo: git repository holding the pushed ref
+    :param account_name: Snowflake account id
+    :param login_name: Snowflake user
+    """
+
+    ref = git.Reference(
+        repo, remote_ref_name(account_name, login_name, "pushed")
+    )
+    return ref.commit if ref.is_valid() else None
+
+
+def record_pushed_commit(
+    repo: git.Repo, account_name: str, login_name: str, commit: git.Commit
+):
+    """
+    Record the commit whose worksheets were pushed to Snowsight.
+
+    :param repo: git repository to record the pushed ref in
+    :param account_name: Snowflake account id
+    :param login_name: Snowflake user
+    :param commit: commit pushed
+    """
+
+    git.Reference.create(
+        repo,
+        remote_ref_name(account_name, login_name, "pushed"),
+        commit,
+        force=True,
+    )
+
+
+def _metadata_path(content_path: str) -> str:
+    """Path of a worksheet metadata file from its content file path."""
+
+    folder, file_name = posixpath.split(content_path)
+    stem = posixpath.splitext(file_name)[0]
+    return posixpath.join(folder, f".{stem}_metadata.json")
+
+
+def worksheets_status(
+    repo: git.Repo,
+    remote_state: Optional[Dict[str, Dict[str, Optional[str]]]],
+    branch_name: Optional[str] = None,
+) -> List[Dict[str, Optional[str]]]:
+    """
+    Three-way status of worksheets: working tree against the checked out
+    commit, and branch against Snowsight recorded state. Only git stat
+    data and object shas are compared, no content is read.
+
+    :param repo: git repository with a working tree
+    :param remote_state: recorded Snowsight state, None if unknown
+    :param branch_name: revision to compare to Snowsight state,
+        default is the checked out one
+
+    :returns: per changed worksheet, its content path relative to the
+        worksheets path, local change (added, modified, deleted or None)
+        and remote change (modified, local_only, remote_only or None,
+        always None when Snowsight state is unknown)
+    """
+
+    worksheets_path = config.GLOBAL_CONFIG.worksheets_path
+    worksheets_dir = worksheets_path.relative_to(
+        repo.working_tree_dir
+    ).as_posix()
+    prefix_length = 0 if worksheets_dir == "." else len(worksheets_dir) + 1
+
+    # committed files, as {path: blob sha}, none before first commit
+    committed = {}
+    if branch_name is not None or repo.head.is_valid():
+        committed = {
+            path[prefix_length:]: sha
+            for path, sha in get_tracked_shas(
+                repo, worksheets_path, branch_name
+            ).items()
+        }
+
+    # working tree changes
+    local_changes = {}
+    for change_type, paths in get_changed_files(
+        repo, worksheets_path
+    ).items():
+        for path in paths:
+            local_changes[path[prefix_length:]] = change_type
+
+    remote_by_path = {
+        ws_state["path"]: ws_state
+        for ws_state in (remote_state or {}).values()
+    }
+
+    all_paths = set(committed) | set(local_changes) | set(remote_by_path)
+    content_paths = sorted(
+        path
+        for path in all_paths
+        if not posixpath.basename(path).endswith("_metadata.json")
+    )
+
+    status = []
+    for path in content_paths:
+        metadata_path = _metadata_path(path)
+        local_change = local_changes.get(path) or local_changes.get(
+            metadata_path
+        )
+
+        ws_state = remote_by_path.get(path)
+        if remote_state is None:
+            remote_change = None
+        elif path not in committed:
+            remote_change = "remote_only" if ws_state else None
+        elif ws_state is None:
+            remote_change = "local_only"
+        elif (
+            committed[path] != ws_state["digest"]
+            or committed.get(metadata_path) != ws_state["metadata_digest"]
+        ):
+            remote_change = "modified"
+        else:
+            remote_change = None
+
+        if local_change or remote_change:
+            status.append(
+                {
+                    "path": path,
+                    "local": local_change,
+                    "remote": remote_change,
+                }
+            )
+    return status
+
+
+def _same_state(
+    state: Optional[Dict[str, Optional[str]]],
+    other: Optional[Dict[str, Optional[str]]],
+) -> bool:
+    """Whether two worksheet states have the same content and metadata."""
+
+    if state is None or other is None:
+        return state is other
+    return (
+        state["digest"] == other["digest"]
+        and state["metadata_digest"] == other["metadata_digest"]
+    )
+
+
+def classify_sync(
+    base: Dict[str, Dict[str, Optional[str]]],
+    local: Dict[str, Dict[str, Optional[str]]],
+    remote: Dict[str, Dict[str, Optional[str]]],
+) -> Dict[str, str]:
+    """
+    Three-way classification of worksheets, comparing committed and
+    Snowsight states to their last synced one.
+
+    :param base: {worksheet id: state} when last synced
+    :param local: {worksheet id: state} as committed
+    :param remote: {worksheet id: state} in Snowsight
+
+    :returns: {worksheet id: action}, action being in_sync,
+        pull (only changed in Snowsight), push (only changed locally),
+        conflict (changed on both sides, differently),
+        deleted_locally or deleted_remotely (and unchanged on other side),
+        unsupported (only renamed or moved locally, which cannot be pushed)
+    """
+
+    actions = {}
+    for ws_id in dict.fromkeys([*local, *remote]):
+        base_state = base.get(ws_id)
+        local_state = local.get(ws_id)
+        remote_state = remote.get(ws_id)
+
+        if _same_state(local_state, remote_state):
+            action = "in_sync"
+        elif _same_state(local_state, base_state):
+            action = "deleted_remotely" if remote_state is None else "pull"
+        elif _same_state(remote_state, base_state):
+            if local_state is None:
+                action = "deleted_locally"
+            elif (
+                base_state is not None
+                and local_state["metadata_digest"]
+                != base_state["metadata_digest"]
+            ):
+                action = "unsupported"
+            else:
+                action = "push"
+        else:
+            action = "conflict"
+        actions[ws_id] = action
+    return actions
+
+
+def plan_push(
+    worksheets: Iterable[Worksheet],
+    remote_state: Dict[str, Dict[str, Optional[str]]],
+    jobs: int = 1,
+    remote_folders: Optional[Iterable[str]] = None,
+) -> Dict:
+    """
+    Operations a push of worksheets would perform, from recorded
+    Snowsight state only. As uploads do, Snowsight worksheets and
+    folders are matched by name.
+
+    :param worksheets: worksheets to push
+    :param remote_state: recorded Snowsight state
+    :param jobs: maximum number of concurrent Snowsight calls
+    :param remote_folders: recorded Snowsight folder names,
+        including empty folders
+
+    :returns: folders to create, worksheets to create and to update
+        (path, name, folder name, content digest and Snowsight content
+        digest, None if created), unchanged worksheets paths, number of
+        Snowsight requests and estimated duration in seconds
+    """
+
+    remote_by_name = {
+        ws_state["name"]: ws_state for ws_state in remote_state.values()
+    }
+    remote_folders = set(remote_folders or ()) | {
+        ws_state["folder_name"] for ws_state in remote_state.values()
+    }
+
+    plan = {
+        "folders_to_create": [],
+        "create": [],
+        "update": [],
+        "unchanged": [],
+    }
+    worksheet_requests = 0
+    for ws in worksheets:
+        ws_state = worksheet_state(ws)
+        entry = {
+            "path": ws_state["path"],
+            "name": ws.name,
+            "folder_name": ws.folder_name,
+            "digest": ws_state["digest"],
+        }
+        remote_ws = remote_by_name.get(ws.name)
+        entry["remote_digest"] = remote_ws["digest"] if remote_ws else None
+        if remote_ws is None:
+            plan["create"].append(entry)
+            # creation, then content write if any
+            worksheet_requests += 2 if ws.content else 1
+        elif remote_ws["digest"] != ws_state["digest"] and ws.content:
+            plan["update"].append(entry)
+            worksheet_requests += 1
+        else:
+            plan["unchanged"].append(ws_state["path"])
+
+        if (
+            ws.folder_name
+            and ws.folder_name not in remote_folders
+            and ws.folder_name not in plan["folders_to_create"]
+        ):
+            plan["folders_to_create"].append(ws.folder_name)
+
+    jobs = max(1, jobs)
+    listing_requests = max(
+        1, math.ceil(len(remote_state) / DEFAULT_PAGE_SIZE)
+    )
+    folder_requests = len(plan["folders_to_create"])
+    plan["requests"] = listing_requests + folder_requests + worksheet_requests
+    plan["jobs"] = jobs
+    plan["estimated_seconds"] = round(
+        ESTIMATED_REQUEST_SECONDS
+        * (
+            listing_requests
+            + math.ceil(folder_requests / jobs)
+            + math.ceil(worksheet_requests / jobs)
+        ),
+        1,
+    )
+    return plan
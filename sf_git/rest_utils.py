@@ -1,11 +1,195 @@
 import logging
 import platform
+import random
 import re
 import socket
 import subprocess
+import threading
 import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Callable, Optional, Tuple
 
 import requests
+from urllib3.exceptions import NewConnectionError
+
+# responses for which an idempotent request can be sent again
+RETRY_STATUSES = (429, 502, 503, 504)
+# responses for which the request was rejected before being processed,
+# any request can be sent again
+THROTTLING_STATUSES = (429, 503)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+@dataclass
+class RetryPolicy:
+    """
+    When and how long to wait before sending a request again.
+    Waits grow exponentially with full jitter, or follow Retry-After.
+    Requests asked to wait longer than backoff_max are not retried.
+    """
+
+    max_retries: int = 4
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+    retry_statuses: Tuple[int, ...] = RETRY_STATUSES
+
+    def wait_time(
+        self, attempt: int, response: Optional[requests.Response] = None
+    ) -> Optional[float]:
+        """
+        :param attempt: number of retries already done
+        :param response: retried response, if any
+
+        :returns: seconds to wait before next retry,
+            None if Retry-After exceeds backoff_max
+        """
+
+        retry_after = _parse_retry_after(response)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.backoff_max else None
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt)
+        )
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+@dataclass
+class RetryStats:
+    """Retries done and time waited for a set of requests."""
+
+    retries: int = 0
+    wait_time: float = 0.0
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for bulk operations, adapted with AIMD:
+    each successful request adds 1/limit to the limit, each throttled
+    request halves it.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit / 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+def _parse_retry_after(
+    response: Optional[requests.Response],
+) -> Optional[float]:
+    if response is None:
+        return None
+    retry_after = response.headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+
+
+def _failed_to_connect(error: requests.exceptions.ConnectionError) -> bool:
+    """Whether the request failed before reaching the server."""
+
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+
+def send_with_retry(
+    send: Callable[[], requests.Response],
+    policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+    stats: Optional[RetryStats] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+    idempotent: bool = True,
+) -> requests.Response:
+    """
+    Send a request, again after a backoff while it is throttled,
+    unavailable or could not connect.
+
+    A request which is not idempotent is only sent again when the
+    server surely did not process it: throttled, or not connected.
+
+    :param send: function sending the request
+    :param policy: retry policy
+    :param stats: if provided, incremented with retries and waits
+    :param limiter: if provided, concurrency limit to respect
+    :param idempotent: whether sending the request twice is harmless
+
+    :returns: last response
+    """
+
+    attempt = 0
+    while True:
+        response, error = None, None
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = send()
+        except requests.exceptions.ConnectionError as exc:
+            error = exc
+        finally:
+            if limiter is not None:
+                limiter.release(
+                    throttled=response is not None
+                    and response.status_code in THROTTLING_STATUSES
+                )
+
+        if error is not None:
+            retriable = idempotent or _failed_to_connect(error)
+        else:
+            retriable = response.status_code in (
+                policy.retry_statuses
+                if idempotent
+                else set(policy.retry_statuses) & set(THROTTLING_STATUSES)
+            )
+        wait_time = None
+        if retriable and attempt < policy.max_retries:
+            wait_time = policy.wait_time(attempt, response)
+        if wait_time is None:
+            if error is not None:
+                raise error
+            return response
+
+        logging.warning(
+            f"{error or response.status_code}, "
+            f"retrying in {wait_time:.2f}s "
+            f"({attempt + 1}/{policy.max_retries})"
+        )
+        if stats is not None:
+            stats.retries += 1
+            stats.wait_time += wait_time
+        time.sleep(wait_time)
+        attempt += 1
 
 
 def api_post(
@@ -20,6 +204,7 @@ def api_post(
     cookies: requests.cookies.RequestsCookieJar = None,  # noqa
     allow_redirect: bool = False,
     as_obj: bool = False,
+    session: requests.Session = None,
 ):
     start_time = time.time()
 
@@ -27,17 +212,15 @@ def api_post(
         base_url += "/"
 
     try:
-        session = requests.Session()
-        session.verify = False
-        session.max_redirects = 20
+        if session is None:
+            session = requests.Session()
+            session.max_redirects = 20
 
         headers = requests.models.CaseInsensitiveDict()
         if referer:
             headers["Referer"] = referer
         if snowflake_context:
             headers["x-snowflake-context"] = snowflake_context
-        if cookies:
-            session.cookies.update(cookies)
         if csrf:
             headers["X-CSRF-Token"] = csrf
 
@@ -46,12 +229,17 @@ def api_post(
         content_type = request_type_header
         headers["Content-Type"] = content_type
 
-        response = session.post(
-            base_url + rest_api_url,
-            headers=headers,
-            data=request_body,
-            timeout=60,
-            allow_redirects=allow_redirect,
+        response = send_with_retry(
+            lambda: session.post(
+                base_url + rest_api_url,
+                headers=headers,
+                data=request_body,
+                cookies=cookies,
+                timeout=60,
+                allow_redirects=allow_redirect,
+                verify=False,
+            ),
+            idempotent=False,
         )
 
         if response.status_code < 400:
@@ -121,33 +309,36 @@ def api_get(
     cookies: requests.cookies.RequestsCookieJar = None,  # noqa
     allow_redirect: bool = True,
     as_obj: bool = False,
+    session: requests.Session = None,
 ):
     start_time = time.time()
 
     if not base_url.endswith("/"):
         base_url += "/"
     try:
-        session = requests.Session()
-        session.verify = False
-        session.max_redirects = 20
+        if session is None:
+            session = requests.Session()
+            session.max_redirects = 20
 
         headers = requests.models.CaseInsensitiveDict()
         if referer:
             headers["Referer"] = referer
         if snowflake_context:
             headers["x-snowflake-context"] = snowflake_context
-        if cookies:
-            session.cookies.update(cookies)
         if csrf:
             headers["X-CSRF-Token"] = csrf
 
         headers["Accept"] = accept_header
 
-        response = session.get(
-            base_url + rest_api_url,
-            headers=headers,
-            timeout=60,
-            allow_redirects=allow_redirect,
+        response = send_with_retry(
+            lambda: session.get(
+                base_url + rest_api_url,
+                headers=headers,
+                cookies=cookies,
+                timeout=60,
+                allow_redirects=allow_redirect,
+                verify=False,
+            )
         )
 
         if response.status_code < 400:
@@ -1,9 +1,8 @@
 import json
-import os
 import re
 import socket
 import uuid
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from urllib import parse
 from urllib.parse import urlparse
 
@@ -11,6 +10,7 @@ import requests
 import urllib3
 
 import sf_git.config as config
+from sf_git.auth_cache import load_endpoint, save_endpoint
 from sf_git.models import (
     AuthenticationContext,
     AuthenticationError,
@@ -23,6 +23,7 @@ from sf_git.rest_utils import (
     random_unused_port,
     start_browser,
 )
+from sf_git.snowsight_client import SnowsightClient, get_client
 
 urllib3.disable_warnings()
 
@@ -37,52 +38,30 @@ def authenticate_to_snowsight(
     auth_context.main_app_url = config.GLOBAL_CONFIG.sf_main_app_url
     auth_context.account_name = account_name
     auth_context.login_name = login_name
+    client = get_client(auth_context)
 
-    # Get App Server Url and Account Url
-    app_endpoint = get_account_app_endpoint(account_name)
-    if not app_endpoint["valid"]:
-        raise AuthenticationError(
-            f"No valid endpoint for account {account_name}"
-        )
-
-    auth_context.account = app_endpoint["account"]
-    auth_context.account_url = app_endpoint["url"]
-    auth_context.app_server_url = app_endpoint["appServerUrl"]
-    auth_context.region = app_endpoint["region"]
-
-    # Get unverified csrf
-    bootstrap_response = get_csrf_from_boostrap_cookie(auth_context)
-    csrf_cookie = next(
-        (c for c in bootstrap_response.cookies if c.name.startswith("csrf-")),
-        None,
-    )
-    if not csrf_cookie:
-        raise AuthenticationError("Could not get csrf from bootstrap endpoint")
-    auth_context.csrf = csrf_cookie.value
-    auth_context.cookies = bootstrap_response.cookies
-
-    # Get client ID
-    client_id_responses = oauth_start_get_snowsight_client_id_in_deployment(
-        auth_context=auth_context
+    # Get App Server Url and Account Url, cached ones first
+    cached_endpoint = load_endpoint(account_name)
+    app_endpoint = cached_endpoint or get_account_app_endpoint(
+        account_name, client=client, refresh=True
     )
-    parsed = urlparse(client_id_responses.url)
-    parsed_query = parse.parse_qs(parsed.query)
-    auth_context.cookies = agg_cookies_from_responses(
-        client_id_responses
-    )  # client_id_responses.history[-1].cookies
-    state = json.loads(parsed_query["state"][0])
-    auth_context.oauth_nonce = state["oauthNonce"]
-    auth_context.auth_originator = state.get("originator")
-    auth_context.window_id = state.get("windowId")
-    auth_context.auth_code_challenge = parsed_query["code_challenge"][0]
-    auth_context.auth_code_challenge_method = parsed_query[
-        "code_challenge_method"
-    ][0]
-    auth_context.auth_redirect_uri = parsed_query["redirect_uri"][0]
-    auth_context.client_id = parsed_query["client_id"][0]
+    try:
+        _set_app_endpoint(auth_context, app_endpoint)
+        _start_oauth(auth_context)
+    except AuthenticationError:
+        if cached_endpoint is None:
+            raise
+        # cached endpoint may be outdated
+        resolved_endpoint = get_account_app_endpoint(
+            account_name, client=client, refresh=True
+        )
+        if resolved_endpoint == cached_endpoint:
+            raise
+        _set_app_endpoint(auth_context, resolved_endpoint)
+        _start_oauth(auth_context)
 
     if not auth_context.organization_id:
-        auth_context.organization_id = os.environ.get("SF_ORGANIZATION_ID")
+        auth_context.organization_id = config.GLOBAL_CONFIG.sf_organization_id
 
     # Get master token
     if auth_mode == AuthenticationMode.PWD:
@@ -123,6 +102,7 @@ def authenticate_to_snowsight(
                 account_name.split(".")[0],
                 login_name,
                 redirect_port,
+                client=client,
             )
         )
         idp_url = sso_link_response["data"]["ssoUrl"]
@@ -155,6 +135,7 @@ def authenticate_to_snowsight(
                 auth_context.login_name,
                 sso_token,
                 proof_key,
+                client=client,
             )
 
     # Get oauth redirect
@@ -213,15 +194,99 @@ def authenticate_to_snowsight(
     return auth_context
 
 
-def get_account_app_endpoint(account_name: str) -> Dict[str, Any]:
+def _set_app_endpoint(
+    auth_context: AuthenticationContext, app_endpoint: Dict[str, Any]
+):
+    if not app_endpoint.get("valid"):
+        raise AuthenticationError(
+            f"No valid endpoint for account {auth_context.account_name}"
+        )
+
+    try:
+        auth_context.account = app_endpoint["account"]
+        auth_context.account_url = app_endpoint["url"]
+        auth_context.app_server_url = app_endpoint["appServerUrl"]
+        auth_context.region = app_endpoint["region"]
+    except KeyError as exc:
+        raise AuthenticationError(
+            f"Incomplete endpoint for account {auth_context.account_name},"
+            f" missing {exc}"
+        ) from exc
+
+
+def _start_oauth(auth_context: AuthenticationContext):
+    # Get unverified csrf
+    bootstrap_response = get_csrf_from_boostrap_cookie(auth_context)
+    if not isinstance(bootstrap_response, requests.Response):
+        raise AuthenticationError("Could not reach bootstrap endpoint")
+    csrf_cookie = next(
+        (c for c in bootstrap_response.cookies if c.name.startswith("csrf-")),
+        None,
+    )
+    if not csrf_cookie:
+        raise AuthenticationError("Could not get csrf from bootstrap endpoint")
+    auth_context.csrf = csrf_cookie.value
+    auth_context.cookies = bootstrap_response.cookies
+
+    # Get client ID
+    client_id_responses = oauth_start_get_snowsight_client_id_in_deployment(
+        auth_context=auth_context
+    )
+    parsed = urlparse(client_id_responses.url)
+    parsed_query = parse.parse_qs(parsed.query)
+    auth_context.cookies = agg_cookies_from_responses(
+        client_id_responses
+    )  # client_id_responses.history[-1].cookies
+    try:
+        state = json.loads(parsed_query["state"][0])
+        auth_context.oauth_nonce = state["oauthNonce"]
+        auth_context.auth_originator = state.get("originator")
+        auth_context.window_id = state.get("windowId")
+        auth_context.auth_code_challenge = parsed_query["code_challenge"][0]
+        auth_context.auth_code_challenge_method = parsed_query[
+            "code_challenge_method"
+        ][0]
+        auth_context.auth_redirect_uri = parsed_query["redirect_uri"][0]
+        auth_context.client_id = parsed_query["client_id"][0]
+    except (KeyError, ValueError) as exc:
+        raise AuthenticationError(
+            "Unexpected oauth redirect for account"
+            f" {auth_context.account_url}"
+        ) from exc
+
+
+def get_account_app_endpoint(
+    account_name: str,
+    client: Optional[SnowsightClient] = None,
+    refresh: bool = False,
+) -> Dict[str, Any]:
+    """
+    Resolve account app server url, url, region and account,
+    from the endpoint cache unless refresh is requested.
+    Valid resolutions are saved to the endpoint cache.
+    """
+
+    if not refresh:
+        app_endpoint = load_endpoint(account_name)
+        if app_endpoint is not None:
+            return app_endpoint
+
     main_app_url = config.GLOBAL_CONFIG.sf_main_app_url
     response = api_post(
         main_app_url,
         f"v0/validate-snowflake-url?url={account_name}",
         "*/*",
+        session=client.session if client else None,
     )
+    if not response:
+        raise AuthenticationError(
+            f"Could not resolve endpoint for account {account_name}"
+        )
 
-    return json.loads(response)
+    app_endpoint = json.loads(response)
+    if app_endpoint.get("valid"):
+        save_endpoint(account_name, app_endpoint)
+    return app_endpoint
 
 
 def get_csrf_from_boostrap_cookie(
@@ -234,6 +299,7 @@ def get_csrf_from_boostrap_cookie(
         allow_redirect=True,
         as_obj=True,
         cookies=auth_context.cookies,
+        session=get_client(auth_context).session,
     )
     return response
 
@@ -260,9 +326,10 @@ def oauth_start_get_snowsight_client_id_in_deployment(
         allow_redirect=True,
         cookies=auth_context.cookies,
         as_obj=True,
+        session=get_client(auth_context).session,
     )
 
-    if response.status_code == 200:
+    if isinstance(response, requests.Response) and response.status_code == 200:
         return response
 
     raise AuthenticationError(
@@ -291,6 +358,7 @@ def get_token_from_credentials(
         request_body=json.dumps(request_body),
         cookies=auth_context.cookies,
         as_obj=True,
+        session=get_client(auth_context).session,
     )
     return auth_response
 
@@ -332,6 +400,7 @@ def oauth_get_master_token_from_credentials(
         cookies=auth_context.cookies,
         as_obj=True,
         allow_redirect=True,
+        session=get_client(auth_context).session,
     )
 
 
@@ -364,6 +433,7 @@ def oauth_authorize_get_oauth_redirect_from_oauth_token(
         csrf=auth_context.csrf,
         cookies=auth_context.cookies,
         allow_redirect=True,
+        session=get_client(auth_context).session,
     )
 
     return json.loads(response_content)
@@ -378,7 +448,7 @@ def oauth_complete_get_auth_token_from_redirect(
         "Referer": f"{auth_context.main_app_url}/",
     }
 
-    response = requests.get(
+    response = get_client(auth_context).session.get(
         url,
         headers=headers,
         allow_redirects=True,
@@ -394,6 +464,7 @@ def get_sso_login_link(
     account_name: str,
     login_name: str,
     redirect_port: int,
+    client: Optional[SnowsightClient] = None,
 ):
     request_json_template = {
         "data": {
@@ -412,6 +483,7 @@ def get_sso_login_link(
         "application/json",
         request_body,
         "application/json",
+        session=client.session if client else None,
     )
 
     return response
@@ -423,6 +495,7 @@ def get_master_token_from_sso_token(
     login_name: str,
     sso_token: str,
     proof_key: str,
+    client: Optional[SnowsightClient] = None,
 ) -> str:
     request_json_template = {
         "data": {
@@ -442,6 +515,7 @@ def get_master_token_from_sso_token(
         "application/json",
         request_body,
         "application/json",
+        session=client.session if client else None,
     )
 
     parsed = json.loads(response)
@@ -0,0 +1,167 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from sf_git.models import AuthenticationContext
+from sf_git.rest_utils import (
+    DEFAULT_RETRY_POLICY,
+    IDEMPOTENT_METHODS,
+    AdaptiveLimiter,
+    RetryPolicy,
+    RetryStats,
+    send_with_retry,
+)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 90
+
+
+class SnowsightClient:
+    """
+    HTTP client to Snowsight, bound to an authentication context.
+
+    It owns a single requests session: connections to the same host
+    are pooled and kept alive, cookies set by responses are kept in
+    the session cookie jar and Snowsight default headers are added
+    to every request.
+
+    Throttled or unavailable responses are retried following
+    retry_policy, only throttled ones for requests which are not
+    idempotent. When a limiter is set, requests respect its
+    concurrency limit.
+    """
+
+    def __init__(
+        self,
+        auth_context: Optional[AuthenticationContext] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: int = DEFAULT_TIMEOUT,
+        retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+    ):
+        self.auth_context = auth_context
+        self.timeout = timeout
+        self.pool_size = 0
+        self.retry_policy = retry_policy
+        self.limiter: Optional[AdaptiveLimiter] = None
+        self._local = threading.local()
+
+        self.session = requests.Session()
+        self.session.max_redirects = 20
+        self.set_pool_size(pool_size)
+
+    def set_pool_size(self, pool_size: int):
+        """
+        Mount connection pools able to keep pool_size connections alive
+        per host. Existing pooled connections are discarded.
+
+        :param pool_size: maximum number of connections kept per host
+        """
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.pool_size = pool_size
+
+    def default_headers(self) -> Dict[str, str]:
+        """Headers expected by Snowsight for the bound user."""
+
+        headers = {}
+        if self.auth_context is None:
+            return headers
+
+        if self.auth_context.username and self.auth_context.account_url:
+            headers["X-Snowflake-Context"] = (
+                f"{self.auth_context.username}::"
+                f"{self.auth_context.account_url}"
+            )
+        if self.auth_context.main_app_url:
+            headers["Referer"] = self.auth_context.main_app_url
+        return headers
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        idempotent: Optional[bool] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request through the pooled session.
+
+        :param method: HTTP method e.g. POST
+        :param url: absolute url to call
+        :param headers: headers added to (or overriding) default ones
+        :param idempotent: whether sending the request twice is harmless,
+            by default only for idempotent HTTP methods
+        :param kwargs: any other requests keyword argument
+
+        :returns: requests.Response
+        """
+
+        request_headers = self.default_headers()
+        request_headers.update(headers or {})
+        kwargs.setdefault("timeout", self.timeout)
+
+        return send_with_retry(
+            lambda: self.session.request(
+                method, url, headers=request_headers, **kwargs
+            ),
+            policy=self.retry_policy,
+            stats=getattr(self._local, "stats", None),
+            limiter=self.limiter,
+            idempotent=(
+                method.upper() in IDEMPOTENT_METHODS
+                if idempotent is None
+                else idempotent
+            ),
+        )
+
+    @contextmanager
+    def track_retries(self) -> Iterator[RetryStats]:
+        """
+        Count retries of the requests sent by the current thread
+        within the context.
+        """
+
+        stats = RetryStats()
+        self._local.stats = stats
+        try:
+            yield stats
+        finally:
+            self._local.stats = None
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def get_client(auth_context: AuthenticationContext) -> SnowsightClient:
+    """
+    Get the Snowsight client bound to an authentication context,
+    creating it on first use.
+
+    :param auth_context: authentication info for Snowsight
+
+    :returns: SnowsightClient shared by all calls using auth_context
+    """
+
+    if auth_context.client is None:
+        auth_context.client = SnowsightClient(auth_context)
+    return auth_context.client
@@ -1,31 +1,174 @@
+import itertools
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from urllib import parse
-from typing import Callable, List, Optional
-import pandas as pd
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 import requests
 
-from sf_git.cache import save_worksheets_to_cache
+from sf_git.cache import save_worksheets_to_cache, worksheet_digest
 from sf_git.models import (
     AuthenticationContext,
+    EntityCatalog,
+    EntityIndex,
     Folder,
     SnowsightError,
     Worksheet,
+    WorksheetEntry,
     WorksheetError,
 )
+from sf_git.rest_utils import AdaptiveLimiter
+from sf_git.snowsight_client import get_client
 
+DEFAULT_PAGE_SIZE = 500
+# single request listing entities when offset is not honoured
+UNPAGED_LIST_SIZE = 10000
 
-def get_worksheets(
+OUTPUT_FORMATS = ("table", "json", "ids")
+PREVIEW_LENGTH = 40
+
+# Entity indexes listed in this process, per Snowsight user
+_INDEX_CACHE: Dict[Tuple[str, str, str], EntityIndex] = {}
+
+
+def _index_key(
     auth_context: AuthenticationContext,
-    store_to_cache: Optional[bool] = False,
-    only_folder: Optional[str] = None,
-) -> List[Worksheet]:
+) -> Tuple[str, str, str]:
+    return (
+        auth_context.app_server_url,
+        auth_context.organization_id,
+        auth_context.username,
+    )
+
+
+def get_entity_index(
+    auth_context: AuthenticationContext,
+    refresh: bool = False,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> EntityIndex:
+    """
+    Get index of worksheets and folders available for authenticated
+    user, paging through the entities list. Worksheet contents are
+    only kept as digests, each page is released once indexed.
+
+    The index is cached for the process and kept up to date
+    by the write helpers of this module.
+
+    :param auth_context: Authentication info for Snowsight
+    :param refresh: (flag) list entities again even if cached
+    :param page_size: number of entities requested per call
+
+    :returns: EntityIndex
+    """
+
+    key = _index_key(auth_context)
+    if not refresh and key in _INDEX_CACHE:
+        return _INDEX_CACHE[key]
+
+    index = EntityIndex()
+    for _ in iter_worksheets(auth_context, page_size=page_size, index=index):
+        pass
+
+    _INDEX_CACHE[key] = index
+    return index
+
+
+def worksheet_entry(ws: Worksheet) -> WorksheetEntry:
+    """Index entry of a worksheet, its content replaced by its digest."""
+
+    return WorksheetEntry(
+        ws._id, ws.name, ws.folder_id, ws.folder_name, worksheet_digest(ws)
+    )
+
+
+def iter_entity_pages(
+    auth_context: AuthenticationContext,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> Iterator[EntityCatalog]:
+    """
+    Page through the entities list of authenticated user.
+
+    Paging stops on a short page. A full page that only holds already
+    listed entities means offset is ignored: entities are then listed
+    again in a single request of UNPAGED_LIST_SIZE entities, only those
+    not listed yet are kept, and a warning is logged if that request
+    is truncated too.
+
+    :param auth_context: Authentication info for Snowsight
+    :param page_size: number of entities requested per call
+
+    :returns: iterator of one EntityCatalog per page
+    """
+
+    listed_ids = set()
+    offset = 0
+    while True:
+        res_data = _list_entities(auth_context, page_size, offset)
+        entities = res_data["entities"]
+        page_ids = {entity["entityId"] for entity in entities}
+        if not page_ids - listed_ids:
+            if len(entities) == page_size:
+                yield _list_unpaged_entities(auth_context, listed_ids)
+            return
+        listed_ids |= page_ids
+
+        yield _parse_entities(res_data)
+
+        if len(entities) < page_size:
+            return
+        offset += len(entities)
+
+
+def _list_unpaged_entities(
+    auth_context: AuthenticationContext, listed_ids: set
+) -> EntityCatalog:
     """
-    Get list of worksheets available for authenticated user
+    Entities not listed yet, from a single large entities list request,
+    for when offset is not honoured.
     """
 
-    optionsparams = (
-        '{"sort":{"col":"viewed","dir":"desc"},"limit":500,"owner":null,'
-        '"types":["query", "folder"],"showNeverViewed":"if-invited"}'
+    logging.warning(
+        "Entities list offset is ignored, listing up to"
+        f" {UNPAGED_LIST_SIZE} entities in a single request"
+    )
+    res_data = _list_entities(auth_context, UNPAGED_LIST_SIZE, 0)
+    if len(res_data["entities"]) >= UNPAGED_LIST_SIZE:
+        logging.warning(
+            f"Entities list truncated to {UNPAGED_LIST_SIZE} entities,"
+            " others are missing"
+        )
+    res_data["entities"] = [
+        entity
+        for entity in res_data["entities"]
+        if entity["entityId"] not in listed_ids
+    ]
+    return _parse_entities(res_data)
+
+
+def _list_entities(
+    auth_context: AuthenticationContext, page_size: int, offset: int
+) -> dict:
+    """Get one page of the entities list, as a dict."""
+
+    optionsparams = json.dumps(
+        {
+            "sort": {"col": "viewed", "dir": "desc"},
+            "limit": page_size,
+            "offset": offset,
+            "owner": None,
+            "types": ["query", "folder"],
+            "showNeverViewed": "if-invited",
+        }
     )
 
     request_json_template = {
@@ -34,92 +177,319 @@ def get_worksheets(
     }
     req_body = parse.urlencode(request_json_template)
 
-    sf_context_name = auth_context.username
-    snowflake_context = f"{sf_context_name}::{auth_context.account_url}"
-
-    res = requests.post(
+    res = get_client(auth_context).post(
         f"{auth_context.app_server_url}/v0/organizations/"
         f"{auth_context.organization_id}/entities/list",
         data=req_body,
         headers={
             "Accept": "application/json",
             "Content-Type": "application/x-www-form-urlencoded",
-            "X-Snowflake-Context": snowflake_context,
-            "Referer": auth_context.main_app_url,
         },
         cookies=auth_context.snowsight_token,
-        timeout=90,
+        idempotent=True,
     )
 
+    if res.status_code in (401, 403):
+        raise WorksheetError(
+            "Not allowed to get entity list\n" f"\t Reason is {res.text}",
+            SnowsightError.PERMISSION,
+        )
     if res.status_code != 200:
         raise WorksheetError(
-            "Failed to get worksheet list\n" f"\t Reason is {res.text}"
+            "Failed to get entity list\n" f"\t Reason is {res.text}"
         )
-    res_data = json.loads(res.text)
+
+    return decode_entities_response(res.content)
+
+
+def decode_entities_response(payload: bytes) -> dict:
+    """
+    Decode an entities list response body.
+
+    Worksheet drafts are pruned while decoding: as soon as a query
+    object is decoded, only its newest draft is kept, so older drafts
+    are released before the rest of the payload is decoded.
+    Bytes are decoded directly, without building the response text.
+
+    :param payload: raw response body
+
+    :returns: decoded response, with at most one draft per query
+    """
+
+    return json.loads(payload, object_hook=_keep_latest_draft)
+
+
+def _keep_latest_draft(obj: dict) -> dict:
+    drafts = obj.get("drafts")
+    if isinstance(drafts, dict) and len(drafts) > 1:
+        try:
+            last_update_id = max(drafts.keys(), key=int)  # timestamps
+        except ValueError:
+            return obj
+        obj["drafts"] = {last_update_id: drafts[last_update_id]}
+    return obj
+
+
+def invalidate_entity_index(auth_context: AuthenticationContext):
+    """Drop the cached entity index of authenticated user."""
+
+    _INDEX_CACHE.pop(_index_key(auth_context), None)
+
+
+def is_session_valid(auth_context: AuthenticationContext) -> bool:
+    """
+    Check that Snowsight still accepts an authenticated session,
+    with a single entity list call.
+
+    Network errors and other Snowsight failures are raised: they do not
+    tell whether the session is still valid.
+    """
+
+    try:
+        _list_entities(auth_context, page_size=1, offset=0)
+    except WorksheetError as exc:
+        if exc.snowsight_error == SnowsightError.PERMISSION:
+            return False
+        raise
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        # not an entity list, e.g. a login page
+        return False
+    return True
+
+
+def _parse_entities(res_data: dict) -> EntityCatalog:
+    """Build catalog from an entities list response."""
+
+    catalog = EntityCatalog()
     entities = res_data["entities"]
     contents = res_data["models"].get("queries")
-    if contents is None:
-        return []
-
-    worksheets = []
-    for worksheet in entities:
-        if (
-            only_folder is not None
-            and worksheet["info"]["folderName"] != only_folder
-        ):
-            continue
-        if worksheet["entityType"] == "query":
-            current_ws = Worksheet(
-                worksheet["entityId"],
-                worksheet["info"]["name"],
-                worksheet["info"]["folderId"],
-                worksheet["info"]["folderName"],
-                content_type=worksheet["info"]["queryLanguage"],
+
+    for entity in entities:
+        if entity["entityType"] == "folder":
+            catalog.add_folder(
+                Folder(
+                    entity["entityId"],
+                    entity["info"]["name"],
+                )
             )
-            worksheets.append(current_ws)
-
-    for i, _ in enumerate(worksheets):
-        content = contents[worksheets[i]._id]
-        if "query" in content.keys():
-            worksheets[i].content = content["query"]
-        elif "drafts" in content.keys():
-            draft_ids = [draft_id for draft_id in content["drafts"].keys()]
-            if len(draft_ids) > 0:
-                if len(draft_ids) > 1:  # keys are timestamps
-                    last_update_id = str(
-                        max([int(draft_id) for draft_id in draft_ids])
-                    )
-                else:
-                    last_update_id = draft_ids[0]
-                worksheets[i].content = content["drafts"][last_update_id][
-                    "query"
-                ]
+        elif entity["entityType"] == "query" and contents is not None:
+            worksheet = Worksheet(
+                entity["entityId"],
+                entity["info"]["name"],
+                entity["info"]["folderId"],
+                entity["info"]["folderName"],
+                content_type=entity["info"]["queryLanguage"],
+                modified=entity["info"].get("modified"),
+            )
+            worksheet.content = _latest_content(contents[worksheet._id])
+            catalog.add_worksheet(worksheet)
+
+    return catalog
+
+
+def _latest_content(content: dict) -> str:
+    """Get worksheet query, from its latest draft if not saved."""
+
+    if "query" in content.keys():
+        return content["query"]
+    if "drafts" in content.keys():
+        draft_ids = [draft_id for draft_id in content["drafts"].keys()]
+        if len(draft_ids) > 0:
+            if len(draft_ids) > 1:  # keys are timestamps
+                last_update_id = str(
+                    max([int(draft_id) for draft_id in draft_ids])
+                )
             else:
-                worksheets[i].content = ""
-        else:
-            worksheets[i].content = ""
+                last_update_id = draft_ids[0]
+            return content["drafts"][last_update_id]["query"]
+    return ""
 
+
+def iter_worksheets(
+    auth_context: AuthenticationContext,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    only_folder: Optional[str] = None,
+    index: Optional[EntityIndex] = None,
+) -> Iterator[Worksheet]:
+    """
+    Iterate over worksheets available for authenticated user,
+    as entities list pages arrive. Only the current page is held.
+
+    :param auth_context: Authentication info for Snowsight
+    :param page_size: number of entities requested per call
+    :param only_folder: to get only worksheets in that folder
+    :param index: index to add every listed folder and worksheet to,
+        whatever only_folder is
+
+    :returns: iterator of worksheets
+    """
+
+    for page in iter_entity_pages(auth_context, page_size=page_size):
+        if index is not None:
+            for folder in page.folders:
+                index.add_folder(folder)
+            for ws in page.worksheets:
+                index.add_worksheet(worksheet_entry(ws))
+        for ws in page.worksheets:
+            if only_folder is None or ws.folder_name == only_folder:
+                yield ws
+
+
+def get_worksheets(
+    auth_context: AuthenticationContext,
+    store_to_cache: Optional[bool] = False,
+    only_folder: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> List[Worksheet]:
+    """
+    Get list of worksheets available for authenticated user, with their
+    content. The listing also refreshes the cached entity index, for
+    later uploads.
+
+    :param auth_context: Authentication info for Snowsight
+    :param store_to_cache: (flag) save worksheets to cache
+    :param only_folder: to get only worksheets in that folder
+    :param page_size: number of entities requested per call
+
+    :returns: list of worksheets
+    """
+
+    index = EntityIndex()
+    worksheets = list(
+        iter_worksheets(
+            auth_context,
+            page_size=page_size,
+            only_folder=only_folder,
+            index=index,
+        )
+    )
     if store_to_cache:
         save_worksheets_to_cache(worksheets)
 
+    _INDEX_CACHE[_index_key(auth_context)] = index
     return worksheets
 
 
+def worksheet_summary(ws: Worksheet) -> Worksheet:
+    """
+    Copy of a worksheet with only a preview of its content,
+    enough to render it.
+    """
+
+    return Worksheet(
+        ws._id,
+        ws.name,
+        ws.folder_id,
+        ws.folder_name,
+        _content_preview(ws.content),
+        ws.content_type,
+        ws.modified,
+    )
+
+
+def _content_preview(content, length: int = PREVIEW_LENGTH) -> str:
+    """First line of a worksheet content, truncated to length."""
+
+    if isinstance(content, bytes):
+        content = content[: 4 * length].decode("utf-8", "replace")
+    lines = content.strip().splitlines()
+    first_line = lines[0] if lines else ""
+    if len(first_line) > length or len(lines) > 1:
+        first_line = first_line[: length - 3] + "..."
+    return first_line
+
+
+def _render_table(
+    rows: Sequence[Sequence[str]], columns: Sequence[str]
+) -> Iterator[str]:
+    """Lines of a plain text table, columns as wide as their values."""
+
+    widths = [
+        max(len(str(value)) for value in values)
+        for values in zip(columns, *rows)
+    ]
+    for values in (columns, *rows):
+        yield "  ".join(
+            str(value).ljust(width) for value, width in zip(values, widths)
+        ).rstrip()
+
+
+def render_worksheets(
+    worksheets: Iterable[Worksheet], n: int = 10, output_format="table"
+) -> Iterator[str]:
+    """
+    Render worksheets as lines of text, one worksheet at a time.
+
+    :param worksheets: worksheets to render
+    :param n: maximum number of worksheets in a table (from head)
+    :param output_format: table (first worksheets, content previewed),
+        json (all worksheets without content) or ids (all worksheet ids)
+
+    :returns: rendered lines
+    """
+
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unknown output format {output_format}, "
+            f"supported ones are {', '.join(OUTPUT_FORMATS)}"
+        )
+
+    if output_format == "ids":
+        for ws in worksheets:
+            yield ws._id
+
+    elif output_format == "json":
+        yield "["
+        separator = ""
+        for ws in worksheets:
+            entry = ws.to_dict()
+            del entry["content"]
+            entry["modified"] = ws.modified
+            yield separator + json.dumps(entry)
+            separator = ","
+        yield "]"
+
+    else:
+        worksheets = iter(worksheets)
+        head = list(itertools.islice(worksheets, n))
+        if not head:
+            yield "No worksheet"
+            return
+        yield from _render_table(
+            [
+                (
+                    ws._id,
+                    ws.name,
+                    ws.folder_name or "",
+                    ws.content_type,
+                    _content_preview(ws.content),
+                )
+                for ws in head
+            ],
+            ("_id", "name", "folder_name", "content_type", "content"),
+        )
+        n_others = sum(1 for _ in worksheets)
+        if n_others:
+            yield f"... and {n_others} more"
+
+
 def print_worksheets(
-    worksheets: List[Worksheet], n=10, logger: Callable = print
+    worksheets: Iterable[Worksheet],
+    n=10,
+    logger: Callable = print,
+    output_format: str = "table",
 ):
     """
-    Log worksheets as a dataframe.
+    Log worksheets, see render_worksheets for formats.
 
     :param worksheets: worksheets to log
-    :param n: maximum number of worksheets to print (from head)
+    :param n: maximum number of worksheets in a table (from head)
     :param logger: logging function e.g. print
+    :param output_format: table, json or ids
     """
-    worksheets_df = pd.DataFrame([ws.to_dict() for ws in worksheets])
-    if worksheets_df.empty:
-        logger("No worksheet")
-    else:
-        logger(worksheets_df.head(n))
+
+    for line in render_worksheets(worksheets, n, output_format):
+        logger(line)
 
 
 def write_worksheet(
@@ -140,22 +510,18 @@ def write_worksheet(
 
     req_body = parse.urlencode(request_json_template)
 
-    sf_context_name = auth_context.username
-    snowflake_context = f"{sf_context_name}::{auth_context.account_url}"
-    res = requests.post(
+    res = get_client(auth_context).post(
         f"{auth_context.app_server_url}/v0/queries",
         data=req_body,
         headers={
             "Accept": "application/json",
             "Content-Type": "application/x-www-form-urlencoded",
-            "X-Snowflake-Context": snowflake_context,
-            "Referer": auth_context.main_app_url,
             "X-CSRF-Token": auth_context.csrf,
             "X-Snowflake-Role": "ACCOUNTADMIN",
-            "X-Snowflake-Page-Source": "worksheet"
+            "X-Snowflake-Page-Source": "worksheet",
         },
         cookies=auth_context.cookies,
-        timeout=90,
+        idempotent=True,
     )
 
     if res.status_code != 200:
@@ -170,6 +536,10 @@ def write_worksheet(
             error_type,
         )
 
+    index = _INDEX_CACHE.get(_index_key(auth_context))
+    if index is not None:
+        index.update_digest(worksheet._id, worksheet_digest(worksheet))
+
 
 def create_worksheet(
     auth_context: AuthenticationContext,
@@ -192,20 +562,14 @@ def create_worksheet(
 
     req_body = parse.urlencode(request_json_template)
 
-    sf_context_name = auth_context.username
-    snowflake_context = f"{sf_context_name}::{auth_context.account_url}"
-
-    res = requests.post(
+    res = get_client(auth_context).post(
         f"{auth_context.app_server_url}/v0/queries",
         data=req_body,
         headers={
             "Accept": "application/json",
             "Content-Type": "application/x-www-form-urlencoded",
-            "X-Snowflake-Context": snowflake_context,
-            "Referer": auth_context.main_app_url,
         },
         cookies=auth_context.snowsight_token,
-        timeout=90,
     )
 
     if res.status_code != 200:
@@ -214,6 +578,22 @@ def create_worksheet(
             f"\t Reason is {res.text}"
         )
     response_data = json.loads(res.text)
+
+    index = _INDEX_CACHE.get(_index_key(auth_context))
+    if index is not None:
+        folder = index.folders_by_id.get(folder_id)
+        index.add_worksheet(
+            worksheet_entry(
+                Worksheet(
+                    response_data["pid"],
+                    worksheet_name,
+                    folder_id,
+                    folder.name if folder else None,
+                    content="",
+                )
+            )
+        )
+
     return response_data["pid"]
 
 
@@ -222,55 +602,18 @@ def get_folders(auth_context: AuthenticationContext) -> List[Folder]:
     Get list of folders on authenticated user workspace
     """
 
-    optionsparams = (
-        '{"sort":{"col":"viewed","dir":"desc"},"limit":500,"owner":null,'
-        '"types":["query", "folder"],"showNeverViewed":"if-invited"}'
-    )
-
-    request_json_template = {
-        "options": optionsparams,
-        "location": "worksheets",
-    }
-    req_body = parse.urlencode(request_json_template)
-
-    sf_context_name = auth_context.username
-    snowflake_context = f"{sf_context_name}::{auth_context.account_url}"
-
-    res = requests.post(
-        f"{auth_context.app_server_url}/v0/organizations/"
-        f"{auth_context.organization_id}/entities/list",
-        data=req_body,
-        headers={
-            "Accept": "application/json",
-            "Content-Type": "application/x-www-form-urlencoded",
-            "X-Snowflake-Context": snowflake_context,
-            "Referer": auth_context.main_app_url,
-        },
-        cookies=auth_context.snowsight_token,
-        timeout=90,
-    )
-
-    if res.status_code != 200:
-        raise WorksheetError(
-            "Failed to get folder list\n" f"\t Reason is {res.text}"
-        )
-    res_data = json.loads(res.text)
-    entities = res_data["entities"]
-
-    folders = []
-    for entity in entities:
-        if entity["entityType"] == "folder":
-            current_folder = Folder(
-                entity["entityId"],
-                entity["info"]["name"],
-            )
-            folders.append(current_folder)
-    return folders
+    return get_entity_index(auth_context, refresh=True).folders
 
 
 def print_folders(folders: List[Folder], n=10):
-    folders_df = pd.DataFrame([f.to_dict() for f in folders])
-    print(folders_df.head(n))
+    if not folders:
+        print("No folder")
+        return
+    for line in _render_table(
+        [(f._id, f.name, len(f.worksheets)) for f in folders[:n]],
+        ("_id", "name", "worksheets"),
+    ):
+        print(line)
 
 
 def create_folder(
@@ -290,20 +633,14 @@ def create_folder(
 
     req_body = parse.urlencode(request_json_template)
 
-    sf_context_name = auth_context.username
-    snowflake_context = f"{sf_context_name}::{auth_context.account_url}"
-
-    res = requests.post(
+    res = get_client(auth_context).post(
         f"{auth_context.app_server_url}/v0/folders",
         data=req_body,
         headers={
             "Accept": "*/*",
             "Content-Type": "application/x-www-form-urlencoded",
-            "X-Snowflake-Context": snowflake_context,
-            "Referer": auth_context.main_app_url,
         },
         cookies=auth_context.snowsight_token,
-        timeout=90,
     )
 
     if res.status_code != 200:
@@ -312,76 +649,206 @@ def create_folder(
             f"\t Reason is {res.text}"
         )
     response_data = json.loads(res.text)
+
+    index = _INDEX_CACHE.get(_index_key(auth_context))
+    if index is not None:
+        index.add_folder(
+            Folder(response_data["createdFolderId"], folder_name)
+        )
+
     return response_data["createdFolderId"]
 
 
 def upload_to_snowsight(
-    auth_context: AuthenticationContext, worksheets: List[Worksheet]
+    auth_context: AuthenticationContext,
+    worksheets: List[Worksheet],
+    jobs: int = 1,
+    by_id: bool = False,
 ) -> dict[str, List[dict]]:
     """
     Upload worksheets to Snowsight user workspace
     keeping folder architecture.
 
+    Missing folders are created first, once each. Worksheets are then
+    created and written by a pool of at most `jobs` workers, whose
+    concurrency is halved while Snowsight throttles. A failed folder or
+    worksheet creation is reported for its worksheets only, other
+    uploads go on.
+
     :param auth_context: Authentication info for Snowsight
     :param worksheets: list of worksheets to upload
+    :param jobs: maximum number of concurrent Snowsight calls
+    :param by_id: match Snowsight worksheets by id instead of name,
+        worksheets whose id is unknown to Snowsight are created
 
-    :returns: upload report with {'completed': list, 'errors': list}
+    :returns: upload report with {'completed': list, 'errors': list},
+        each entry with its worksheet name, _id, retries and retry_wait,
+        completed ones with the snowsight_id and folder_id written to
     """
 
     upload_report = {"completed": [], "errors": []}
+    jobs = max(1, jobs)
 
-    ss_folders = get_folders(auth_context)
-    ss_folders = {folder.name: folder for folder in ss_folders}
+    client = get_client(auth_context)
+    if client.pool_size < jobs:
+        client.set_pool_size(jobs)
 
-    ss_worksheets = get_worksheets(auth_context)
-    ss_worksheets = {ws.name: ws for ws in ss_worksheets}
+    index = get_entity_index(auth_context)
+    ss_folders = dict(index.folders_by_name)
+    ss_worksheets = dict(
+        index.worksheets_by_id if by_id else index.worksheets_by_name
+    )
 
     print(
         " ## Writing local worksheet to SnowSight"
         f" for user {auth_context.username} ##"
     )
-    for ws in worksheets:
-        # folder management
-        if ws.folder_name:
-            if ws.folder_name in ss_folders.keys():
-                folder_id = ss_folders[ws.folder_name]._id
-            else:
-                print(f"creating folder {ws.folder_name}")
-                folder_id = create_folder(auth_context, ws.folder_name)
-                new_folder = Folder(
-                    folder_id,
-                    ws.folder_name,
-                )
-                ss_folders[ws.folder_name] = new_folder
-        else:
-            folder_id = None
-
-        # worksheet management
-        if ws.name not in ss_worksheets.keys():
-            print(f"creating worksheet {ws.name}")
-            worksheet_id = create_worksheet(auth_context, ws.name, folder_id)
-            update_content = True
-        else:
-            worksheet_id = ss_worksheets[ws.name]._id
-            update_content = ws.content != ss_worksheets[ws.name].content
-
-        # content management
-        if ws.content and update_content:
-            print(f"updating worksheet {ws.name}")
-            err = write_worksheet(
-                auth_context,
-                Worksheet(
-                    worksheet_id,
-                    ws.name,
-                    folder_id,
-                    ws.folder_name,
-                    ws.content,
+    missing_folders = list(
+        dict.fromkeys(
+            ws.folder_name
+            for ws in worksheets
+            if ws.folder_name and ws.folder_name not in ss_folders
+        )
+    )
+
+    client.limiter = AdaptiveLimiter(max_limit=jobs)
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            # folder management
+            folder_ids = executor.map(
+                lambda folder_name: _create_folder_logged(
+                    auth_context, folder_name
                 ),
+                missing_folders,
             )
-            if err is not None:
-                upload_report["errors"].append({"name": ws.name, "error": err})
-            else:
-                upload_report["completed"].append({"name": ws.name})
+            folder_errors = {}
+            for folder_name, folder_id in zip(missing_folders, folder_ids):
+                if isinstance(folder_id, WorksheetError):
+                    folder_errors[folder_name] = folder_id
+                else:
+                    ss_folders[folder_name] = Folder(folder_id, folder_name)
+            for ws in worksheets:
+                if ws.folder_name in folder_errors:
+                    upload_report["errors"].append(
+                        {
+                            "name": ws.name,
+                            "_id": ws._id,
+                            "error": folder_errors[ws.folder_name],
+                        }
+                    )
+
+            # worksheet and content management
+            to_upload = [
+                ws for ws in worksheets if ws.folder_name not in folder_errors
+            ]
+            results = executor.map(
+                lambda ws: _upload_worksheet(
+                    auth_context,
+                    ws,
+                    ss_folders[ws.folder_name]._id if ws.folder_name else None,
+                    ss_worksheets.get(ws._id if by_id else ws.name),
+                ),
+                to_upload,
+            )
+            for result in results:
+                if result is not None:
+                    status, entry = result
+                    upload_report[status].append(entry)
+    finally:
+        client.limiter = None
 
     print(" ## SnowSight updated ##")
     return upload_report
+
+
+def _create_folder_logged(
+    auth_context: AuthenticationContext, folder_name: str
+) -> Union[str, WorksheetError]:
+    """
+    Create a folder, returning its id or the error it failed with.
+    """
+
+    print(f"creating folder {folder_name}")
+    try:
+        return create_folder(auth_context, folder_name)
+    except (WorksheetError, requests.RequestException) as exc:
+        return _as_worksheet_error(exc)
+
+
+def _as_worksheet_error(exc: Exception) -> WorksheetError:
+    if isinstance(exc, WorksheetError):
+        return exc
+    return WorksheetError(f"Snowsight call failed\n\t Reason is {exc}")
+
+
+def _upload_worksheet(
+    auth_context: AuthenticationContext,
+    ws: Worksheet,
+    folder_id: Optional[str],
+    ss_worksheet: Optional[WorksheetEntry],
+) -> Optional[Tuple[str, dict]]:
+    """
+    Create worksheet on Snowsight if necessary and write its content.
+
+    :returns: (report key, report entry) or None if nothing was written
+    """
+
+    with get_client(auth_context).track_retries() as retry_stats:
+        try:
+            result = _create_and_write_worksheet(
+                auth_context, ws, folder_id, ss_worksheet
+            )
+        except (WorksheetError, requests.RequestException) as exc:
+            result = "errors", {
+                "name": ws.name,
+                "_id": ws._id,
+                "error": _as_worksheet_error(exc),
+            }
+    if result is None:
+        return None
+
+    status, entry = result
+    entry["retries"] = retry_stats.retries
+    entry["retry_wait"] = round(retry_stats.wait_time, 3)
+    return status, entry
+
+
+def _create_and_write_worksheet(
+    auth_context: AuthenticationContext,
+    ws: Worksheet,
+    folder_id: Optional[str],
+    ss_worksheet: Optional[WorksheetEntry],
+) -> Optional[Tuple[str, dict]]:
+    entry = {"name": ws.name, "_id": ws._id}
+    if ss_worksheet is None:
+        print(f"creating worksheet {ws.name}")
+        worksheet_id = create_worksheet(auth_context, ws.name, folder_id)
+        update_content = True
+    else:
+        worksheet_id = ss_worksheet._id
+        update_content = worksheet_digest(ws) != ss_worksheet.digest
+
+    if not (ws.content and update_content):
+        if ss_worksheet is None:
+            # created empty
+            return "completed", dict(
+                entry, snowsight_id=worksheet_id, folder_id=folder_id
+            )
+        return None
+
+    print(f"updating worksheet {ws.name}")
+    err = write_worksheet(
+        auth_context,
+        Worksheet(
+            worksheet_id,
+            ws.name,
+            folder_id,
+            ws.folder_name,
+            ws.content,
+        ),
+    )
+    if err is not None:
+        return "errors", dict(entry, error=err)
+    return "completed", dict(
+        entry, snowsight_id=worksheet_id, folder_id=folder_id
+    )
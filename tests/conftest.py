@@ -56,7 +56,7 @@ def setup_and_teardown():
 
 
 @pytest.fixture(autouse=True, name="test_config")
-def mock_config(monkeypatch):
+def mock_config(monkeypatch, tmp_path):
     import sf_git.config as config
 
     global_config = Config(
@@ -65,6 +65,7 @@ def mock_config(monkeypatch):
         sf_account_id=TEST_CONF["SF_ACCOUNT_ID"],
         sf_login_name=TEST_CONF["SF_LOGIN_NAME"],
         sf_pwd=TEST_CONF["SF_PWD"],
+        cache_dir=tmp_path / "cache",
     )
     monkeypatch.setattr(config, "GLOBAL_CONFIG", global_config)
 
@@ -0,0 +1,226 @@
+import json
+import os
+import re
+import stat
+import time
+from urllib import parse
+
+import pytest
+import requests
+import requests_mock
+
+import sf_git.auth_cache as auth_cache
+import sf_git.config as config
+import sf_git.models
+import sf_git.rest_utils as rest_utils
+import sf_git.snowsight_auth as snowsight_auth
+from sf_git.models import AuthenticationError
+
+
+def saved_context(auth_context):
+    context = sf_git.models.AuthenticationContext(
+        **{
+            k: v
+            for k, v in vars(auth_context).items()
+            if k not in ("client", "cookies")
+        }
+    )
+    context.cookies = requests.cookies.RequestsCookieJar()
+    context.cookies.set("user-token", "secret", domain="test_snowflake.com")
+    return context
+
+
+def test_session_round_trip(auth_context):
+    context = saved_context(auth_context)
+
+    auth_cache.save_session(
+        context.account_name, context.login_name, context
+    )
+    loaded = auth_cache.load_session(context.account_name, context.login_name)
+
+    assert loaded is not None
+    assert loaded.snowsight_token == context.snowsight_token
+    assert loaded.organization_id == context.organization_id
+    assert loaded.app_server_url == context.app_server_url
+    assert loaded.cookies.get("user-token") == "secret"
+    assert loaded.client is None
+
+
+def test_session_file_is_private(auth_context):
+    context = saved_context(auth_context)
+
+    auth_cache.save_session(
+        context.account_name, context.login_name, context
+    )
+
+    session_files = list(
+        (config.GLOBAL_CONFIG.cache_dir / "sessions").iterdir()
+    )
+    assert len(session_files) == 1
+    if os.name == "posix":
+        assert stat.S_IMODE(session_files[0].stat().st_mode) == 0o600
+
+
+def test_expired_session_is_not_loaded(auth_context, monkeypatch):
+    context = saved_context(auth_context)
+    auth_cache.save_session(
+        context.account_name, context.login_name, context
+    )
+
+    expired_time = time.time() + config.GLOBAL_CONFIG.session_ttl + 1
+    monkeypatch.setattr(auth_cache.time, "time", lambda: expired_time)
+
+    assert (
+        auth_cache.load_session(context.account_name, context.login_name)
+        is None
+    )
+
+
+def test_unknown_session_is_not_loaded():
+    assert auth_cache.load_session("unknown", "unknown") is None
+
+
+def test_delete_session(auth_context):
+    context = saved_context(auth_context)
+    auth_cache.save_session(
+        context.account_name, context.login_name, context
+    )
+
+    auth_cache.delete_session(context.account_name, context.login_name)
+
+    assert (
+        auth_cache.load_session(context.account_name, context.login_name)
+        is None
+    )
+
+
+APP_ENDPOINT = {
+    "valid": True,
+    "account": "tofill",
+    "url": "https://tofill.snowflakecomputing.com",
+    "appServerUrl": "https://apps-api.c1.westeurope.azure.app.snowflake.com",
+    "region": "west-europe.azure",
+}
+
+
+def test_endpoint_round_trip():
+    auth_cache.save_endpoint("tofill", APP_ENDPOINT)
+
+    assert auth_cache.load_endpoint("tofill") == APP_ENDPOINT
+    assert auth_cache.load_endpoint("other") is None
+
+
+def test_expired_endpoint_is_not_loaded(monkeypatch):
+    auth_cache.save_endpoint("tofill", APP_ENDPOINT)
+
+    expired_time = time.time() + config.GLOBAL_CONFIG.endpoint_ttl + 1
+    monkeypatch.setattr(auth_cache.time, "time", lambda: expired_time)
+
+    assert auth_cache.load_endpoint("tofill") is None
+
+
+def test_account_endpoint_is_resolved_once():
+    with requests_mock.Mocker() as m:
+        m.post(
+            re.compile("validate-snowflake-url"),
+            text=json.dumps(APP_ENDPOINT),
+        )
+
+        first = snowsight_auth.get_account_app_endpoint("tofill")
+        second = snowsight_auth.get_account_app_endpoint("tofill")
+        refreshed = snowsight_auth.get_account_app_endpoint(
+            "tofill", refresh=True
+        )
+
+    assert first == second == refreshed == APP_ENDPOINT
+    assert m.call_count == 2
+
+
+def test_invalid_account_endpoint_is_not_cached():
+    with requests_mock.Mocker() as m:
+        m.post(
+            re.compile("validate-snowflake-url"),
+            text=json.dumps({"valid": False}),
+        )
+
+        snowsight_auth.get_account_app_endpoint("unknown")
+
+    assert auth_cache.load_endpoint("unknown") is None
+
+
+STALE_APP_SERVER_URL = "https://apps-api.stale.app.snowflake.com"
+OAUTH_REDIRECT_URL = (
+    f"{APP_ENDPOINT['url']}/oauth/authorize?"
+    + parse.urlencode(
+        {
+            "state": json.dumps({"oauthNonce": "nonce"}),
+            "code_challenge": "challenge",
+            "code_challenge_method": "S256",
+            "redirect_uri": "https://apps-api/complete-oauth",
+            "client_id": "client",
+        }
+    )
+)
+
+
+def mock_authentication(m, app_server_url):
+    m.get(
+        re.compile("/bootstrap"),
+        cookies={"csrf-test": "csrf"},
+        text="",
+    )
+    m.get(
+        re.compile(f"{re.escape(app_server_url)}/start-oauth"),
+        status_code=302,
+        headers={"Location": OAUTH_REDIRECT_URL},
+    )
+    m.get(re.compile("/oauth/authorize"), text="")
+    m.post(
+        re.compile("/session/v1/login-request"),
+        text=json.dumps({"success": False}),
+    )
+    return m.post(
+        re.compile("validate-snowflake-url"),
+        text=json.dumps(APP_ENDPOINT),
+    )
+
+
+def test_stale_cached_endpoint_is_refreshed(monkeypatch):
+    monkeypatch.setattr(rest_utils.time, "sleep", lambda seconds: None)
+    auth_cache.save_endpoint(
+        "tofill", dict(APP_ENDPOINT, appServerUrl=STALE_APP_SERVER_URL)
+    )
+
+    with requests_mock.Mocker() as m:
+        validation = mock_authentication(m, APP_ENDPOINT["appServerUrl"])
+        m.get(
+            re.compile(f"{re.escape(STALE_APP_SERVER_URL)}/start-oauth"),
+            exc=requests.exceptions.ConnectionError,
+        )
+
+        # authentication goes on to credentials with refreshed endpoint
+        with pytest.raises(AuthenticationError, match="Invalid credentials"):
+            snowsight_auth.authenticate_to_snowsight(
+                "tofill", "user", "password"
+            )
+
+    assert validation.call_count == 1
+    assert auth_cache.load_endpoint("tofill") == APP_ENDPOINT
+
+
+def test_resolved_endpoint_is_not_resolved_again(monkeypatch):
+    monkeypatch.setattr(rest_utils.time, "sleep", lambda seconds: None)
+
+    with requests_mock.Mocker() as m:
+        validation = mock_authentication(m, APP_ENDPOINT["appServerUrl"])
+        m.get(
+            re.compile(f"{re.escape(APP_ENDPOINT['appServerUrl'])}"),
+            exc=requests.exceptions.ConnectionError,
+        )
+
+        with pytest.raises(AuthenticationError, match="No client id"):
+            snowsight_auth.authenticate_to_snowsight(
+                "tofill", "user", "password"
+            )
+
+    assert validation.call_count == 1
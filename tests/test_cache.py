@@ -1,6 +1,13 @@
+import io
+import json
+import os
+
 import pytest
+from git import Actor, Repo
+from gitdb import IStream
 
 import sf_git.cache as cache
+import sf_git.git_utils as git_utils
 from sf_git.models import SnowflakeGitError, Worksheet
 import sf_git.config as config
 
@@ -162,3 +169,197 @@ def test_load_only_tracked_files(
 
     assert isinstance(worksheets, list)
     assert len(worksheets) == 0
+
+
+def test_save_ws_to_cache_skips_unchanged_files():
+    worksheet = Worksheet(
+        _id="worksheet_id_05",
+        name="test_worksheet_05",
+        folder_id="folder_id_02",
+        folder_name="new_folder_for_test",
+        content_type="sql",
+        content="SELECT 1;\nSELECT 2;",
+    )
+    content_path, metadata_path = [
+        config.GLOBAL_CONFIG.worksheets_path / file_name
+        for file_name in cache.worksheet_to_files(worksheet)
+    ]
+
+    assert cache.save_worksheets_to_cache([worksheet]) == {
+        "created": 1, "written": 0, "unchanged": 0
+    }
+    saved_mtime = content_path.stat().st_mtime_ns
+    os.utime(content_path, ns=(saved_mtime - 10**9, saved_mtime - 10**9))
+
+    assert cache.save_worksheets_to_cache([worksheet]) == {
+        "created": 0, "written": 0, "unchanged": 1
+    }
+    assert content_path.stat().st_mtime_ns == saved_mtime - 10**9
+
+    worksheet.content = "SELECT 3;"
+    assert cache.save_worksheets_to_cache([worksheet]) == {
+        "created": 0, "written": 1, "unchanged": 0
+    }
+    with open(content_path, "r") as f:
+        assert f.read() == worksheet.content
+    assert metadata_path.is_file()
+
+
+def test_content_digest_matches_git():
+    # git hash-object of an empty file
+    assert cache.content_digest(b"") == (
+        "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+    )
+
+
+@pytest.fixture
+def same_name_repo(tmp_path, monkeypatch, test_config):
+    worksheets_path = tmp_path / "same_name_repo" / "data"
+    monkeypatch.setattr(test_config, "worksheets_path", worksheets_path)
+
+    cache.save_worksheets_to_cache(
+        Worksheet(
+            _id=f"worksheet_id_{folder}",
+            name="Daily report",
+            folder_id=f"folder_id_{folder}",
+            folder_name=f"Folder {folder}",
+            content_type="sql",
+            content=f"SELECT '{folder}';",
+        )
+        for folder in ("A", "B")
+    )
+    same_name_repo = Repo.init(worksheets_path.parent)
+    same_name_repo.index.add([str(worksheets_path)])
+    same_name_repo.index.commit(
+        "Same worksheet names",
+        author=Actor("An author", "author@example.com"),
+    )
+    return same_name_repo
+
+
+def test_load_same_name_ws_from_different_folders(same_name_repo):
+    worksheets = cache.load_worksheets_from_cache(same_name_repo)
+
+    assert {ws.folder_name: ws.content for ws in worksheets} == {
+        "Folder A": b"SELECT 'A';",
+        "Folder B": b"SELECT 'B';",
+    }
+
+
+def test_load_ws_from_folder_reads_only_its_blobs(repo, monkeypatch):
+    read_paths = []
+
+    def get_blobs_content(blobs, by_path=False):
+        read_paths.extend(b.path for b in blobs)
+        return git_utils.get_blobs_content(blobs, by_path=by_path)
+
+    monkeypatch.setattr(cache, "get_blobs_content", get_blobs_content)
+
+    worksheets = cache.load_worksheets_from_cache(
+        repo,
+        only_folder='Benchmarking Tutorials'
+    )
+
+    assert len(worksheets) == 4
+    assert len(read_paths) == 8
+    assert all("/Benchmarking_Tutorials/" in path for path in read_paths)
+
+
+def test_load_ws_from_tag_and_commit_sha(same_name_repo, test_config):
+    first_commit = same_name_repo.head.commit
+    same_name_repo.create_tag("last_week")
+    cache.save_worksheets_to_cache(
+        [Worksheet(
+            _id="worksheet_id_A",
+            name="Daily report",
+            folder_id="folder_id_A",
+            folder_name="Folder A",
+            content_type="sql",
+            content="SELECT 'A2';",
+        )]
+    )
+    same_name_repo.index.add([str(test_config.worksheets_path)])
+    same_name_repo.index.commit(
+        "Update", author=Actor("An author", "author@example.com")
+    )
+
+    for revision in ("last_week", first_commit.hexsha, "HEAD~1"):
+        worksheets = cache.load_worksheets_from_cache(
+            same_name_repo, branch_name=revision, only_folder="Folder A"
+        )
+        assert [ws.content for ws in worksheets] == [b"SELECT 'A';"]
+
+    worksheets = cache.load_worksheets_from_cache(
+        same_name_repo, only_folder="Folder A"
+    )
+    assert [ws.content for ws in worksheets] == [b"SELECT 'A2';"]
+
+
+def test_load_same_tree_twice_skips_parsing(same_name_repo, monkeypatch):
+    first_load = cache.load_worksheets_from_cache(same_name_repo)
+    tree_sha = (same_name_repo.head.commit.tree / "data").hexsha
+    assert cache._parsed_tree_file(tree_sha).is_file()
+
+    def get_blobs_content(blobs, by_path=False):
+        raise AssertionError("blobs should not be parsed")
+
+    monkeypatch.setattr(cache, "get_blobs_content", get_blobs_content)
+    second_load = cache.load_worksheets_from_cache(same_name_repo)
+
+    assert [ws.to_dict() for ws in second_load] == [
+        ws.to_dict() for ws in first_load
+    ]
+
+
+def store_blob(repo, content):
+    return repo.odb.store(
+        IStream("blob", len(content), io.BytesIO(content))
+    ).hexsha.decode()
+
+
+def test_parsed_tree_store_keeps_no_content(tmp_path):
+    store_repo = Repo.init(tmp_path / "store")
+    content_sha = store_blob(store_repo, b"\xff\xfe;")
+    worksheet = Worksheet(
+        "worksheet_id_06", "Bytes", "folder_id_03", "Folder", b"\xff\xfe;"
+    )
+    cache._save_parsed_tree("0" * 40, [worksheet])
+
+    with open(cache._parsed_tree_file("0" * 40), encoding="utf-8") as f:
+        entries = json.load(f)["worksheets"]
+    assert "content" not in entries[0]
+    assert entries[0]["content_sha"] == content_sha
+    if os.name == "posix":
+        mode = cache._parsed_tree_file("0" * 40).parent.stat().st_mode
+        assert mode & 0o777 == 0o700
+
+    loaded = cache._load_parsed_tree(store_repo, "0" * 40)
+    assert loaded[0].to_dict() == worksheet.to_dict()
+    assert cache._load_parsed_tree(store_repo, "1" * 40) is None
+
+
+def test_parsed_tree_store_misses_unknown_blobs(tmp_path):
+    store_repo = Repo.init(tmp_path / "store")
+    worksheet = Worksheet("id", "name", "folder_id", "folder", b"select 1;")
+    cache._save_parsed_tree("0" * 40, [worksheet])
+
+    assert cache._load_parsed_tree(store_repo, "0" * 40) is None
+
+
+def test_parsed_tree_store_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_CACHED_TREES", 2)
+    store_repo = Repo.init(tmp_path / "store")
+    store_blob(store_repo, b"select 1;")
+    worksheet = Worksheet("id", "name", "folder_id", "folder", b"select 1;")
+    hot_sha, cold_sha, new_sha = "0" * 40, "1" * 40, "2" * 40
+
+    cache._save_parsed_tree(hot_sha, [worksheet])
+    cache._save_parsed_tree(cold_sha, [worksheet])
+    os.utime(cache._parsed_tree_file(hot_sha), ns=(1, 1))
+    os.utime(cache._parsed_tree_file(cold_sha), ns=(2, 2))
+    assert cache._load_parsed_tree(store_repo, hot_sha) is not None
+    cache._save_parsed_tree(new_sha, [worksheet])
+
+    assert cache._parsed_tree_file(hot_sha).is_file()
+    assert not cache._parsed_tree_file(cold_sha).is_file()
+    assert cache._parsed_tree_file(new_sha).is_file()
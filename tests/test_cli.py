@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+import sf_git.config as config
+from sf_git.cli import cli
+
+PACKAGE_ROOT = Path(__file__).parent.parent
+
+# budget of cumulative import time of sf_git.cli, in milliseconds,
+# generous by default, tightened with e.g. SF_GIT_IMPORT_TIME_BUDGET_MS=100
+IMPORT_TIME_BUDGET_MS = 300
+IMPORT_TIME_BUDGET_ENV_VAR = "SF_GIT_IMPORT_TIME_BUDGET_MS"
+HEAVY_MODULES = ("git", "requests", "urllib3", "pandas")
+
+
+def run_python(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PACKAGE_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_cli_import_time_within_budget():
+    budget_ms = min(
+        IMPORT_TIME_BUDGET_MS,
+        float(os.environ.get(IMPORT_TIME_BUDGET_ENV_VAR, "inf")),
+    )
+    budget_us = budget_ms * 1000
+    import_times = []
+    # best of a few runs, first ones may pay for a cold disk cache
+    for _ in range(3):
+        stderr = run_python("import sf_git.cli").stderr
+        cli_line = next(
+            line for line in stderr.splitlines()
+            if line.endswith("| sf_git.cli")
+        )
+        import_times.append(int(cli_line.split("|")[1]))
+
+    assert min(import_times) < budget_us
+
+
+@pytest.mark.parametrize("args", [
+    ["--help"],
+    ["push", "--help"],
+    ["fetch", "--help"],
+    ["config", "--get", "SF_LOGIN_NAME"],
+])
+def test_cli_does_not_import_heavy_modules(args):
+    code = (
+        "import sys\n"
+        "from sf_git.cli import cli\n"
+        "try:\n"
+        f"    cli({args!r})\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])\n"
+    )
+
+    stdout = run_python(code).stdout
+
+    assert stdout.splitlines()[-1] == "[]"
+
+
+@pytest.mark.parametrize("profile", ["unknown", "invalid/name"])
+def test_cli_rejects_unknown_profile(monkeypatch, profile):
+    monkeypatch.setitem(
+        config._FILE_VALUES,
+        config.DOTENV_PATH,
+        {"prod.SF_ACCOUNT_ID": "prod_account"},
+    )
+    monkeypatch.setattr(config, "_active_profile", None)
+
+    result = CliRunner().invoke(cli, ["--profile", profile, "diff"])
+
+    assert result.exit_code == 2
+    # click quotes the option depending on its version
+    assert "Invalid value for" in result.output
+    assert "--profile" in result.output
+
+
+@pytest.mark.parametrize("args", [
+    ["--plan", "plan.json", "--since", "HEAD~1"],
+    ["--plan", "plan.json", "--incremental"],
+    ["--plan", "plan.json", "--format", "json"],
+    ["--apply-plan", "plan.json", "--since", "HEAD~1"],
+    ["--apply-plan", "plan.json", "--incremental"],
+    ["--apply-plan", "plan.json", "--format", "ids"],
+    ["--apply-plan", "plan.json", "--jobs", "4"],
+    ["--apply-plan", "plan.json", "--only-folder", "Folder"],
+    ["--apply-plan", "plan.json", "--branch", "main"],
+])
+def test_push_rejects_options_unused_by_plans(monkeypatch, args):
+    import sf_git.commands
+
+    def procedure(**kwargs):
+        raise AssertionError("nothing should be planned or pushed")
+
+    monkeypatch.setattr(sf_git.commands, "plan_push_procedure", procedure)
+    monkeypatch.setattr(
+        sf_git.commands, "apply_push_plan_procedure", procedure
+    )
+
+    result = CliRunner().invoke(
+        cli, ["push", "-u", "user", "-a", "account", *args]
+    )
+
+    assert result.exit_code == 2
+    assert f"{args[2]} cannot be used with {args[0]}" in result.output
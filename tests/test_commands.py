@@ -1,14 +1,26 @@
 import json
+import re
 import shutil
 
 import dotenv
 import pytest
+import requests
 from click import UsageError
 from git.repo import Repo
 
+import sf_git.cache
 import sf_git.commands
-from sf_git.models import Worksheet
+import sf_git.config_commands
+import sf_git.remote_state
+from sf_git.models import (
+    EntityIndex,
+    Folder,
+    SnowflakeGitError,
+    Worksheet,
+    WorksheetError,
+)
 import sf_git.config as config
+from sf_git.worksheets_utils import worksheet_entry
 
 
 @pytest.fixture
@@ -28,14 +40,36 @@ def mock_authenticate_to_snowsight(auth_context, monkeypatch):
     )
 
 
+def index_of(worksheets, folders=()):
+    return EntityIndex(
+        [worksheet_entry(ws) for ws in worksheets], folders=folders
+    )
+
+
 @pytest.fixture
 def mock_sf_get_worksheets(worksheets, monkeypatch):
+    folders = [Folder("empty_id", "Empty folder")]
+
     def get_fake_worksheets(auth_context, store_to_cache, only_folder):
         return worksheets
 
+    def iter_fake_worksheets(auth_context, index=None, **kwargs):
+        if index is not None:
+            for folder in folders:
+                index.add_folder(folder)
+        return iter(worksheets)
+
     monkeypatch.setattr(
         sf_git.commands, "sf_get_worksheets", get_fake_worksheets
     )
+    monkeypatch.setattr(
+        sf_git.commands,
+        "sf_get_index",
+        lambda auth_context, refresh=False: index_of(worksheets, folders),
+    )
+    monkeypatch.setattr(
+        sf_git.commands, "sf_iter_worksheets", iter_fake_worksheets
+    )
 
 
 @pytest.fixture
@@ -50,7 +84,7 @@ def mock_load_worksheets_from_cache(worksheets, monkeypatch):
 
 @pytest.fixture
 def no_print(monkeypatch):
-    def do_nothing(worksheets, logger):
+    def do_nothing(worksheets, logger, output_format="table"):
         pass
 
     monkeypatch.setattr(sf_git.commands, "print_worksheets", do_nothing)
@@ -58,9 +92,9 @@ def no_print(monkeypatch):
 
 @pytest.fixture
 def no_upload(monkeypatch):
-    def successful_upload(auth_context, worksheets):
+    def successful_upload(auth_context, worksheets, jobs=1):
         return {
-            "completed": [worksheet.name for worksheet in worksheets],
+            "completed": [{"name": worksheet.name} for worksheet in worksheets],
             "errors": [],
         }
 
@@ -109,6 +143,30 @@ def test_fetch_worksheets_when_pwd_auth_with_pwd(
     assert len(worksheets) == 1
 
 
+def test_fetch_worksheets_prints_ids_alone(
+    mock_authenticate_to_snowsight,
+    mock_sf_get_worksheets,
+    worksheets,
+):
+    progress, output = [], []
+
+    sf_git.commands.fetch_worksheets_procedure(
+        username=config.GLOBAL_CONFIG.sf_login_name,
+        account_id=config.GLOBAL_CONFIG.sf_account_id,
+        auth_mode="PWD",
+        password=config.GLOBAL_CONFIG.sf_pwd,
+        store=False,
+        only_folder="",
+        use_session_cache=False,
+        output_format="ids",
+        output=output.append,
+        logger=progress.append,
+    )
+
+    assert output == [ws._id for ws in worksheets]
+    assert progress
+
+
 def test_fetch_worksheets_when_pwd_auth_without_pwd(
     mock_authenticate_to_snowsight,
     mock_sf_get_worksheets,
@@ -180,9 +238,11 @@ def test_get_config_repo_procedure_when_key_exists(
     monkeypatch,
 ):
     dotenv_config = dotenv.dotenv_values(fixture_dotenv_path)
-    monkeypatch.setattr(sf_git.commands, "DOTENV_PATH", fixture_dotenv_path)
+    monkeypatch.setattr(
+        sf_git.config_commands, "DOTENV_PATH", fixture_dotenv_path
+    )
 
-    value = sf_git.commands.get_config_repo_procedure(
+    value = sf_git.config_commands.get_config_repo_procedure(
         key, logger=lambda x: None
     )
 
@@ -193,10 +253,12 @@ def test_get_config_repo_procedure_when_key_doesnt_exists(
     fixture_dotenv_path,
     monkeypatch,
 ):
-    monkeypatch.setattr(sf_git.commands, "DOTENV_PATH", fixture_dotenv_path)
+    monkeypatch.setattr(
+        sf_git.config_commands, "DOTENV_PATH", fixture_dotenv_path
+    )
 
     with pytest.raises(UsageError):
-        sf_git.commands.get_config_repo_procedure(
+        sf_git.config_commands.get_config_repo_procedure(
             "NOT_EXISTING", logger=lambda x: None
         )
 
@@ -218,9 +280,11 @@ def test_set_config_repo_procedure_when_key_exists(
     monkeypatch,
 ):
     dotenv_config = dotenv.dotenv_values(fixture_dotenv_path)
-    monkeypatch.setattr(sf_git.commands, "DOTENV_PATH", fixture_dotenv_path)
+    monkeypatch.setattr(
+        sf_git.config_commands, "DOTENV_PATH", fixture_dotenv_path
+    )
 
-    updates = sf_git.commands.set_config_repo_procedure(**params)
+    updates = sf_git.config_commands.set_config_repo_procedure(**params)
 
     assert updates == expected
 
@@ -235,9 +299,11 @@ def test_set_config_procedure_when_valid_repo(
     params = {"git_repo": str(alternative_repo_path)}
     expected = {"SNOWFLAKE_VERSIONING_REPO": str(alternative_repo_path)}
 
-    monkeypatch.setattr(sf_git.commands, "DOTENV_PATH", fixture_dotenv_path)
+    monkeypatch.setattr(
+        sf_git.config_commands, "DOTENV_PATH", fixture_dotenv_path
+    )
 
-    updates = sf_git.commands.set_config_repo_procedure(**params)
+    updates = sf_git.config_commands.set_config_repo_procedure(**params)
 
     assert updates == expected
 
@@ -250,10 +316,12 @@ def test_set_config_procedure_when_invalid_repo(
 ):
     params = {"git_repo": str(testing_folder / "not_initialized")}
 
-    monkeypatch.setattr(sf_git.commands, "DOTENV_PATH", fixture_dotenv_path)
+    monkeypatch.setattr(
+        sf_git.config_commands, "DOTENV_PATH", fixture_dotenv_path
+    )
 
     with pytest.raises(UsageError):
-        sf_git.commands.set_config_repo_procedure(**params)
+        sf_git.config_commands.set_config_repo_procedure(**params)
 
 
 def test_set_config_repo_ws_path_when_invalid(
@@ -269,10 +337,12 @@ def test_set_config_repo_ws_path_when_invalid(
         "save_dir": str(testing_folder / "not_a_subdirectory"),
     }
 
-    monkeypatch.setattr(sf_git.commands, "DOTENV_PATH", fixture_dotenv_path)
+    monkeypatch.setattr(
+        sf_git.config_commands, "DOTENV_PATH", fixture_dotenv_path
+    )
 
     with pytest.raises(UsageError):
-        sf_git.commands.set_config_repo_procedure(**params)
+        sf_git.config_commands.set_config_repo_procedure(**params)
 
 
 def test_set_config_repo_ws_path_when_valid(
@@ -292,9 +362,11 @@ def test_set_config_repo_ws_path_when_valid(
         "WORKSHEETS_PATH": str(alternative_repo_path / "a_subdirectory"),
     }
 
-    monkeypatch.setattr(sf_git.commands, "DOTENV_PATH", fixture_dotenv_path)
+    monkeypatch.setattr(
+        sf_git.config_commands, "DOTENV_PATH", fixture_dotenv_path
+    )
 
-    updates = sf_git.commands.set_config_repo_procedure(**params)
+    updates = sf_git.config_commands.set_config_repo_procedure(**params)
 
     assert isinstance(updates, dict)
     assert updates == expected
@@ -310,9 +382,802 @@ def test_set_config_ws_path_when_valid(
     params = {"save_dir": str(repo_root_path / "a_subdirectory")}
     expected = {"WORKSHEETS_PATH": str(repo_root_path / "a_subdirectory")}
 
-    monkeypatch.setattr(sf_git.commands, "DOTENV_PATH", fixture_dotenv_path)
+    monkeypatch.setattr(
+        sf_git.config_commands, "DOTENV_PATH", fixture_dotenv_path
+    )
 
-    updates = sf_git.commands.set_config_repo_procedure(**params)
+    updates = sf_git.config_commands.set_config_repo_procedure(**params)
 
     assert isinstance(updates, dict)
     assert updates == expected
+
+
+def test_set_config_profile_in_one_write(tmp_path, monkeypatch):
+    dotenv_path = tmp_path / "sf_git.conf"
+    dotenv_path.write_text("SF_ACCOUNT_ID='default_account'\n")
+    monkeypatch.setattr(sf_git.config_commands, "DOTENV_PATH", dotenv_path)
+    writes = []
+    write_config = config.write_config
+
+    def count_writes(updates, profile=None, path=config.DOTENV_PATH):
+        writes.append(dict(updates))
+        return write_config(updates, profile=profile, path=path)
+
+    monkeypatch.setattr(config, "write_config", count_writes)
+
+    updates = sf_git.config_commands.set_config_repo_procedure(
+        account="prod_account",
+        username="prod_user",
+        password="secret",
+        logger=lambda x: None,
+        profile="prod",
+    )
+
+    assert len(writes) == 1
+    assert updates == {
+        "SF_ACCOUNT_ID": "prod_account",
+        "SF_LOGIN_NAME": "prod_user",
+        "SF_PWD": "******",
+    }
+    for profile, expected in [
+        (None, "default_account"),
+        ("prod", "prod_account"),
+    ]:
+        assert sf_git.config_commands.get_config_repo_procedure(
+            "SF_ACCOUNT_ID", logger=lambda x: None, profile=profile
+        ) == expected
+
+
+@pytest.fixture
+def count_authentications(auth_context, monkeypatch):
+    authentications = []
+
+    def get_fake_auth_context(account_id, username, password, auth_mode=None):
+        authentications.append(username)
+        return auth_context
+
+    monkeypatch.setattr(
+        sf_git.commands, "authenticate_to_snowsight", get_fake_auth_context
+    )
+    return authentications
+
+
+@pytest.mark.parametrize("session_valid, expected_authentications", [
+    (True, 1),
+    (False, 2),
+])
+def test_fetch_worksheets_reuses_cached_session(
+    session_valid,
+    expected_authentications,
+    count_authentications,
+    mock_sf_get_worksheets,
+    no_print,
+    monkeypatch,
+):
+    monkeypatch.setattr(
+        sf_git.commands, "is_session_valid", lambda ctx: session_valid
+    )
+
+    for _ in range(2):
+        sf_git.commands.fetch_worksheets_procedure(
+            username=config.GLOBAL_CONFIG.sf_login_name,
+            account_id=config.GLOBAL_CONFIG.sf_account_id,
+            auth_mode="PWD",
+            password=config.GLOBAL_CONFIG.sf_pwd,
+            store=False,
+            logger=lambda x: None,
+        )
+
+    assert len(count_authentications) == expected_authentications
+
+
+def test_fetch_worksheets_keeps_cached_session_on_network_error(
+    count_authentications,
+    mock_sf_get_worksheets,
+    no_print,
+    monkeypatch,
+):
+    def fetch():
+        sf_git.commands.fetch_worksheets_procedure(
+            username=config.GLOBAL_CONFIG.sf_login_name,
+            account_id=config.GLOBAL_CONFIG.sf_account_id,
+            auth_mode="PWD",
+            password=config.GLOBAL_CONFIG.sf_pwd,
+            store=False,
+            logger=lambda x: None,
+        )
+
+    def network_error(ctx):
+        raise requests.ConnectionError("Name or service not known")
+
+    monkeypatch.setattr(sf_git.commands, "is_session_valid", lambda ctx: True)
+    fetch()
+    monkeypatch.setattr(sf_git.commands, "is_session_valid", network_error)
+    with pytest.raises(requests.ConnectionError):
+        fetch()
+    monkeypatch.setattr(sf_git.commands, "is_session_valid", lambda ctx: True)
+    fetch()
+
+    assert len(count_authentications) == 1
+
+
+def test_fetch_worksheets_without_session_cache(
+    count_authentications,
+    mock_sf_get_worksheets,
+    no_print,
+    monkeypatch,
+):
+    monkeypatch.setattr(
+        sf_git.commands, "is_session_valid", lambda ctx: True
+    )
+
+    for _ in range(2):
+        sf_git.commands.fetch_worksheets_procedure(
+            username=config.GLOBAL_CONFIG.sf_login_name,
+            account_id=config.GLOBAL_CONFIG.sf_account_id,
+            auth_mode="PWD",
+            password=config.GLOBAL_CONFIG.sf_pwd,
+            store=False,
+            use_session_cache=False,
+            logger=lambda x: None,
+        )
+
+    assert len(count_authentications) == 2
+
+
+@pytest.fixture
+def bare_repo(tmp_path, monkeypatch, test_config):
+    bare_repo_path = tmp_path / "backup.git"
+    bare_repo = Repo.init(bare_repo_path, bare=True)
+    monkeypatch.setattr(test_config, "repo_path", bare_repo_path)
+    monkeypatch.setattr(
+        test_config, "worksheets_path", bare_repo_path / "worksheets"
+    )
+    return bare_repo
+
+
+def test_fetch_worksheets_commit_direct_to_bare_repo(
+    bare_repo,
+    worksheets,
+    mock_authenticate_to_snowsight,
+    mock_sf_get_worksheets,
+    no_print,
+):
+    fetch_args = dict(
+        username=config.GLOBAL_CONFIG.sf_login_name,
+        account_id=config.GLOBAL_CONFIG.sf_account_id,
+        auth_mode="PWD",
+        password=config.GLOBAL_CONFIG.sf_pwd,
+        commit_direct=True,
+        branch="backup",
+        use_session_cache=False,
+        logger=lambda x: None,
+    )
+
+    sf_git.commands.fetch_worksheets_procedure(**fetch_args)
+    first_commit = bare_repo.heads["backup"].commit
+    sf_git.commands.fetch_worksheets_procedure(**fetch_args)
+
+    assert bare_repo.heads["backup"].commit == first_commit
+    committed_files = bare_repo.git.ls_tree(
+        "-r", "--name-only", "backup"
+    ).splitlines()
+    assert len(committed_files) == 2 * len(worksheets)
+    assert all(f.startswith("worksheets/") for f in committed_files)
+    assert not config.GLOBAL_CONFIG.worksheets_path.exists()
+
+
+@pytest.mark.parametrize("checked_out", [False, True])
+def test_fetch_worksheets_commit_direct_to_checked_out_branch(
+    repo,
+    checked_out,
+    mock_authenticate_to_snowsight,
+    mock_sf_get_worksheets,
+    no_print,
+):
+    head_commit = repo.head.commit
+    branch = repo.active_branch.name if checked_out else None
+
+    with pytest.raises(UsageError):
+        sf_git.commands.fetch_worksheets_procedure(
+            username=config.GLOBAL_CONFIG.sf_login_name,
+            account_id=config.GLOBAL_CONFIG.sf_account_id,
+            password=config.GLOBAL_CONFIG.sf_pwd,
+            commit_direct=True,
+            branch=branch,
+            use_session_cache=False,
+            logger=lambda x: None,
+        )
+    assert repo.head.commit == head_commit
+
+
+def test_fetch_worksheets_branch_without_commit_direct(
+    mock_authenticate_to_snowsight,
+    mock_sf_get_worksheets,
+    no_print,
+):
+    with pytest.raises(UsageError):
+        sf_git.commands.fetch_worksheets_procedure(
+            username=config.GLOBAL_CONFIG.sf_login_name,
+            account_id=config.GLOBAL_CONFIG.sf_account_id,
+            password=config.GLOBAL_CONFIG.sf_pwd,
+            branch="backup",
+            logger=lambda x: None,
+        )
+
+
+@pytest.fixture
+def snapshot_repo(tmp_path, monkeypatch, test_config):
+    snapshot_repo_path = tmp_path / "snapshots"
+    snapshot_repo = Repo.init(snapshot_repo_path)
+    monkeypatch.setattr(test_config, "repo_path", snapshot_repo_path)
+    monkeypatch.setattr(
+        test_config, "worksheets_path", snapshot_repo_path / "worksheets"
+    )
+    return snapshot_repo
+
+
+def test_commit_only_changed_worksheets(snapshot_repo, worksheets):
+    sf_git.cache.save_worksheets_to_cache(worksheets)
+    content_file, metadata_file = sf_git.cache.worksheet_to_files(
+        worksheets[0]
+    )
+
+    first = sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    unchanged = sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    (config.GLOBAL_CONFIG.worksheets_path / content_file).write_text("-- new")
+    (config.GLOBAL_CONFIG.worksheets_path / metadata_file).unlink()
+    second = sf_git.commands.commit_procedure(
+        branch=None, message="Changed", logger=lambda x: None
+    )
+
+    assert first["commit"] == snapshot_repo.head.commit.parents[0].hexsha
+    assert sorted(first["added"]) == sorted([content_file, metadata_file])
+    assert unchanged == {
+        "added": [], "modified": [], "deleted": [], "commit": None
+    }
+    assert second == {
+        "added": [],
+        "modified": [content_file],
+        "deleted": [metadata_file],
+        "commit": snapshot_repo.head.commit.hexsha,
+    }
+    assert len(list(snapshot_repo.iter_commits())) == 2
+
+
+def test_fetch_worksheets_records_remote_state(
+    snapshot_repo,
+    worksheets,
+    mock_authenticate_to_snowsight,
+    mock_sf_get_worksheets,
+    no_print,
+):
+    sf_git.commands.fetch_worksheets_procedure(
+        username="user",
+        account_id="account",
+        password=config.GLOBAL_CONFIG.sf_pwd,
+        store=False,
+        use_session_cache=False,
+        logger=lambda x: None,
+    )
+
+    state = sf_git.remote_state.load_remote_state(
+        snapshot_repo, "account", "user"
+    )
+    assert set(state) == {ws._id for ws in worksheets}
+    # empty folders are recorded too
+    assert sf_git.remote_state.load_remote_folders(
+        snapshot_repo, "account", "user"
+    ) == ["Empty folder"]
+
+
+def test_status_three_way(snapshot_repo, worksheets):
+    sf_git.cache.save_worksheets_to_cache(worksheets)
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    content_file = list(sf_git.cache.worksheet_to_files(worksheets[0]))[0]
+
+    def status():
+        return sf_git.commands.status_procedure(
+            username="user", account_id="account", logger=lambda x: None
+        )
+
+    unknown_remote = status()
+    sf_git.remote_state.record_remote_state(
+        snapshot_repo, "account", "user", worksheets
+    )
+    up_to_date = status()
+
+    (config.GLOBAL_CONFIG.worksheets_path / content_file).write_text("-- new")
+    remote_worksheet = Worksheet(
+        "remote_id", "Remote only", "folder_id", "Remote folder", "select 1;"
+    )
+    worksheets[0].content = "-- changed in Snowsight"
+    sf_git.remote_state.record_remote_state(
+        snapshot_repo, "account", "user", worksheets + [remote_worksheet]
+    )
+    changed = status()
+
+    assert unknown_remote == []
+    assert up_to_date == []
+    assert changed == [
+        {"path": content_file, "local": "modified", "remote": "modified"},
+        {"path": "Remote_folder/Remote_only.sql", "local": None,
+         "remote": "remote_only"},
+    ]
+
+
+def test_status_refresh_remote(
+    snapshot_repo,
+    worksheets,
+    mock_authenticate_to_snowsight,
+    mock_sf_get_worksheets,
+):
+    status = sf_git.commands.status_procedure(
+        username="user",
+        account_id="account",
+        password=config.GLOBAL_CONFIG.sf_pwd,
+        refresh_remote=True,
+        use_session_cache=False,
+        logger=lambda x: None,
+    )
+
+    assert [ws_status["remote"] for ws_status in status] == [
+        "remote_only"
+    ] * len(worksheets)
+
+
+@pytest.fixture
+def upload_outcomes():
+    # Snowsight ids given to created worksheets, ids of failing uploads
+    return {"new_ids": {}, "failing": set()}
+
+
+@pytest.fixture
+def uploaded(monkeypatch, upload_outcomes):
+    uploads = []
+
+    def record_upload(auth_context, worksheets, jobs=1, by_id=False):
+        uploads.append(sorted(worksheet.name for worksheet in worksheets))
+        report = {"completed": [], "errors": []}
+        for worksheet in worksheets:
+            entry = {"name": worksheet.name, "_id": worksheet._id}
+            if worksheet._id in upload_outcomes["failing"]:
+                report["errors"].append(
+                    dict(entry, error=WorksheetError("Failed", "error"))
+                )
+                continue
+            report["completed"].append(
+                dict(
+                    entry,
+                    snowsight_id=upload_outcomes["new_ids"].get(
+                        worksheet._id, worksheet._id
+                    ),
+                    folder_id=worksheet.folder_id,
+                )
+            )
+        return report
+
+    monkeypatch.setattr(sf_git.commands, "upload_to_snowsight", record_upload)
+    return uploads
+
+
+def test_push_worksheets_incremental(
+    snapshot_repo,
+    worksheets,
+    count_authentications,
+    uploaded,
+    no_print,
+):
+    other_worksheet = Worksheet(
+        "other_id", "Other", "folder_id", "Other folder", "select 1;"
+    )
+    sf_git.cache.save_worksheets_to_cache(worksheets + [other_worksheet])
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+
+    def push():
+        sf_git.commands.push_worksheets_procedure(
+            username="user",
+            account_id="account",
+            password=config.GLOBAL_CONFIG.sf_pwd,
+            incremental=True,
+            use_session_cache=False,
+            logger=lambda x: None,
+        )
+
+    push()
+    other_worksheet.content = "select 2;"
+    sf_git.cache.save_worksheets_to_cache([other_worksheet])
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    push()
+    push()
+
+    assert uploaded == [
+        sorted([worksheets[0].name, "Other"]),
+        ["Other"],
+    ]
+    assert len(count_authentications) == 2
+    assert sf_git.remote_state.load_pushed_commit(
+        snapshot_repo, "account", "user"
+    ) == snapshot_repo.head.commit
+
+
+def test_sync_three_way(
+    snapshot_repo,
+    count_authentications,
+    uploaded,
+    upload_outcomes,
+    monkeypatch,
+):
+    def worksheet(ws_id, content, folder_name="Folder", name=None):
+        return Worksheet(
+            ws_id,
+            name or f"Worksheet {ws_id}",
+            "folder_id",
+            folder_name,
+            content,
+        )
+
+    synced = [
+        worksheet(ws_id, f"select '{ws_id}';")
+        for ws_id in ("A", "B", "C", "D", "G")
+    ]
+    sf_git.cache.save_worksheets_to_cache(synced)
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    sf_git.remote_state.record_remote_state(
+        snapshot_repo, "account", "user", synced
+    )
+
+    # C and D changed locally, F created
+    sf_git.cache.save_worksheets_to_cache(
+        [
+            worksheet("C", "select 'C local';"),
+            worksheet("D", "select 'D local';"),
+            worksheet("F", "select 'F';"),
+        ]
+    )
+    # G renamed locally, which cannot be pushed
+    worksheets_path = config.GLOBAL_CONFIG.worksheets_path
+    for file_name in sf_git.cache.worksheet_to_files(synced[4]):
+        (worksheets_path / file_name).unlink()
+    sf_git.cache.save_worksheets_to_cache(
+        [worksheet("G", "select 'G';", name="Renamed G")]
+    )
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    # B and D changed in Snowsight, E created
+    remote_worksheets = [
+        synced[0],
+        worksheet("B", "select 'B remote';"),
+        synced[2],
+        worksheet("D", "select 'D remote';"),
+        worksheet("E", "select 'E';", folder_name="New folder"),
+        synced[4],
+    ]
+    upload_outcomes["new_ids"]["F"] = "F_snowsight"
+    monkeypatch.setattr(
+        sf_git.commands,
+        "sf_get_worksheets",
+        lambda auth_context, store_to_cache, only_folder: remote_worksheets,
+    )
+    monkeypatch.setattr(
+        sf_git.commands,
+        "sf_get_index",
+        lambda auth_context, refresh=False: index_of(remote_worksheets),
+    )
+
+    def sync():
+        return sf_git.commands.sync_procedure(
+            username="user",
+            account_id="account",
+            password="password",
+            use_session_cache=False,
+            logger=lambda x: None,
+        )
+
+    summary = sync()
+
+    assert count_authentications == ["user"]
+    assert summary["in_sync"] == ["Folder/Worksheet_A.sql"]
+    assert summary["pull"] == [
+        "Folder/Worksheet_B.sql", "New_folder/Worksheet_E.sql"
+    ]
+    assert summary["push"] == [
+        "Folder/Worksheet_C.sql", "Folder/Worksheet_F.sql"
+    ]
+    assert summary["conflict"] == ["Folder/Worksheet_D.sql"]
+    assert summary["unsupported"] == ["Folder/Worksheet_G.sql"]
+    assert summary["commit"] == snapshot_repo.head.commit.hexsha
+    assert uploaded == [["Worksheet C", "Worksheet F"]]
+
+    # the created worksheet is committed with its Snowsight id
+    metadata = json.loads(
+        (worksheets_path / "Folder" / ".Worksheet_F_metadata.json").read_text()
+    )
+    assert metadata["_id"] == "F_snowsight"
+    # the rename is neither pushed nor recorded as synced
+    synced_state = sf_git.remote_state.load_remote_state(
+        snapshot_repo, "account", "user", "synced"
+    )
+    assert synced_state["G"]["path"] == "Folder/Worksheet_G.sql"
+    assert "F" not in synced_state
+    assert sf_git.remote_state.load_pushed_commit(
+        snapshot_repo, "account", "user"
+    ) is None
+    assert (worksheets_path / "Folder" / "Worksheet_B.sql").read_text() == (
+        "select 'B remote';"
+    )
+    assert (worksheets_path / "Folder" / "Worksheet_D.sql").read_text() == (
+        "select 'D local';"
+    )
+
+    # Snowsight now has pushed worksheets, only the conflict remains
+    remote_worksheets[2] = worksheet("C", "select 'C local';")
+    remote_worksheets.append(
+        worksheet("F_snowsight", "select 'F';", name="Worksheet F")
+    )
+    head = snapshot_repo.head.commit
+    summary = sync()
+
+    assert summary["conflict"] == ["Folder/Worksheet_D.sql"]
+    assert summary["unsupported"] == ["Folder/Worksheet_G.sql"]
+    assert len(summary["in_sync"]) == 5
+    assert not summary["pull"] and not summary["push"]
+    assert snapshot_repo.head.commit == head
+
+
+def test_sync_failed_push_is_not_recorded(
+    snapshot_repo,
+    count_authentications,
+    uploaded,
+    upload_outcomes,
+    monkeypatch,
+):
+    # same name in two folders, only one fails
+    synced = [
+        Worksheet("A", "Same name", "folder_a", "Folder A", "select 1;"),
+        Worksheet("B", "Same name", "folder_b", "Folder B", "select 1;"),
+    ]
+    sf_git.cache.save_worksheets_to_cache(synced)
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    sf_git.remote_state.record_remote_state(
+        snapshot_repo, "account", "user", synced
+    )
+    sf_git.cache.save_worksheets_to_cache(
+        [
+            Worksheet("A", "Same name", "folder_a", "Folder A", "select 2;"),
+            Worksheet("B", "Same name", "folder_b", "Folder B", "select 2;"),
+        ]
+    )
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    monkeypatch.setattr(
+        sf_git.commands,
+        "sf_get_worksheets",
+        lambda auth_context, store_to_cache, only_folder: synced,
+    )
+    monkeypatch.setattr(
+        sf_git.commands,
+        "sf_get_index",
+        lambda auth_context, refresh=False: index_of(synced),
+    )
+    upload_outcomes["failing"].add("B")
+
+    summary = sf_git.commands.sync_procedure(
+        username="user",
+        account_id="account",
+        password="password",
+        use_session_cache=False,
+        logger=lambda x: None,
+    )
+
+    assert [err["_id"] for err in summary["errors"]] == ["B"]
+    synced_state = sf_git.remote_state.load_remote_state(
+        snapshot_repo, "account", "user", "synced"
+    )
+    local_state = sf_git.remote_state.worksheet_state(
+        Worksheet("A", "Same name", "folder_a", "Folder A", "select 2;")
+    )
+    assert synced_state["A"]["digest"] == local_state["digest"]
+    assert synced_state["B"]["digest"] != local_state["digest"]
+    assert sf_git.remote_state.load_pushed_commit(
+        snapshot_repo, "account", "user"
+    ) is None
+
+
+def test_sync_refuses_uncommitted_changes(snapshot_repo, worksheets):
+    sf_git.cache.save_worksheets_to_cache(worksheets)
+
+    with pytest.raises(UsageError):
+        sf_git.commands.sync_procedure(
+            username="user",
+            account_id="account",
+            password="password",
+            use_session_cache=False,
+            logger=lambda x: None,
+        )
+
+
+def test_push_plan_then_apply(
+    snapshot_repo,
+    worksheets,
+    count_authentications,
+    uploaded,
+    tmp_path,
+    monkeypatch,
+):
+    sf_git.cache.save_worksheets_to_cache(worksheets)
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    sf_git.remote_state.record_remote_state(
+        snapshot_repo, "account", "user", worksheets
+    )
+    new_worksheet = Worksheet(
+        "new_id", "New", "folder_id", "New folder", "select 1;"
+    )
+    sf_git.cache.save_worksheets_to_cache([new_worksheet])
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    plan_path = tmp_path / "plan.json"
+
+    plan = sf_git.commands.plan_push_procedure(
+        username="user",
+        account_id="account",
+        plan_path=str(plan_path),
+        logger=lambda x: None,
+    )
+
+    assert count_authentications == []
+    assert plan["folders_to_create"] == ["New folder"]
+    assert [entry["name"] for entry in plan["create"]] == ["New"]
+    assert plan["update"] == []
+    assert len(plan["unchanged"]) == len(worksheets)
+    assert json.loads(plan_path.read_text()) == plan
+
+    # commits after planning are not pushed
+    sf_git.cache.save_worksheets_to_cache(
+        [
+            Worksheet(
+                "later_id", "Later", "folder_id", "New folder", "select 2;"
+            )
+        ]
+    )
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    monkeypatch.setattr(
+        sf_git.commands,
+        "sf_get_index",
+        lambda auth_context, refresh=False: index_of(worksheets),
+    )
+    report = sf_git.commands.apply_push_plan_procedure(
+        username="user",
+        account_id="account",
+        plan_path=str(plan_path),
+        password="password",
+        use_session_cache=False,
+        logger=lambda x: None,
+    )
+
+    assert uploaded == [["New"]]
+    assert report["errors"] == []
+    assert sf_git.remote_state.load_pushed_commit(
+        snapshot_repo, "account", "user"
+    ).hexsha == plan["commit"]
+
+
+def test_apply_push_plan_refuses_drift(
+    snapshot_repo,
+    worksheets,
+    count_authentications,
+    uploaded,
+    tmp_path,
+    monkeypatch,
+):
+    sf_git.cache.save_worksheets_to_cache(worksheets)
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    sf_git.remote_state.record_remote_state(
+        snapshot_repo, "account", "user", worksheets
+    )
+    changed = Worksheet(
+        worksheets[0]._id,
+        worksheets[0].name,
+        worksheets[0].folder_id,
+        worksheets[0].folder_name,
+        "-- changed locally",
+    )
+    sf_git.cache.save_worksheets_to_cache([changed])
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    plan_path = tmp_path / "plan.json"
+    plan = sf_git.commands.plan_push_procedure(
+        username="user",
+        account_id="account",
+        plan_path=str(plan_path),
+        logger=lambda x: None,
+    )
+    # changed in Snowsight after planning
+    live = Worksheet(
+        changed._id,
+        changed.name,
+        changed.folder_id,
+        changed.folder_name,
+        "-- changed in Snowsight",
+    )
+    monkeypatch.setattr(
+        sf_git.commands,
+        "sf_get_index",
+        lambda auth_context, refresh=False: index_of(
+            [live] + worksheets[1:]
+        ),
+    )
+
+    with pytest.raises(UsageError, match=re.escape(plan["update"][0]["path"])):
+        sf_git.commands.apply_push_plan_procedure(
+            username="user",
+            account_id="account",
+            plan_path=str(plan_path),
+            password="password",
+            use_session_cache=False,
+            logger=lambda x: None,
+        )
+
+    assert uploaded == []
+    assert sf_git.remote_state.load_pushed_commit(
+        snapshot_repo, "account", "user"
+    ) is None
+
+
+@pytest.mark.parametrize(
+    "username,account_id", [("", "account"), ("user", None)]
+)
+def test_plan_push_needs_credentials(
+    snapshot_repo, tmp_path, username, account_id
+):
+    with pytest.raises(UsageError):
+        sf_git.commands.plan_push_procedure(
+            username=username,
+            account_id=account_id,
+            plan_path=str(tmp_path / "plan.json"),
+            logger=lambda x: None,
+        )
+    assert not (tmp_path / "plan.json").exists()
+
+
+def test_plan_push_unknown_revision(snapshot_repo, worksheets, tmp_path):
+    sf_git.cache.save_worksheets_to_cache(worksheets)
+    sf_git.commands.commit_procedure(
+        branch=None, message=None, logger=lambda x: None
+    )
+    sf_git.remote_state.record_remote_state(
+        snapshot_repo, "account", "user", worksheets
+    )
+
+    with pytest.raises(SnowflakeGitError):
+        sf_git.commands.plan_push_procedure(
+            username="user",
+            account_id="account",
+            plan_path=str(tmp_path / "plan.json"),
+            branch="unknown",
+            logger=lambda x: None,
+        )
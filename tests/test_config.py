@@ -1,6 +1,15 @@
+import os
+import threading
+from pathlib import Path
+
+import pytest
+from dotenv import dotenv_values
 from git import Repo
+
+import sf_git.config as config
 from sf_git import DOTENV_PATH
 from sf_git.config import GLOBAL_CONFIG
+from sf_git.models import ConfigError
 
 
 def test_repo(repo: Repo):
@@ -13,3 +22,154 @@ def test_dotenv_path():
     from dotenv import dotenv_values
     values = dotenv_values(DOTENV_PATH)
     assert values['SF_LOGIN_NAME'] == GLOBAL_CONFIG.sf_login_name
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "sf_git.conf"
+    path.write_text(
+        "# sf_git configuration\n"
+        "SNOWFLAKE_VERSIONING_REPO='/tmp/repo'\n"
+        "SF_ACCOUNT_ID='default_account'\n"
+        "prod.SF_ACCOUNT_ID='prod_account'\n"
+    )
+    path.chmod(0o600)
+    return path
+
+
+@pytest.fixture
+def fresh_config_state(monkeypatch):
+    monkeypatch.setattr(config, "_FILE_VALUES", {})
+    monkeypatch.setattr(config, "_CONFIGS", {})
+    monkeypatch.setattr(config, "_active_profile", None)
+    for key in config.CONFIG_KEYS:
+        monkeypatch.delenv(key, raising=False)
+
+
+def test_write_config_in_one_atomic_write(
+    config_file, fresh_config_state, monkeypatch
+):
+    replaced = []
+    os_replace = os.replace
+
+    def count_replace(src, dst):
+        replaced.append(dst)
+        os_replace(src, dst)
+
+    monkeypatch.setattr(config.os, "replace", count_replace)
+
+    config.write_config(
+        {"SF_ACCOUNT_ID": "staging_account", "SF_LOGIN_NAME": "it's me"},
+        profile="staging",
+        path=config_file,
+    )
+    config.write_config(
+        {"SF_ACCOUNT_ID": "new_prod_account"}, profile="prod", path=config_file
+    )
+
+    assert replaced == [config_file, config_file]
+    assert config_file.read_text().startswith("# sf_git configuration\n")
+    assert config_file.stat().st_mode & 0o777 == 0o600
+    assert dotenv_values(config_file) == {
+        "SNOWFLAKE_VERSIONING_REPO": "/tmp/repo",
+        "SF_ACCOUNT_ID": "default_account",
+        "prod.SF_ACCOUNT_ID": "new_prod_account",
+        "staging.SF_ACCOUNT_ID": "staging_account",
+        "staging.SF_LOGIN_NAME": "it's me",
+    }
+    assert config.list_profiles(config_file) == ["prod", "staging"]
+
+
+def test_config_values_precedence(
+    config_file, fresh_config_state, monkeypatch
+):
+    monkeypatch.setenv("SF_ACCOUNT_ID", "env_account")
+    monkeypatch.setenv("SF_LOGIN_NAME", "env_user")
+
+    default_values = config.config_values(path=config_file)
+    prod_values = config.config_values("prod", path=config_file)
+
+    assert default_values["SF_ACCOUNT_ID"] == "env_account"
+    assert prod_values["SF_ACCOUNT_ID"] == "prod_account"
+    assert prod_values["SF_LOGIN_NAME"] == "env_user"
+    with pytest.raises(ConfigError):
+        config.config_values("unknown", path=config_file)
+    with pytest.raises(ConfigError):
+        config.config_values("not a name", path=config_file)
+
+
+def test_concurrent_write_config_keep_all_updates(
+    config_file, fresh_config_state
+):
+    profiles = [f"profile_{i}" for i in range(16)]
+    threads = [
+        threading.Thread(
+            target=config.write_config,
+            args=({"SF_ACCOUNT_ID": f"{profile}_account"}, profile),
+            kwargs={"path": config_file},
+        )
+        for profile in profiles
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert config.list_profiles(config_file) == sorted(profiles + ["prod"])
+
+
+def test_organization_id_from_config_file(config_file, fresh_config_state):
+    config.write_config(
+        {"SF_ORGANIZATION_ID": "prod_organization"},
+        profile="prod",
+        path=config_file,
+    )
+
+    values = config.config_values("prod", path=config_file)
+
+    assert values["SF_ORGANIZATION_ID"] == "prod_organization"
+
+
+def test_config_file_is_read_once(
+    config_file, fresh_config_state, monkeypatch
+):
+    reads = []
+
+    def count_dotenv_values(path):
+        reads.append(path)
+        return dotenv_values(path)
+
+    monkeypatch.setattr(config, "dotenv_values", count_dotenv_values)
+
+    for profile in (None, "prod", None, "prod"):
+        config.config_values(profile, path=config_file)
+
+    assert reads == [config_file]
+
+
+def test_global_config_from_selected_profile(
+    config_file, fresh_config_state, monkeypatch
+):
+    monkeypatch.setitem(
+        config._FILE_VALUES,
+        config.DOTENV_PATH,
+        config.read_config_file(config_file),
+    )
+    monkeypatch.delattr(config, "GLOBAL_CONFIG")
+
+    assert config.GLOBAL_CONFIG.sf_account_id == "default_account"
+    assert config.GLOBAL_CONFIG is config.load_config()
+
+    config.select_profile("prod")
+
+    assert config.GLOBAL_CONFIG.sf_account_id == "prod_account"
+    assert config.GLOBAL_CONFIG.profile == "prod"
+    assert config.GLOBAL_CONFIG.repo_path == Path("/tmp/repo")
+
+
+def test_missing_versioning_repo(fresh_config_state, monkeypatch):
+    monkeypatch.setitem(config._FILE_VALUES, config.DOTENV_PATH, {})
+    monkeypatch.delattr(config, "GLOBAL_CONFIG")
+
+    with pytest.raises(ConfigError):
+        config.GLOBAL_CONFIG
@@ -0,0 +1,215 @@
+import gc
+import io
+
+import pytest
+from git import Repo
+from gitdb import IStream
+from git.objects.blob import Blob
+
+import sf_git.git_utils as git_utils
+from sf_git.models import SnowflakeGitError
+
+
+@pytest.fixture
+def blobs(repo):
+    return [
+        b for b in repo.head.commit.tree.traverse() if isinstance(b, Blob)
+    ]
+
+
+def test_blob_reader_reads_many(repo, blobs):
+    reader = git_utils.BlobReader(repo)
+
+    contents = list(reader.read_many([b.hexsha for b in blobs]))
+    reader.close()
+
+    assert [sha for sha, _ in contents] == [b.hexsha for b in blobs]
+    assert [content for _, content in contents] == [
+        b.data_stream.read() for b in blobs
+    ]
+
+
+def test_blob_reader_recovers_from_missing_object(repo, blobs):
+    reader = git_utils.BlobReader(repo)
+
+    with pytest.raises(SnowflakeGitError):
+        list(reader.read_many(["0" * 40, blobs[0].hexsha]))
+
+    assert list(reader.read_many([blobs[0].hexsha])) == [
+        (blobs[0].hexsha, blobs[0].data_stream.read())
+    ]
+    reader.close()
+
+
+def test_get_blobs_content_by_path(blobs):
+    contents = git_utils.get_blobs_content(blobs, by_path=True)
+
+    assert set(contents) == {b.path for b in blobs}
+
+
+def test_get_blob_reader_is_shared(repo):
+    assert git_utils.get_blob_reader(repo) is git_utils.get_blob_reader(repo)
+
+
+def test_blob_reader_is_closed_with_its_repo(tmp_path):
+    other_repo = Repo.init(tmp_path)
+    hexsha = other_repo.odb.store(
+        IStream("blob", 2, io.BytesIO(b"ok"))
+    ).hexsha.decode()
+    reader = git_utils.get_blob_reader(other_repo)
+    assert reader.read_many([hexsha]) == [(hexsha, b"ok")]
+    process = reader._process
+
+    del other_repo
+    gc.collect()
+
+    assert reader not in git_utils._BLOB_READERS.values()
+    assert reader._process is None
+    assert process.proc.poll() is not None
+
+
+def test_resolve_commit(repo):
+    assert git_utils.resolve_commit(repo, None) == repo.head.commit
+    assert git_utils.resolve_commit(
+        repo, repo.head.commit.hexsha
+    ) == repo.head.commit
+    with pytest.raises(SnowflakeGitError):
+        git_utils.resolve_commit(repo, "unknown_revision")
+
+
+@pytest.mark.parametrize("revision", [None, "main", "HEAD", "sha", "tag"])
+def test_get_tracked_files_any_revision(repo, test_config, revision):
+    if revision == "sha":
+        revision = repo.head.commit.hexsha
+    elif revision == "tag":
+        revision = repo.create_tag("tracked_files_tag").name
+
+    try:
+        tracked_files = git_utils.get_tracked_files(
+            repo, test_config.worksheets_path, revision
+        )
+    finally:
+        if revision == "tracked_files_tag":
+            repo.delete_tag(revision)
+
+    assert isinstance(tracked_files, list)
+    assert len(
+        [f for f in tracked_files if f.name.endswith("_metadata.json")]
+    ) == 7
+
+
+def test_get_tracked_files_unknown_revision(repo, test_config):
+    with pytest.raises(SnowflakeGitError):
+        git_utils.get_tracked_files(
+            repo, test_config.worksheets_path, "unknown_revision"
+        )
+
+
+def test_get_tracked_files_untracked_folder(repo, test_config):
+    with pytest.raises(SnowflakeGitError):
+        git_utils.get_tracked_files(
+            repo, test_config.worksheets_path / "untracked_folder"
+        )
+
+
+def test_commit_files_keeps_committed_files(tmp_path):
+    repo = Repo.init(tmp_path / "commit_files")
+    first = git_utils.commit_files(
+        repo,
+        {"a/b/first.sql": b"select 1;", "root.sql": b"select 0;"},
+        "first",
+        branch_name="backup",
+    )
+    second = git_utils.commit_files(
+        repo,
+        {"a/b/second.sql": b"select 2;"},
+        "second",
+        branch_name="backup",
+    )
+
+    assert second.parents == [first]
+    assert repo.heads["backup"].commit == second
+    committed_files = repo.git.ls_tree("-r", "--name-only", "backup")
+    assert sorted(committed_files.split()) == [
+        "a/b/first.sql",
+        "a/b/second.sql",
+        "root.sql",
+    ]
+    assert (second.tree / "a/b/second.sql").data_stream.read() == b"select 2;"
+    repo.git.fsck("--strict")
+    assert not (tmp_path / "commit_files" / "a").exists()
+
+
+def test_commit_files_refuses_checked_out_branch(tmp_path):
+    repo = Repo.init(tmp_path / "commit_files")
+    repo.git.symbolic_ref("HEAD", "refs/heads/main")
+
+    with pytest.raises(SnowflakeGitError):
+        git_utils.commit_files(repo, {"first.sql": b"select 1;"}, "first")
+    with pytest.raises(SnowflakeGitError):
+        git_utils.commit_files(
+            repo, {"first.sql": b"select 1;"}, "first", branch_name="main"
+        )
+    assert not repo.head.is_valid()
+
+
+def test_commit_files_skips_unchanged_tree(tmp_path):
+    repo = Repo.init(tmp_path / "commit_files", bare=True)
+    files = {"first.sql": b"select 1;"}
+
+    assert git_utils.commit_files(repo, files, "first") is not None
+    assert git_utils.commit_files(repo, files, "again") is None
+
+
+def test_iter_diff_filters_with_pathspecs(tmp_path):
+    repo = Repo.init(tmp_path / "diff")
+    worksheets_path = tmp_path / "diff" / "worksheets"
+    (worksheets_path / "folder").mkdir(parents=True)
+    for file_name in ("first.sql", "folder/second.sql", "notes.txt"):
+        (worksheets_path / file_name).write_text("select 1;\n")
+    (tmp_path / "diff" / "outside.sql").write_text("select 1;\n")
+    repo.index.add(["worksheets", "outside.sql"])
+    repo.index.commit("initial")
+    for file_name in ("first.sql", "folder/second.sql", "notes.txt"):
+        (worksheets_path / file_name).write_text("select 2;\n")
+    (tmp_path / "diff" / "outside.sql").write_text("select 2;\n")
+
+    lines = list(
+        git_utils.iter_diff(
+            repo, subdirectory=worksheets_path, file_extensions="sql"
+        )
+    )
+
+    diffed_files = [line for line in lines if line.startswith("diff --git")]
+    assert diffed_files == [
+        "diff --git a/worksheets/first.sql b/worksheets/first.sql",
+        "diff --git a/worksheets/folder/second.sql"
+        " b/worksheets/folder/second.sql",
+    ]
+    assert "\033[31m-select 1;\033[0m" in lines
+    assert "\033[32m+select 2;\033[0m" in lines
+
+
+def test_iter_diff_stops_git_when_closed_early(tmp_path, monkeypatch):
+    repo = Repo.init(tmp_path / "diff")
+    worksheet_file = tmp_path / "diff" / "worksheet.sql"
+    worksheet_file.write_text("select 1;\n" * 10000)
+    repo.index.add(["worksheet.sql"])
+    repo.index.commit("initial")
+    worksheet_file.write_text("select 2;\n" * 10000)
+    processes = []
+
+    def record_diff(git_cmd, *args, **kwargs):
+        process = git_cmd._call_process("diff", *args, **kwargs)
+        # keep the wrapper alive so its finalizer cannot stop git for us
+        processes.append(process)
+        return process
+
+    monkeypatch.setattr(type(repo.git), "diff", record_diff, raising=False)
+
+    lines = git_utils.iter_diff(repo)
+    assert next(lines) == "diff --git a/worksheet.sql b/worksheet.sql"
+    lines.close()
+
+    assert processes[0].proc.returncode is not None
+    assert processes[0].proc.stdout.closed
@@ -0,0 +1,192 @@
+from pathlib import Path
+
+import pytest
+from git import Repo
+
+import sf_git.remote_state as remote_state
+from sf_git.cache import worksheet_to_files
+from sf_git.models import Worksheet
+
+
+@pytest.fixture
+def state_repo(tmp_path):
+    return Repo.init(tmp_path / "state_repo")
+
+
+def remote_worksheets(folder_name, content="select 1;"):
+    return [
+        Worksheet(
+            _id=f"{folder_name}_{i}",
+            name=f"worksheet {i}",
+            folder_id=folder_name,
+            folder_name=folder_name,
+            content=content,
+            modified="2024-01-19T01:45:29.514886Z",
+        )
+        for i in range(2)
+    ]
+
+
+def test_remote_ref_name():
+    assert remote_state.remote_ref_name(
+        "my_account.west-europe.azure", "first.last@corp.com"
+    ) == (
+        "refs/snowsight/my_account_west-europe_azure"
+        "/first_last_corp_com/fetched"
+    )
+
+
+def test_record_and_load_remote_state(state_repo):
+    worksheets = remote_worksheets("Folder A")
+
+    state_commit = remote_state.record_remote_state(
+        state_repo, "account", "user", worksheets
+    )
+    state = remote_state.load_remote_state(state_repo, "account", "user")
+
+    assert state_commit is not None
+    assert set(state) == {ws._id for ws in worksheets}
+    ws_state = state[worksheets[0]._id]
+    content_file = list(worksheet_to_files(worksheets[0]))[0]
+    assert ws_state["path"] == content_file
+    assert ws_state["modified"] == worksheets[0].modified
+    # digest is the blob sha git gives to the cached file
+    cached_file = Path(state_repo.working_tree_dir) / "cached.sql"
+    cached_file.write_bytes(worksheet_to_files(worksheets[0])[content_file])
+    assert ws_state["digest"] == state_repo.git.hash_object(str(cached_file))
+    cached_file.unlink()
+    assert not state_repo.is_dirty(untracked_files=True)
+    assert not state_repo.heads
+
+
+def test_record_unchanged_remote_state(state_repo):
+    worksheets = remote_worksheets("Folder A")
+    first = remote_state.record_remote_state(
+        state_repo, "account", "user", worksheets
+    )
+
+    assert remote_state.record_remote_state(
+        state_repo, "account", "user", worksheets
+    ) is None
+
+    second = remote_state.record_remote_state(
+        state_repo, "account", "user", remote_worksheets("Folder A", "-- new")
+    )
+    assert second.parents == [first]
+
+
+def test_record_remote_state_of_one_folder(state_repo):
+    remote_state.record_remote_state(
+        state_repo,
+        "account",
+        "user",
+        remote_worksheets("Folder A") + remote_worksheets("Folder B"),
+    )
+
+    remote_state.record_remote_state(
+        state_repo,
+        "account",
+        "user",
+        remote_worksheets("Folder B")[:1],
+        only_folder="Folder B",
+    )
+
+    state = remote_state.load_remote_state(state_repo, "account", "user")
+    assert sorted(state) == ["Folder A_0", "Folder A_1", "Folder B_0"]
+
+
+def test_record_remote_folders(state_repo):
+    worksheets = remote_worksheets("Folder A")
+    remote_state.record_remote_state(
+        state_repo,
+        "account",
+        "user",
+        worksheets,
+        folders=["Empty", "Folder A"],
+    )
+
+    # kept when not given
+    remote_state.record_remote_state(
+        state_repo, "account", "user", worksheets[:1]
+    )
+
+    assert remote_state.load_remote_folders(
+        state_repo, "account", "user"
+    ) == ["Empty", "Folder A"]
+
+
+def test_load_never_recorded_remote_state(state_repo):
+    state = remote_state.load_remote_state(state_repo, "account", "user")
+
+    assert state is None
+
+
+def state(digest, metadata_digest="metadata"):
+    return {"digest": digest, "metadata_digest": metadata_digest}
+
+
+@pytest.mark.parametrize("base, local, remote, expected", [
+    (state("a"), state("a"), state("a"), "in_sync"),
+    (state("a"), state("a"), state("b"), "pull"),
+    (state("a"), state("b"), state("a"), "push"),
+    (state("a"), state("b"), state("c"), "conflict"),
+    (state("a"), state("b"), state("b"), "in_sync"),
+    (None, state("a"), None, "push"),
+    (None, None, state("a"), "pull"),
+    (None, state("a"), state("b"), "conflict"),
+    (state("a"), state("a"), None, "deleted_remotely"),
+    (state("a"), None, state("a"), "deleted_locally"),
+    (state("a"), state("b"), None, "conflict"),
+    (state("a"), state("a", "renamed"), state("a"), "unsupported"),
+    (state("a"), state("b", "moved"), state("a"), "unsupported"),
+    (state("a"), state("a"), state("a", "renamed"), "pull"),
+])
+def test_classify_sync(base, local, remote, expected):
+    def by_id(ws_state):
+        return {"ws": ws_state} if ws_state is not None else {}
+
+    actions = remote_state.classify_sync(
+        by_id(base), by_id(local), by_id(remote)
+    )
+
+    assert actions == {"ws": expected}
+
+
+def test_plan_push():
+    remote = {
+        ws._id: remote_state.worksheet_state(ws)
+        for ws in remote_worksheets("folder")
+    }
+    local = [
+        Worksheet("folder_0", "worksheet 0", "folder", "folder", "select 1;"),
+        Worksheet("folder_1", "worksheet 1", "folder", "folder", "select 2;"),
+        Worksheet("new", "new worksheet", "new_folder", "new", "select 3;"),
+    ]
+
+    plan = remote_state.plan_push(local, remote, jobs=1)
+
+    assert plan["folders_to_create"] == ["new"]
+    assert [entry["path"] for entry in plan["create"]] == [
+        "new/new_worksheet.sql"
+    ]
+    assert plan["create"][0]["remote_digest"] is None
+    assert [entry["path"] for entry in plan["update"]] == [
+        "folder/worksheet_1.sql"
+    ]
+    assert plan["update"][0]["remote_digest"] == remote["folder_1"]["digest"]
+    assert plan["unchanged"] == ["folder/worksheet_0.sql"]
+    # listing, folder creation, worksheet creation and write, update
+    assert plan["requests"] == 5
+    assert plan["estimated_seconds"] == (
+        5 * remote_state.ESTIMATED_REQUEST_SECONDS
+    )
+
+
+def test_plan_push_into_empty_folder():
+    local = [Worksheet("new", "new worksheet", None, "empty", "select 1;")]
+
+    plan = remote_state.plan_push(local, {}, remote_folders=["empty"])
+
+    assert plan["folders_to_create"] == []
+    # listing, worksheet creation and write
+    assert plan["requests"] == 3
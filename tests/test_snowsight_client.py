@@ -0,0 +1,222 @@
+import re
+
+import pytest
+import requests
+import requests_mock
+
+import sf_git.models
+import sf_git.rest_utils as rest_utils
+from sf_git.snowsight_client import SnowsightClient, get_client
+
+
+@pytest.fixture
+def mock_api():
+    with requests_mock.Mocker() as m:
+        yield m
+
+
+def test_get_client_is_shared(auth_context):
+    assert get_client(auth_context) is get_client(auth_context)
+
+
+def test_get_client_is_bound_to_its_context(auth_context):
+    other_context = sf_git.models.AuthenticationContext()
+
+    assert get_client(other_context) is not get_client(auth_context)
+    assert get_client(other_context).auth_context is other_context
+
+
+def test_client_sends_default_headers(mock_api, auth_context):
+    mock_api.post(re.compile(auth_context.app_server_url), text="{}")
+
+    get_client(auth_context).post(
+        f"{auth_context.app_server_url}/v0/queries",
+        headers={"Accept": "application/json"},
+    )
+
+    sent_headers = mock_api.last_request.headers
+    assert sent_headers["X-Snowflake-Context"] == (
+        f"{auth_context.username}::{auth_context.account_url}"
+    )
+    assert sent_headers["Referer"] == auth_context.main_app_url
+    assert sent_headers["Accept"] == "application/json"
+
+
+def test_client_headers_override_defaults(mock_api, auth_context):
+    mock_api.get(re.compile(auth_context.app_server_url), text="{}")
+
+    get_client(auth_context).get(
+        auth_context.app_server_url, headers={"Referer": "overridden"}
+    )
+
+    assert mock_api.last_request.headers["Referer"] == "overridden"
+
+
+def test_client_pool_size():
+    client = SnowsightClient(pool_size=3)
+    adapter = client.session.get_adapter("https://")
+
+    assert client.pool_size == 3
+    assert adapter._pool_maxsize == 3
+
+    client.set_pool_size(8)
+    assert client.session.get_adapter("https://")._pool_maxsize == 8
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    waits = []
+    monkeypatch.setattr(rest_utils.time, "sleep", waits.append)
+    return waits
+
+
+def test_client_retries_throttled_requests(mock_api, auth_context, no_sleep):
+    mock_api.post(
+        re.compile(auth_context.app_server_url),
+        [
+            {"status_code": 429, "headers": {"Retry-After": "2"}},
+            {"status_code": 503},
+            {"status_code": 200, "text": "{}"},
+        ],
+    )
+    client = SnowsightClient(auth_context)
+
+    with client.track_retries() as stats:
+        response = client.post(auth_context.app_server_url)
+
+    assert response.status_code == 200
+    assert stats.retries == 2
+    assert no_sleep[0] == 2
+    assert stats.wait_time == pytest.approx(sum(no_sleep))
+
+
+def test_client_gives_up_after_max_retries(
+    mock_api, auth_context, no_sleep
+):
+    mock_api.get(re.compile(auth_context.app_server_url), status_code=502)
+    client = SnowsightClient(
+        auth_context, retry_policy=rest_utils.RetryPolicy(max_retries=2)
+    )
+
+    response = client.get(auth_context.app_server_url)
+
+    assert response.status_code == 502
+    assert mock_api.call_count == 3
+
+
+@pytest.mark.parametrize("status_code", [502, 504])
+def test_client_does_not_retry_processed_posts(
+    mock_api, auth_context, no_sleep, status_code
+):
+    mock_api.post(
+        re.compile(auth_context.app_server_url), status_code=status_code
+    )
+
+    response = SnowsightClient(auth_context).post(
+        auth_context.app_server_url
+    )
+
+    assert response.status_code == status_code
+    assert mock_api.call_count == 1
+
+
+def test_client_retries_idempotent_posts(mock_api, auth_context, no_sleep):
+    mock_api.post(
+        re.compile(auth_context.app_server_url),
+        [{"status_code": 502}, {"status_code": 200, "text": "{}"}],
+    )
+
+    response = SnowsightClient(auth_context).post(
+        auth_context.app_server_url, idempotent=True
+    )
+
+    assert response.status_code == 200
+    assert mock_api.call_count == 2
+
+
+def test_client_retries_posts_not_connected(
+    mock_api, auth_context, no_sleep
+):
+    mock_api.post(
+        re.compile(auth_context.app_server_url),
+        [
+            {"exc": requests.exceptions.ConnectTimeout},
+            {"status_code": 200, "text": "{}"},
+        ],
+    )
+
+    response = SnowsightClient(auth_context).post(
+        auth_context.app_server_url
+    )
+
+    assert response.status_code == 200
+    assert mock_api.call_count == 2
+
+
+def test_client_does_not_retry_posts_lost_after_sending(
+    mock_api, auth_context, no_sleep
+):
+    mock_api.post(
+        re.compile(auth_context.app_server_url),
+        exc=requests.exceptions.ConnectionError("Connection reset by peer"),
+    )
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        SnowsightClient(auth_context).post(auth_context.app_server_url)
+    assert mock_api.call_count == 1
+
+
+def test_client_gives_up_when_retry_after_exceeds_backoff_max(
+    mock_api, auth_context, no_sleep
+):
+    mock_api.get(
+        re.compile(auth_context.app_server_url),
+        status_code=429,
+        headers={"Retry-After": "120"},
+    )
+    client = SnowsightClient(
+        auth_context, retry_policy=rest_utils.RetryPolicy(backoff_max=30)
+    )
+
+    response = client.get(auth_context.app_server_url)
+
+    assert response.status_code == 429
+    assert mock_api.call_count == 1
+    assert no_sleep == []
+
+
+def test_client_does_not_retry_client_errors(
+    mock_api, auth_context, no_sleep
+):
+    mock_api.post(re.compile(auth_context.app_server_url), status_code=403)
+
+    response = SnowsightClient(auth_context).post(
+        auth_context.app_server_url
+    )
+
+    assert response.status_code == 403
+    assert mock_api.call_count == 1
+
+
+@pytest.mark.parametrize("attempt", [0, 3, 10])
+def test_retry_policy_backoff_is_bounded(attempt):
+    policy = rest_utils.RetryPolicy(backoff_base=0.5, backoff_max=4)
+
+    wait_time = policy.wait_time(attempt)
+
+    assert 0 <= wait_time <= min(4, 0.5 * 2**attempt)
+
+
+def test_adaptive_limiter_aimd():
+    limiter = rest_utils.AdaptiveLimiter(max_limit=8)
+
+    limiter.acquire()
+    limiter.release(throttled=True)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 2
+
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    assert 3 < limiter.limit < 4
@@ -1,10 +1,16 @@
 import pytest
 import json
+import requests
 import requests_mock
 import re
+from urllib.parse import parse_qs
 
+import sf_git.cache
 import sf_git.models
+import sf_git.rest_utils
+import sf_git.snowsight_client
 import sf_git.worksheets_utils as worksheets_utils
+from sf_git.models import WorksheetError
 
 
 @pytest.fixture
@@ -39,23 +45,21 @@ def get_worksheets_api_response_without_worksheets(
 
 
 @pytest.fixture()
-def mock_get_folders(monkeypatch, testing_folder):
-    def mocked_folders(auth_context):
+def mock_get_entity_index(monkeypatch, testing_folder):
+    def mocked_index(auth_context, refresh=False):
         with open(testing_folder / "fixtures" / "folders.json", "r") as f:
             folders_as_dict = json.load(f)
-        return [sf_git.models.Folder(**f) for f in folders_as_dict]
-
-    monkeypatch.setattr(worksheets_utils, "get_folders", mocked_folders)
-
-
-@pytest.fixture()
-def mock_get_worksheets(monkeypatch, testing_folder):
-    def mocked_worksheets(auth_context):
         with open(testing_folder / "fixtures" / "worksheets.json", "r") as f:
             worksheets_as_dict = json.load(f)
-        return [sf_git.models.Worksheet(**w) for w in worksheets_as_dict]
+        return sf_git.models.EntityIndex(
+            worksheets=[
+                worksheets_utils.worksheet_entry(sf_git.models.Worksheet(**w))
+                for w in worksheets_as_dict
+            ],
+            folders=[sf_git.models.Folder(**f) for f in folders_as_dict],
+        )
 
-    monkeypatch.setattr(worksheets_utils, "get_worksheets", mocked_worksheets)
+    monkeypatch.setattr(worksheets_utils, "get_entity_index", mocked_index)
 
 
 @pytest.fixture()
@@ -149,8 +153,7 @@ def test_get_folders_when_none(
 
 def test_upload_snowsight_when_one_to_update(
     monkeypatch,
-    mock_get_folders,
-    mock_get_worksheets,
+    mock_get_entity_index,
     mock_all_write_to_snowsight,
     testing_folder,
     auth_context,
@@ -173,8 +176,7 @@ def test_upload_snowsight_when_one_to_update(
 
 def test_upload_snowsight_when_none_to_update(
     monkeypatch,
-    mock_get_folders,
-    mock_get_worksheets,
+    mock_get_entity_index,
     mock_all_write_to_snowsight,
     testing_folder,
     auth_context,
@@ -193,3 +195,445 @@ def test_upload_snowsight_when_none_to_update(
     assert set(upload_report.keys()) == {"completed", "errors"}
     assert len(upload_report["completed"]) == 0
     assert len(upload_report["errors"]) == 0
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_upload_snowsight_with_jobs(
+    jobs,
+    mock_get_entity_index,
+    mock_all_write_to_snowsight,
+    testing_folder,
+    auth_context,
+):
+    with open(
+        testing_folder / "fixtures" / "worksheets_update.json", "r"
+    ) as f:
+        worksheets_as_dicts = json.load(f)
+
+    worksheets = [sf_git.models.Worksheet(**w) for w in worksheets_as_dicts]
+    upload_report = worksheets_utils.upload_to_snowsight(
+        auth_context, worksheets, jobs=jobs
+    )
+
+    assert upload_report == {
+        "completed": [
+            {
+                "name": ws.name,
+                "_id": ws._id,
+                "snowsight_id": ws._id,
+                "folder_id": ws.folder_id,
+                "retries": 0,
+                "retry_wait": 0,
+            }
+            for ws in worksheets
+        ],
+        "errors": [],
+    }
+
+
+def test_upload_snowsight_creates_missing_folders_once(
+    monkeypatch,
+    mock_get_entity_index,
+    mock_all_write_to_snowsight,
+    auth_context,
+):
+    created_folders = []
+
+    def fake_create_folder(auth_context, folder_name):
+        created_folders.append(folder_name)
+        return f"id_{folder_name}"
+
+    written = {}
+
+    def fake_write_worksheet(auth_context, worksheet):
+        written[worksheet.name] = worksheet.folder_id
+
+    monkeypatch.setattr(worksheets_utils, "create_folder", fake_create_folder)
+    monkeypatch.setattr(
+        worksheets_utils, "write_worksheet", fake_write_worksheet
+    )
+
+    worksheets = [
+        sf_git.models.Worksheet(
+            f"id_{i}", f"new_worksheet_{i}", None, "New folder", "SELECT 1"
+        )
+        for i in range(10)
+    ]
+    upload_report = worksheets_utils.upload_to_snowsight(
+        auth_context, worksheets, jobs=4
+    )
+
+    assert created_folders == ["New folder"]
+    assert set(written.values()) == {"id_New folder"}
+    assert len(upload_report["completed"]) == 10
+
+
+def test_upload_snowsight_reports_failed_creations(
+    monkeypatch,
+    mock_get_entity_index,
+    mock_all_write_to_snowsight,
+    auth_context,
+):
+    def fake_create_folder(auth_context, folder_name):
+        if folder_name == "Broken folder":
+            raise WorksheetError("Failed to create folder")
+        return f"id_{folder_name}"
+
+    def fake_create_worksheet(auth_context, worksheet_name, folder_id):
+        if worksheet_name == "broken":
+            raise WorksheetError("Failed to create worksheet")
+        return f"id_{worksheet_name}"
+
+    monkeypatch.setattr(worksheets_utils, "create_folder", fake_create_folder)
+    monkeypatch.setattr(
+        worksheets_utils, "create_worksheet", fake_create_worksheet
+    )
+
+    worksheets = [
+        sf_git.models.Worksheet(
+            "in_broken", "in_broken", None, "Broken folder", "SELECT 1"
+        ),
+        sf_git.models.Worksheet(
+            "broken", "broken", None, "New folder", "SELECT 2"
+        ),
+        sf_git.models.Worksheet("ok", "ok", None, "New folder", "SELECT 3"),
+    ]
+    upload_report = worksheets_utils.upload_to_snowsight(
+        auth_context, worksheets, jobs=2
+    )
+
+    assert [entry["_id"] for entry in upload_report["completed"]] == ["ok"]
+    assert [
+        (entry["_id"], entry["error"].message)
+        for entry in upload_report["errors"]
+    ] == [
+        ("in_broken", "Failed to create folder"),
+        ("broken", "Failed to create worksheet"),
+    ]
+
+
+def test_upload_snowsight_by_id(
+    monkeypatch,
+    mock_get_entity_index,
+    mock_all_write_to_snowsight,
+    testing_folder,
+    auth_context,
+):
+    with open(testing_folder / "fixtures" / "worksheets.json", "r") as f:
+        existing = sf_git.models.Worksheet(**json.load(f)[0])
+    written = []
+    monkeypatch.setattr(
+        worksheets_utils,
+        "write_worksheet",
+        lambda auth_context, worksheet: written.append(worksheet._id),
+    )
+    monkeypatch.setattr(
+        worksheets_utils,
+        "create_worksheet",
+        lambda auth_context, worksheet_name, folder_id: "created_id",
+    )
+
+    # same name as an existing worksheet, but another one
+    homonym = sf_git.models.Worksheet(
+        "local_id", existing.name, None, None, "SELECT 2"
+    )
+    changed = sf_git.models.Worksheet(
+        existing._id, existing.name, None, None, "SELECT 3"
+    )
+    upload_report = worksheets_utils.upload_to_snowsight(
+        auth_context, [homonym, changed], by_id=True
+    )
+
+    assert written == ["created_id", existing._id]
+    assert [
+        (entry["_id"], entry["snowsight_id"])
+        for entry in upload_report["completed"]
+    ] == [("local_id", "created_id"), (existing._id, existing._id)]
+
+
+def test_get_entity_index_lists_once(
+    mock_api, get_worksheets_api_response_with_worksheets, auth_context
+):
+    mock_api.post(
+        re.compile(auth_context.app_server_url),
+        text=get_worksheets_api_response_with_worksheets,
+        status_code=200,
+    )
+
+    index = worksheets_utils.get_entity_index(auth_context, refresh=True)
+    cached_index = worksheets_utils.get_entity_index(auth_context)
+
+    assert cached_index is index
+    assert mock_api.call_count == 1
+    assert len(index.worksheets) == 2
+    assert len(index.folders) == 2
+    # contents are not kept, only their digest
+    listed = worksheets_utils.get_worksheets(auth_context)
+    assert {ws._id: ws.digest for ws in index.worksheets} == {
+        ws._id: sf_git.cache.worksheet_digest(ws) for ws in listed
+    }
+    assert not any(hasattr(ws, "content") for ws in index.worksheets)
+
+
+def test_write_helpers_update_cached_index(
+    mock_api, get_worksheets_api_response_with_worksheets, auth_context
+):
+    list_url = re.compile(r".*/entities/list")
+    mock_api.post(
+        list_url, text=get_worksheets_api_response_with_worksheets
+    )
+    mock_api.post(
+        re.compile(r".*/v0/folders"), json={"createdFolderId": "new_f"}
+    )
+    mock_api.post(re.compile(r".*/v0/queries"), json={"pid": "new_ws"})
+
+    index = worksheets_utils.get_entity_index(auth_context, refresh=True)
+    worksheets_utils.create_folder(auth_context, "New folder")
+    worksheets_utils.create_worksheet(auth_context, "New worksheet", "new_f")
+    worksheets_utils.write_worksheet(
+        auth_context,
+        sf_git.models.Worksheet(
+            "new_ws", "New worksheet", "new_f", "New folder", "SELECT 1"
+        ),
+    )
+
+    assert index.folders_by_name["New folder"]._id == "new_f"
+    new_worksheet = index.worksheets_by_name["New worksheet"]
+    assert new_worksheet.folder_name == "New folder"
+    assert new_worksheet.digest == sf_git.cache.worksheet_digest(
+        sf_git.models.Worksheet(
+            "new_ws", "New worksheet", "new_f", "New folder", "SELECT 1"
+        )
+    )
+
+    worksheets_utils.invalidate_entity_index(auth_context)
+    worksheets_utils.get_entity_index(auth_context)
+    assert len(
+        [r for r in mock_api.request_history if list_url.match(r.url)]
+    ) == 2
+
+
+@pytest.fixture
+def entities_pages(testing_folder):
+    with open(testing_folder / "fixtures" / "contents.json") as f:
+        contents = json.loads(f.read())
+    with open(testing_folder / "fixtures" / "entities.json") as f:
+        entities = json.loads(f.read())
+
+    page_size = 2
+    return page_size, [
+        {
+            "text": json.dumps(
+                {
+                    "entities": entities[i:i + page_size],
+                    "models": {"queries": contents},
+                }
+            )
+        }
+        for i in range(0, len(entities) + 1, page_size)
+    ]
+
+
+def test_iter_worksheets_pages_through_entities(
+    mock_api, entities_pages, auth_context
+):
+    page_size, pages = entities_pages
+    mock_api.post(re.compile(auth_context.app_server_url), pages)
+
+    worksheets = list(
+        worksheets_utils.iter_worksheets(auth_context, page_size=page_size)
+    )
+
+    assert len(worksheets) == 2
+    sent_offsets = [
+        json.loads(parse_qs(r.text)["options"][0])["offset"]
+        for r in mock_api.request_history
+    ]
+    # last page is full so one more, empty, page is requested
+    assert sent_offsets == list(range(0, page_size * len(pages), page_size))
+
+
+def test_iter_worksheets_lists_unpaged_when_offset_is_ignored(
+    mock_api, entities_pages, auth_context, testing_folder, caplog
+):
+    page_size, pages = entities_pages
+    with open(testing_folder / "fixtures" / "contents.json") as f:
+        contents = json.loads(f.read())
+    with open(testing_folder / "fixtures" / "entities.json") as f:
+        entities = json.loads(f.read())
+
+    def list_entities(request, context):
+        options = json.loads(parse_qs(request.text)["options"][0])
+        # offset is ignored, only limit is honoured
+        return json.dumps(
+            {
+                "entities": entities[:options["limit"]],
+                "models": {"queries": contents},
+            }
+        )
+
+    mock_api.post(re.compile(auth_context.app_server_url), text=list_entities)
+
+    worksheets = list(
+        worksheets_utils.iter_worksheets(auth_context, page_size=page_size)
+    )
+
+    assert len(worksheets) == 2
+    sent_limits = [
+        json.loads(parse_qs(r.text)["options"][0])["limit"]
+        for r in mock_api.request_history
+    ]
+    assert sent_limits == [
+        page_size,
+        page_size,
+        worksheets_utils.UNPAGED_LIST_SIZE,
+    ]
+    assert "offset is ignored" in caplog.text
+    assert "truncated" not in caplog.text
+
+
+def test_get_entity_index_indexes_pages(
+    mock_api, entities_pages, auth_context
+):
+    page_size, pages = entities_pages
+    mock_api.post(re.compile(auth_context.app_server_url), pages)
+
+    index = worksheets_utils.get_entity_index(
+        auth_context, refresh=True, page_size=page_size
+    )
+
+    assert len(index.worksheets) == 2
+    assert len(index.folders) == 2
+
+
+def test_decode_entities_response_keeps_latest_draft():
+    payload = json.dumps(
+        {
+            "entities": [],
+            "models": {
+                "queries": {
+                    "ws_id": {
+                        "drafts": {
+                            "1700000000002": {"query": "SELECT 2"},
+                            "1700000000010": {"query": "SELECT 10"},
+                            "1700000000001": {"query": "SELECT 1"},
+                        }
+                    }
+                }
+            },
+        }
+    ).encode("utf-8")
+
+    decoded = worksheets_utils.decode_entities_response(payload)
+
+    assert decoded["models"]["queries"]["ws_id"]["drafts"] == {
+        "1700000000010": {"query": "SELECT 10"}
+    }
+
+
+@pytest.fixture
+def many_worksheets():
+    return [
+        sf_git.models.Worksheet(
+            f"ws_{i:02d}",
+            f"Worksheet {i}",
+            "folder_id",
+            "Folder",
+            content=f"SELECT {i};\n-- {'x' * 100}",
+        )
+        for i in range(25)
+    ]
+
+
+def test_render_worksheets_table_shows_head_with_previews(many_worksheets):
+    lines = list(
+        worksheets_utils.render_worksheets(many_worksheets, n=3)
+    )
+
+    assert len(lines) == 5
+    assert lines[0].split() == [
+        "_id", "name", "folder_name", "content_type", "content"
+    ]
+    assert lines[1].startswith("ws_00  Worksheet 0")
+    assert lines[1].endswith("SELECT 0;...")
+    assert lines[-1] == "... and 22 more"
+
+
+def test_render_worksheets_reads_only_head(many_worksheets):
+    lines = list(
+        worksheets_utils.render_worksheets(
+            (ws for ws in many_worksheets), n=2
+        )
+    )
+
+    assert lines[-1] == "... and 23 more"
+
+
+def test_render_worksheets_json_and_ids(many_worksheets):
+    rendered_json = "\n".join(
+        worksheets_utils.render_worksheets(
+            many_worksheets, output_format="json"
+        )
+    )
+    ids = list(
+        worksheets_utils.render_worksheets(
+            many_worksheets, output_format="ids"
+        )
+    )
+
+    assert [ws["_id"] for ws in json.loads(rendered_json)] == ids
+    assert len(ids) == 25
+    assert "content" not in json.loads(rendered_json)[0]
+
+
+def test_render_worksheets_when_none():
+    assert list(worksheets_utils.render_worksheets([])) == ["No worksheet"]
+    assert list(
+        worksheets_utils.render_worksheets([], output_format="json")
+    ) == ["[", "]"]
+
+
+def test_render_worksheets_unknown_format(many_worksheets):
+    with pytest.raises(ValueError):
+        list(
+            worksheets_utils.render_worksheets(
+                many_worksheets, output_format="csv"
+            )
+        )
+
+
+def test_content_preview_truncates_long_content():
+    preview = worksheets_utils._content_preview(b"SELECT '" + b"a" * 100)
+
+    assert len(preview) == worksheets_utils.PREVIEW_LENGTH
+    assert preview.endswith("...")
+
+
+@pytest.mark.parametrize("response, expected", [
+    ({"text": json.dumps({"entities": [], "models": {}})}, True),
+    ({"status_code": 401}, False),
+    ({"status_code": 403}, False),
+    ({"text": "<html>login</html>"}, False),
+])
+def test_is_session_valid(mock_api, auth_context, response, expected):
+    mock_api.post(re.compile(auth_context.app_server_url), **response)
+
+    assert worksheets_utils.is_session_valid(auth_context) is expected
+
+
+@pytest.mark.parametrize("response, error", [
+    ({"status_code": 500}, WorksheetError),
+    ({"exc": requests.exceptions.ConnectTimeout}, requests.RequestException),
+])
+def test_is_session_valid_raises_when_unknown(
+    mock_api, auth_context, response, error, monkeypatch
+):
+    monkeypatch.setattr(
+        sf_git.snowsight_client.get_client(auth_context),
+        "retry_policy",
+        sf_git.rest_utils.RetryPolicy(max_retries=0),
+    )
+    mock_api.post(re.compile(auth_context.app_server_url), **response)
+
+    with pytest.raises(error):
+        worksheets_utils.is_session_valid(auth_context)